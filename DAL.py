@@ -1,115 +1,1226 @@
 """
 Data Access Layer for Personal Website
-Handles SQLite database operations for projects.
+Handles SQLite database operations for projects and the contact outbox.
 """
 
+import base64
+import functools
+import itertools
+import json
+import re
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cache import VersionedLRUCache
+from migrations import migrate
+from querylog import QueryLog, normalize_sql
 
 # Database configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "projects.db")
+DB_PATH = os.environ.get("PROJECTS_DB_PATH", os.path.join(BASE_DIR, "projects.db"))
+
+# Connection tuning applied to every connection opened by the DAL.
+# WAL lets readers run alongside a writer, NORMAL sync is durable in WAL mode
+# except on power loss, and mmap/cache keep hot pages out of read() syscalls.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -16000),  # negative = KiB, so ~16 MB of page cache
+    ("temp_store", "MEMORY"),
+)
+
+# Milliseconds a connection waits for another writer's lock before SQLite
+# reports "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get("DAL_BUSY_TIMEOUT_MS", "5000"))
+
+# Write transactions that still find the database locked after the busy
+# timeout are retried this many times, after WRITE_RETRY_DELAY seconds,
+# doubling each time and jittered down by up to half
+WRITE_RETRIES = 3
+WRITE_RETRY_DELAY = 0.05
+
+# Group commit (see WriteCoalescer): when on, concurrent single-row writes
+# from this process share one transaction. A writer alone commits at once;
+# when others are queued the group stays open for up to COALESCE_WINDOW
+# seconds while more join, and holds at most COALESCE_MAX_BATCH writes.
+WRITE_COALESCING = os.environ.get("DAL_WRITE_COALESCING", "0") == "1"
+COALESCE_WINDOW = 0.002
+COALESCE_MAX_BATCH = 64
+
+# Read snapshot (see ReadSnapshot): when on, the project read functions
+# query an in-memory copy of the database held by each worker process,
+# reloaded whenever the change counter moves. A database larger than
+# SNAPSHOT_MAX_BYTES is not copied and is read from disk as usual.
+SNAPSHOT_READS = os.environ.get("DAL_SNAPSHOT_READS", "0") == "1"
+SNAPSHOT_MAX_BYTES = int(os.environ.get("DAL_SNAPSHOT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Query diagnostics (see _DiagnosticCursor): when on, connections opened
+# afterwards time every statement, and those taking SLOW_QUERY_MS or longer
+# are appended to QUERY_LOG_PATH with their query plan. `flask query-report`
+# summarizes the log. Off by default: every cursor then runs Python code.
+QUERY_DIAGNOSTICS = os.environ.get("DAL_QUERY_DIAGNOSTICS", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("DAL_SLOW_QUERY_MS", "50"))
+QUERY_LOG_PATH = os.environ.get("DAL_QUERY_LOG",
+                                os.path.join(BASE_DIR, "instance", "slow_queries.jsonl"))
+
+# Number of compiled statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 128
+
+# Rows per executemany() call in insert_projects
+BULK_INSERT_CHUNK_SIZE = 5000
+
+# Markers placed around matched terms in search highlights; callers escape
+# the text and swap these for markup
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# Set when the schema is checked: False when SQLite was built without FTS5,
+# in which case search_projects falls back to a LIKE scan
+FTS_AVAILABLE = True
+
+# Page size bounds for get_projects_page
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Outbox message states; "sending" rows whose lease has expired are claimed
+# again, so a worker that dies mid-batch only delays its messages
+OUTBOX_PENDING = "pending"
+OUTBOX_SENDING = "sending"
+OUTBOX_DELIVERED = "delivered"
+OUTBOX_DEAD = "dead"
+
+# Columns that callers may select through the fields= argument of the read
+# functions; anything else is rejected before it reaches the SQL
+PROJECT_FIELDS = ("id", "title", "description", "image_filename", "created_at")
+
+# Read-through cache in front of the project read functions
+READ_CACHE_ENABLED = True
+READ_CACHE_SIZE = 256
+
+_local = threading.local()
+read_cache = VersionedLRUCache(maxsize=READ_CACHE_SIZE)
+
+# Callbacks invoked as listener(function_name, seconds, rows) after each
+# timed query; see add_query_listener
+_query_listeners: List[Callable[[str, float, int], None]] = []
+
+# Database paths whose schema this process has already checked (or migrated)
+_migrated_paths = set()
+
+# Connections inherited across fork() are parked here so they are never
+# finalized (and closed) in the child, which would corrupt the parent's locks.
+_inherited_connections = []
+
+# EXPLAIN QUERY PLAN output of slow statements, keyed by normalized SQL text,
+# so each distinct statement is explained once per process
+_query_plans: Dict[str, List[str]] = {}
+
+
+def _query_plan(conn: sqlite3.Connection, sql: str, params) -> Optional[List[str]]:
+    """
+    Return the cached query plan of sql, explaining it on conn the first time.
+
+    Returns:
+        One detail line per plan step, or None if SQLite cannot explain it
+        (e.g. the connection was closed meanwhile) or params is None
+    """
+    key = normalize_sql(sql)
+    plan = _query_plans.get(key)
+    if plan is None and params is not None:
+        try:
+            # The base class method, so explaining is not itself timed
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except sqlite3.Error:
+            return None
+        plan = _query_plans[key] = [row[3] for row in rows]
+    return plan
+
+
+def _report_statement(conn: sqlite3.Connection, sql: str, params,
+                      seconds: float, rows: int) -> None:
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    QueryLog(QUERY_LOG_PATH).record(sql, params, seconds, rows, _query_plan(conn, sql, params))
+
+
+class _DiagnosticCursor(sqlite3.Cursor):
+    """
+    Cursor that times each statement from execute() until its last row has
+    been read, so lazily stepped queries are measured in full.
+
+    A query ends when a fetch finds no more rows, or when the cursor runs
+    another statement, is closed or is garbage collected. Writes end in
+    execute(). Time spent by the caller between fetches is not counted.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        super().__init__(connection)
+        # [sql, params, seconds, rows] of the query being read
+        self._statement = None
+
+    def _finish(self) -> None:
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            _report_statement(self.connection, *statement)
+
+    def _step(self, start: float, rows: int, done: bool) -> None:
+        statement = self._statement
+        if statement is not None:
+            statement[2] += time.perf_counter() - start
+            statement[3] += rows
+            if done:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        seconds = time.perf_counter() - start
+        if self.description is None:
+            _report_statement(self.connection, sql, parameters, seconds, max(self.rowcount, 0))
+        else:
+            self._statement = [sql, parameters, seconds, 0]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        seconds = time.perf_counter() - start
+        # The first row stands for all of them; only a list or tuple can be
+        # looked into without consuming it
+        first = (seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple))
+                 and seq_of_parameters else None)
+        _report_statement(self.connection, sql, first, seconds, max(self.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._step(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._step(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._step(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._step(start, 0, True)
+            raise
+        self._step(start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class _DiagnosticConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including those made by execute() and
+    executemany(), are _DiagnosticCursor instances. Commits are timed as
+    a "COMMIT" statement, whether made by commit() or by leaving a
+    `with conn:` block.
+    """
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        _report_statement(self, "COMMIT", (), time.perf_counter() - start, 0)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return super().__exit__(exc_type, exc_value, traceback)
+        start = time.perf_counter()
+        result = super().__exit__(exc_type, exc_value, traceback)
+        _report_statement(self, "COMMIT", (), time.perf_counter() - start, 0)
+        return result
+
+    def cursor(self, factory=_DiagnosticCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _connection_factory() -> type:
+    return _DiagnosticConnection if QUERY_DIAGNOSTICS else sqlite3.Connection
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    """
+    Open a new tuned connection to the database at path.
+    """
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE,
+                           factory=_connection_factory())
+    conn.row_factory = sqlite3.Row
+    for name, value in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the long-lived connection for the current thread.
+
+    The connection is opened lazily on first use and reused by every DAL call
+    made from the same thread. It is reopened if DB_PATH changes or if the
+    process has forked since it was created. The first connection to a
+    database in each process also applies any pending schema migrations.
+
+    Returns:
+        sqlite3.Connection configured with SQLITE_PRAGMAS
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if _local.pid == os.getpid() and _local.path == DB_PATH:
+            return conn
+        if _local.pid == os.getpid():
+            conn.close()
+        else:
+            _inherited_connections.append(conn)
+
+    conn = _open_connection(DB_PATH)
+    if DB_PATH not in _migrated_paths:
+        try:
+            _migrate(conn)
+        except BaseException:
+            conn.close()
+            raise
+    _local.conn = conn
+    _local.pid = os.getpid()
+    _local.path = DB_PATH
+    return conn
+
+
+def close_connection() -> None:
+    """
+    Close the current thread's connection, if one is open.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def _reset_after_fork() -> None:
+    """
+    Drop connections inherited from the parent process after fork().
+    """
+    global _local, write_coalescer, read_snapshot
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _inherited_connections.append(conn)
+    _local = threading.local()
+    read_cache.reset_after_fork()
+    # Their locks may have been held by a parent thread that does not exist here
+    write_coalescer = WriteCoalescer()
+    _inherited_connections.extend(read_snapshot.detach())
+    read_snapshot = ReadSnapshot()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 
 def init_db() -> None:
     """
-    Initialize the database and create the projects table if it doesn't exist.
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Create projects table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL,
-                image_filename TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        conn.commit()
+    Bring the database schema up to date (see migrations.py).
+
+    Returns at once, after a single PRAGMA read, when no migration is
+    pending. Connections opened by get_connection() run the same check the
+    first time they see DB_PATH in this process, so calling this is only
+    needed to migrate eagerly, e.g. at server start.
+    """
+    _migrate(get_connection())
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """
+    Apply pending migrations on conn and note that DB_PATH is current.
+    """
+    global FTS_AVAILABLE
+    migrate(conn)
+    FTS_AVAILABLE = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'projects_fts'"
+    ).fetchone() is not None
+    _migrated_paths.add(DB_PATH)
+
+def get_data_version() -> int:
+    """
+    Return the projects change counter.
+
+    The value increases with every committed insert, update or delete on
+    projects, from any connection, so it is a cheap cross-process validator.
+
+    Returns:
+        Current version number
+    """
+    row = get_connection().execute(
+        "SELECT version FROM change_counter WHERE id = 1"
+    ).fetchone()
+    return row[0] if row else 0
+
+def get_data_stamp() -> Tuple[int, Optional[datetime]]:
+    """
+    Return the projects change counter and when it last moved.
+
+    Like get_data_version, this reads one row and never touches projects,
+    so it is cheap enough to compute HTTP validators on every request.
+
+    Returns:
+        Tuple of (version, UTC time of the last change or None)
+    """
+    row = get_connection().execute(
+        "SELECT version, updated_at FROM change_counter WHERE id = 1"
+    ).fetchone()
+    if row is None:
+        return 0, None
+    updated_at = datetime.fromisoformat(row[1]).replace(tzinfo=timezone.utc) if row[1] else None
+    return row[0], updated_at
+
+def cache_stats() -> Dict[str, int]:
+    """
+    Return hit/miss counters for the read cache of this process.
+    """
+    return read_cache.stats()
+
+def _cached_read(func):
+    """
+    Serve repeated calls of a read function from read_cache.
+
+    Results are keyed on DB_PATH and the call arguments and are only reused
+    while get_data_version() is unchanged. Cached results are shared between
+    callers and must be treated as read-only.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not READ_CACHE_ENABLED:
+            return func(*args, **kwargs)
+
+        key = (DB_PATH, func.__name__, args, tuple(sorted(kwargs.items())))
+        # Read the version before the query: a concurrent write can only make
+        # the stored result newer than its version, never older.
+        version = get_data_version()
+        hit, value = read_cache.get(key, version)
+        if hit:
+            return value
+
+        value = func(*args, **kwargs)
+        read_cache.put(key, version, value)
+        return value
+
+    return wrapper
+
+def add_query_listener(listener: Callable[[str, float, int], None]) -> None:
+    """
+    Register a callback to be told about every timed DAL query.
+
+    The listener is called with the DAL function name, the time spent in
+    SQLite in seconds and the number of rows read or written. Cache hits in
+    front of the read functions are not reported.
+    """
+    _query_listeners.append(listener)
+
+def remove_query_listener(listener: Callable[[str, float, int], None]) -> None:
+    """
+    Unregister a callback added with add_query_listener.
+    """
+    _query_listeners.remove(listener)
+
+def _notify_query(name: str, seconds: float, rows: int) -> None:
+    for listener in _query_listeners:
+        listener(name, seconds, rows)
+
+def _timed_query(count_rows: Callable):
+    """
+    Report a DAL function's duration and row count to the query listeners.
+
+    Args:
+        count_rows: Function mapping the wrapped function's result to the
+                    number of rows it read or wrote
+
+    With no listeners registered the only cost is one list check.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _query_listeners:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            _notify_query(func.__name__, time.perf_counter() - start, count_rows(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+def _retry_locked(attempt: Callable):
+    """
+    Call attempt() until it stops failing with "database is locked".
+
+    attempt must run a whole transaction and leave none open when it
+    raises. It is retried WRITE_RETRIES times with jittered exponential
+    backoff; the last error is raised.
+    """
+    for retry in range(WRITE_RETRIES + 1):
+        try:
+            return attempt()
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or retry == WRITE_RETRIES:
+                raise
+            time.sleep(WRITE_RETRY_DELAY * 2 ** retry * random.uniform(0.5, 1.0))
+
+class _PendingWrite:
+    __slots__ = ("op", "args", "wake", "finished", "result", "error")
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        self.wake = threading.Event()
+        self.finished = False
+        self.result = None
+        self.error = None
+
+class WriteCoalescer:
+    """
+    Group commit for writes made concurrently by threads of one process.
+
+    A writer that finds no group in progress becomes the leader. If it is
+    the only write queued it commits straight away; otherwise it keeps the
+    group open while more writes arrive, up to window seconds or max_batch
+    writes. Writes queued behind a commit in progress are what make groups,
+    so a lone writer pays no extra latency. The leader then runs the queued
+    writes in one BEGIN IMMEDIATE transaction, each inside its
+    own savepoint, and commits once. A write that raises is rolled back to
+    its savepoint and its caller gets the exception; the others still
+    commit. Every caller gets its own result. Writes that arrive while a
+    group commits wait for the next group, whose leader is the oldest of
+    them, so no caller ends up serving other threads indefinitely.
+
+    Writers in other processes still take turns on SQLite's write lock, but
+    once per group rather than once per row.
+    """
+
+    def __init__(self, window: Optional[float] = None, max_batch: Optional[int] = None):
+        self.window = COALESCE_WINDOW if window is None else window
+        self.max_batch = COALESCE_MAX_BATCH if max_batch is None else max_batch
+        self._cond = threading.Condition()
+        self._queue: List[_PendingWrite] = []
+        self._leading = False
+        self.groups = 0
+
+    def submit(self, op: Callable, args: tuple):
+        """
+        Run op(conn, *args) as part of a group and return its result.
+        """
+        write = _PendingWrite(op, args)
+        with self._cond:
+            self._queue.append(write)
+            if not self._leading:
+                self._leading = True
+                write.wake.set()
+            else:
+                # Tell a waiting leader that another write has joined
+                self._cond.notify()
+        while True:
+            write.wake.wait()
+            if write.finished:
+                break
+            # Woken to lead the next group, which starts with this write
+            write.wake.clear()
+            self._lead()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _lead(self) -> None:
+        with self._cond:
+            deadline = time.monotonic() + self.window
+            while 1 < len(self._queue) < self.max_batch:
+                queued = len(self._queue)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                if len(self._queue) == queued:
+                    # Timed out with no new arrivals
+                    break
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+        try:
+            self._commit(batch)
+        finally:
+            for write in batch:
+                write.finished = True
+                write.wake.set()
+            with self._cond:
+                if self._queue:
+                    self._queue[0].wake.set()
+                else:
+                    self._leading = False
+
+    def _commit(self, batch: List[_PendingWrite]) -> None:
+        conn = get_connection()
+
+        def attempt():
+            outcomes = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for write in batch:
+                    conn.execute("SAVEPOINT coalesced_write")
+                    try:
+                        outcomes.append((write.op(conn, *write.args), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO coalesced_write")
+                        outcomes.append((None, e))
+                    conn.execute("RELEASE coalesced_write")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            return outcomes
+
+        try:
+            outcomes = _retry_locked(attempt)
+        except Exception as e:
+            outcomes = [(None, e)] * len(batch)
+        for write, (result, error) in zip(batch, outcomes):
+            write.result, write.error = result, error
+        self.groups += 1
+
+write_coalescer = WriteCoalescer()
 
+def _write(op: Callable, *args):
+    """
+    Run op(conn, *args) in a write transaction and return its result.
+
+    With WRITE_COALESCING the write joins a group commit; otherwise it gets
+    a transaction of its own. Either way "database is locked" is retried
+    (see _retry_locked). A caller already inside a transaction on its
+    connection is not grouped, since the write belongs to that transaction.
+    """
+    conn = get_connection()
+    if WRITE_COALESCING and not conn.in_transaction:
+        return write_coalescer.submit(op, args)
+
+    def attempt():
+        with conn:
+            return op(conn, *args)
+
+    return _retry_locked(attempt)
+
+class ReadSnapshot:
+    """
+    In-memory copy of the database for the project read functions.
+
+    The copy is made with the SQLite backup API and shared by every thread
+    of the process (SQLite serializes calls on it). Before each read the
+    disk change counter is compared with the one in the copy; when it has
+    moved the whole database is copied again and swapped in, so reads
+    always see committed writes from any process. Readers still iterating
+    the old copy keep it alive until they finish.
+
+    A database larger than max_bytes is not copied: reads fall back to the
+    disk connection until a later change brings it back under the cap.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # (path, version, in-memory connection or None when over the cap)
+        self._state: Optional[Tuple[str, int, Optional[sqlite3.Connection]]] = None
+        self.loads = 0
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Return a connection holding the latest committed data.
+
+        Returns:
+            The in-memory copy, or the thread's disk connection when the
+            database is over the cap or this thread has a transaction open
+        """
+        disk = get_connection()
+        if disk.in_transaction:
+            # Uncommitted writes must neither be missed nor copied for others
+            return disk
+        version = get_data_version()
+        state = self._state
+        if state is None or state[:2] != (DB_PATH, version):
+            with self._lock:
+                state = self._state
+                if state is None or state[:2] != (DB_PATH, version):
+                    state = self._state = self._load(disk)
+        return state[2] or disk
+
+    def _load(self, disk: sqlite3.Connection) -> Tuple[str, int, Optional[sqlite3.Connection]]:
+        max_bytes = SNAPSHOT_MAX_BYTES if self.max_bytes is None else self.max_bytes
+        page_size = disk.execute("PRAGMA page_size").fetchone()[0]
+        page_count = disk.execute("PRAGMA page_count").fetchone()[0]
+        if page_size * page_count > max_bytes:
+            return DB_PATH, get_data_version(), None
+        copy = sqlite3.connect(":memory:", check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE,
+                               factory=_connection_factory())
+        copy.row_factory = sqlite3.Row
+        # One step copies every page under a single read lock, so the copy
+        # is a consistent state of the database
+        disk.backup(copy)
+        copy.execute("PRAGMA query_only=ON")
+        # Version of the copy itself: a write landing between the check and
+        # the backup only makes it newer, and the next read reloads again
+        version = copy.execute("SELECT version FROM change_counter WHERE id = 1").fetchone()[0]
+        self.loads += 1
+        return DB_PATH, version, copy
+
+    @property
+    def size(self) -> int:
+        """Bytes held by the current copy (0 when reading from disk)."""
+        state = self._state
+        if state is None or state[2] is None:
+            return 0
+        conn = state[2]
+        return (conn.execute("PRAGMA page_size").fetchone()[0]
+                * conn.execute("PRAGMA page_count").fetchone()[0])
+
+    def detach(self) -> List[sqlite3.Connection]:
+        """Forget the current copy, returning its connection if there is one."""
+        state, self._state = self._state, None
+        return [state[2]] if state is not None and state[2] is not None else []
+
+
+read_snapshot = ReadSnapshot()
+
+
+def _read_connection() -> sqlite3.Connection:
+    """
+    Return the connection the project read functions query: the read
+    snapshot when SNAPSHOT_READS is on, otherwise the thread's connection.
+    """
+    if SNAPSHOT_READS:
+        return read_snapshot.connection()
+    return get_connection()
+
+def project_columns(fields: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """
+    Validate a field projection and return it as a tuple of column names.
+
+    The read functions call this on their fields argument, and the API uses
+    it to check a fields= parameter before it reaches them.
+
+    Args:
+        fields: Requested fields in output order, or None for all of them
+
+    Returns:
+        Tuple of column names from PROJECT_FIELDS
+
+    Raises:
+        ValueError: If a field is unknown or the projection is empty
+    """
+    if fields is None:
+        return PROJECT_FIELDS
+    columns = tuple(dict.fromkeys(fields))
+    unknown = [field for field in columns if field not in PROJECT_FIELDS]
+    if unknown or not columns:
+        raise ValueError(f"Unknown project fields: {', '.join(unknown) or '(none)'}; "
+                         f"choose from {', '.join(PROJECT_FIELDS)}")
+    return columns
+
+@_cached_read
+@_timed_query(len)
 def get_all_projects() -> List[Dict]:
     """
     Retrieve all projects from the database.
-    
+
     Returns:
         List of dictionaries containing project data
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, title, description, image_filename, created_at
+    cursor = _read_connection().execute("""
+        SELECT id, title, description, image_filename, created_at
+        FROM projects
+        ORDER BY created_at DESC, id DESC
+    """)
+
+    rows = cursor.fetchall()
+    return [dict(row) for row in rows]
+
+def iter_projects(batch_size: int = 500,
+                  fields: Optional[Iterable[str]] = None) -> Iterator[sqlite3.Row]:
+    """
+    Lazily iterate over all projects, newest first.
+
+    Rows are pulled from the cursor in batches of batch_size and yielded as
+    sqlite3.Row objects (which support project["title"] access), so memory
+    use stays constant regardless of table size. The index on
+    (created_at, id) lets SQLite return rows in order without sorting.
+
+    Args:
+        batch_size: Number of rows fetched from SQLite at a time
+        fields: Columns to select, in order (default: all of PROJECT_FIELDS)
+
+    Yields:
+        One sqlite3.Row per project
+
+    Raises:
+        ValueError: If fields names an unknown column
+    """
+    columns = ", ".join(project_columns(fields))
+    # Only time spent in SQLite is reported, not the caller's work between rows
+    elapsed, count = 0.0, 0
+    start = time.perf_counter()
+    cursor = _read_connection().execute(f"""
+        SELECT {columns}
+        FROM projects
+        ORDER BY created_at DESC, id DESC
+    """)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            count += len(rows)
+            yield from rows
+            start = time.perf_counter()
+    finally:
+        cursor.close()
+        if _query_listeners:
+            _notify_query("iter_projects", elapsed, count)
+
+def encode_cursor(created_at: str, project_id: int) -> str:
+    """
+    Encode a project's sort key as an opaque, URL-safe pagination cursor.
+
+    Args:
+        created_at: The project's created_at value
+        project_id: The project's ID
+
+    Returns:
+        Cursor string suitable for a query parameter
+    """
+    raw = f"{created_at}|{project_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: Cursor string
+
+    Returns:
+        Tuple of (created_at, project_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, _, project_id = raw.rpartition("|")
+        return created_at, int(project_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+@_cached_read
+@_timed_query(lambda page: len(page["projects"]))
+def get_projects_page(after: Optional[str] = None,
+                      before: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE,
+                      fields: Optional[Tuple[str, ...]] = None) -> Dict:
+    """
+    Retrieve one page of projects, newest first, using keyset pagination.
+
+    Pages are addressed by the (created_at, id) of a boundary row rather than
+    an OFFSET, so every page is an index range scan of at most limit + 1 rows
+    regardless of table size.
+
+    Args:
+        after: Cursor of the last row on the previous page (older projects)
+        before: Cursor of the first row on the next page (newer projects)
+        limit: Maximum number of projects to return (clamped to MAX_PAGE_SIZE)
+        fields: Columns to return, in order (default: all of PROJECT_FIELDS);
+                created_at and id are read for the cursors either way
+
+    Returns:
+        Dictionary with "projects", "next_cursor" and "prev_cursor"; a cursor
+        is None when there is no page in that direction
+
+    Raises:
+        ValueError: If a cursor is malformed or fields names an unknown column
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    output = project_columns(fields)
+    selected = output + tuple(key for key in ("created_at", "id") if key not in output)
+    columns = ", ".join(selected)
+    conn = _read_connection()
+
+    if before is not None:
+        cursor = conn.execute(f"""
+            SELECT {columns}
+            FROM projects
+            WHERE (created_at, id) > (?, ?)
+            ORDER BY created_at ASC, id ASC
+            LIMIT ?
+        """, (*decode_cursor(before), limit + 1))
+    elif after is not None:
+        cursor = conn.execute(f"""
+            SELECT {columns}
             FROM projects
-            ORDER BY created_at DESC
-        """)
-        
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*decode_cursor(after), limit + 1))
+    else:
+        cursor = conn.execute(f"""
+            SELECT {columns}
+            FROM projects
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (limit + 1,))
+
+    rows = [dict(row) for row in cursor.fetchall()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
+    if before is not None:
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    next_cursor = encode_cursor(last["created_at"], last["id"]) if has_older and last else None
+    prev_cursor = encode_cursor(first["created_at"], first["id"]) if has_newer and first else None
+    if len(selected) > len(output):
+        rows = [{field: row[field] for field in output} for row in rows]
+    return {
+        "projects": rows,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
+
+@_timed_query(lambda _: 1)
 def insert_project(title: str, description: str, image_filename: str) -> None:
     """
     Insert a new project into the database.
-    
+
     Args:
         title: Project title
         description: Project description
         image_filename: Name of the image file (without path)
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO projects (title, description, image_filename)
-            VALUES (?, ?, ?)
-        """, (title.strip(), description.strip(), image_filename.strip()))
-        
-        conn.commit()
+    _write(_insert_project, title.strip(), description.strip(), image_filename.strip())
+
+def _insert_project(conn: sqlite3.Connection, title: str, description: str,
+                    image_filename: str) -> None:
+    conn.execute("""
+        INSERT INTO projects (title, description, image_filename)
+        VALUES (?, ?, ?)
+    """, (title, description, image_filename))
+
+def _fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query.
+
+    Every word is quoted (so operators and punctuation in user input are
+    treated as text) and prefix-matched; words are implicitly ANDed.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+@_cached_read
+@_timed_query(len)
+def search_projects(query: str, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+    """
+    Full-text search over project titles and descriptions.
+
+    Results are ranked by bm25 with title matches weighted above description
+    matches. Each result carries "title_highlight" and "snippet", in which
+    matched terms are wrapped in HIGHLIGHT_START/HIGHLIGHT_END.
 
-def get_project_by_id(project_id: int) -> Optional[Dict]:
+    Args:
+        query: Free text entered by the user
+        limit: Maximum number of results (clamped to MAX_PAGE_SIZE)
+
+    Returns:
+        List of dictionaries containing project data, best match first
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    match = _fts_query(query)
+    if not match:
+        return []
+
+    conn = _read_connection()
+    if not FTS_AVAILABLE:
+        words = re.findall(r"\w+", query)
+        clauses = " AND ".join("(title LIKE ? OR description LIKE ?)" for _ in words)
+        params = [f"%{word}%" for word in words for _ in (0, 1)]
+        cursor = conn.execute(f"""
+            SELECT id, title, description, image_filename, created_at,
+                   title AS title_highlight, substr(description, 1, 160) AS snippet
+            FROM projects
+            WHERE {clauses}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*params, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    cursor = conn.execute("""
+        SELECT p.id, p.title, p.description, p.image_filename, p.created_at,
+               highlight(projects_fts, 0, :start, :end) AS title_highlight,
+               snippet(projects_fts, 1, :start, :end, '…', 24) AS snippet
+        FROM projects_fts
+        JOIN projects AS p ON p.id = projects_fts.rowid
+        WHERE projects_fts MATCH :match
+        ORDER BY bm25(projects_fts, 10.0, 1.0)
+        LIMIT :limit
+    """, {"start": HIGHLIGHT_START, "end": HIGHLIGHT_END, "match": match, "limit": limit})
+    return [dict(row) for row in cursor.fetchall()]
+
+@_timed_query(int)
+def insert_projects(rows: Iterable[Tuple[str, str, str]],
+                    chunk_size: int = BULK_INSERT_CHUNK_SIZE) -> int:
+    """
+    Insert many projects in a single transaction.
+
+    rows is consumed lazily in chunks of chunk_size, each written with one
+    executemany() call, and everything is committed once at the end (or
+    rolled back if an exception escapes). The write lock is held from the
+    first chunk until the commit, so feed it from a fast source.
+
+    The per-row insert triggers are switched off for the transaction (see
+    bulk_load in migrations.py): each chunk is added to the search index
+    with one INSERT ... SELECT over its id range, and the change counter is
+    bumped once.
+
+    Args:
+        rows: Iterable of (title, description, image_filename) tuples that
+              have already been validated and stripped
+        chunk_size: Number of rows per executemany() call
+
+    Returns:
+        Number of projects inserted
+    """
+    rows = iter(rows)
+    inserted = 0
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE bulk_load SET active = 1 WHERE id = 1")
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany("""
+                INSERT INTO projects (title, description, image_filename)
+                VALUES (?, ?, ?)
+            """, chunk)
+            inserted += len(chunk)
+            if FTS_AVAILABLE:
+                # This transaction holds the write lock, so the chunk's ids
+                # are the len(chunk) ending at the last one inserted
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                conn.execute("""
+                    INSERT INTO projects_fts (rowid, title, description)
+                    SELECT id, title, description FROM projects
+                    WHERE id BETWEEN ? AND ?
+                """, (last_id - len(chunk) + 1, last_id))
+        if inserted:
+            conn.execute("""
+                UPDATE change_counter
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = 1
+            """)
+        conn.execute("UPDATE bulk_load SET active = 0 WHERE id = 1")
+    return inserted
+
+@_cached_read
+@_timed_query(lambda project: int(project is not None))
+def get_project_by_id(project_id: int,
+                      fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict]:
     """
     Retrieve a specific project by ID.
-    
+
     Args:
         project_id: The ID of the project to retrieve
-        
+        fields: Columns to return, in order (default: all of PROJECT_FIELDS)
+
     Returns:
         Dictionary containing project data or None if not found
+
+    Raises:
+        ValueError: If fields names an unknown column
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, title, description, image_filename, created_at
-            FROM projects
-            WHERE id = ?
-        """, (project_id,))
-        
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    columns = ", ".join(project_columns(fields))
+    cursor = _read_connection().execute(f"""
+        SELECT {columns}
+        FROM projects
+        WHERE id = ?
+    """, (project_id,))
 
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+@_timed_query(int)
 def delete_project(project_id: int) -> bool:
     """
     Delete a project by ID.
-    
+
     Args:
         project_id: The ID of the project to delete
-        
+
     Returns:
         True if project was deleted, False if not found
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-        conn.commit()
-        
-        return cursor.rowcount > 0
+    return _write(_delete_project, project_id)
+
+def _delete_project(conn: sqlite3.Connection, project_id: int) -> bool:
+    cursor = conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+    return cursor.rowcount > 0
+
+@_timed_query(int)
+def enqueue_contact_message(payload: Dict, idempotency_key: str) -> bool:
+    """
+    Add a contact form submission to the outbox.
+
+    A message whose idempotency key is already in the outbox (a resubmitted
+    form, for instance) is ignored.
+
+    Args:
+        payload: JSON-serializable message fields
+        idempotency_key: Unique key for this submission, passed on to the sink
+
+    Returns:
+        True if the message was queued, False if it was a duplicate
+    """
+    return _write(_enqueue_contact_message, json.dumps(payload), idempotency_key)
+
+def _enqueue_contact_message(conn: sqlite3.Connection, payload: str,
+                             idempotency_key: str) -> bool:
+    cursor = conn.execute("""
+        INSERT OR IGNORE INTO contact_outbox (idempotency_key, payload, next_attempt_at)
+        VALUES (?, ?, ?)
+    """, (idempotency_key, payload, time.time()))
+    return cursor.rowcount > 0
+
+@_timed_query(len)
+def claim_outbox_batch(limit: int, lease_seconds: float,
+                       now: Optional[float] = None) -> List[Dict]:
+    """
+    Claim up to limit due outbox messages for delivery.
+
+    Claimed rows move to "sending" with a lease of lease_seconds. The rows
+    are picked and leased in one BEGIN IMMEDIATE transaction, so concurrent
+    workers never get the same row. If the claimer dies, the rows become due
+    again when the lease runs out.
+
+    Args:
+        limit: Maximum number of messages to claim
+        lease_seconds: How long the caller has to report on each message
+        now: Current Unix time (defaults to time.time())
+
+    Returns:
+        List of dictionaries with id, idempotency_key, payload (decoded) and
+        attempts, oldest first
+    """
+    now = time.time() if now is None else now
+    conn = get_connection()
+    with conn:
+        # Takes the write lock before reading, so no other worker can pick
+        # the same rows in between (UPDATE ... RETURNING needs SQLite 3.35)
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("""
+            SELECT id, idempotency_key, payload, attempts
+            FROM contact_outbox
+            WHERE status IN (?, ?) AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        """, (OUTBOX_PENDING, OUTBOX_SENDING, now, limit)).fetchall()
+        conn.executemany("""
+            UPDATE contact_outbox
+            SET status = ?, next_attempt_at = ?
+            WHERE id = ?
+        """, [(OUTBOX_SENDING, now + lease_seconds, row["id"]) for row in rows])
+
+    messages = [dict(row, payload=json.loads(row["payload"])) for row in rows]
+    messages.sort(key=lambda message: message["id"])
+    return messages
+
+def mark_outbox_delivered(message_ids: Iterable[int]) -> None:
+    """
+    Record successful delivery of claimed outbox messages.
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+            UPDATE contact_outbox
+            SET status = ?, attempts = attempts + 1, last_error = NULL,
+                delivered_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [(OUTBOX_DELIVERED, message_id) for message_id in message_ids])
+
+def mark_outbox_failed(message_id: int, error: str,
+                       retry_at: Optional[float]) -> None:
+    """
+    Record a failed delivery attempt.
+
+    Args:
+        message_id: The outbox message ID
+        error: Description of the failure
+        retry_at: Unix time of the next attempt, or None to dead-letter the
+                  message
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            UPDATE contact_outbox
+            SET status = ?, attempts = attempts + 1, last_error = ?,
+                next_attempt_at = COALESCE(?, next_attempt_at)
+            WHERE id = ?
+        """, (OUTBOX_PENDING if retry_at is not None else OUTBOX_DEAD,
+              error, retry_at, message_id))
+
+def outbox_counts() -> Dict[str, int]:
+    """
+    Return the number of outbox messages in each state.
+    """
+    counts = dict.fromkeys((OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_DELIVERED, OUTBOX_DEAD), 0)
+    cursor = get_connection().execute(
+        "SELECT status, COUNT(*) FROM contact_outbox GROUP BY status"
+    )
+    counts.update(cursor.fetchall())
+    return counts
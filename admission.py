@@ -0,0 +1,220 @@
+"""
+Admission Control for Personal Website
+Sheds excess load on the write routes before it reaches the database: a
+per-client token bucket limits how often each client may write, and a
+global cap limits how many writes run at once across all workers.
+"""
+
+import contextlib
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the cap is per process there
+    fcntl = None
+
+# Buckets idle for this long are full again and are deleted
+BUCKET_TTL = 3600
+
+# Roughly one acquire in this many also prunes idle buckets
+PRUNE_EVERY = 1000
+
+_inherited_connections = []
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets shared by every worker through a SQLite file.
+
+    Each client may make burst requests at once and then rate per second.
+    A check is one short BEGIN IMMEDIATE transaction in its own small
+    database, kept apart from the projects database so rate limiting never
+    waits for, or holds, the write lock it is protecting. Rejected requests
+    do not use up tokens.
+    """
+
+    def __init__(self, path: str, rate: float, burst: int):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            if self._local.pid == os.getpid():
+                return conn
+            # Inherited across fork(): keep it referenced so it is never
+            # finalized here, which would disturb the parent's locks
+            _inherited_connections.append(conn)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Losing recent bucket state on power loss is harmless
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                client TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                admitted INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, client: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Take a token from client's bucket if it has one.
+
+        Args:
+            client: Key identifying the client, e.g. its IP address
+            now: Current Unix time (defaults to time.time())
+
+        Returns:
+            Tuple of (admitted, seconds until a token is available)
+        """
+        now = time.time() if now is None else now
+        conn = self._connection()
+        # Read and write under one write lock, so workers never refill or
+        # spend the same tokens twice (UPSERT ... RETURNING needs SQLite 3.35)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE client = ?",
+                               (client,)).fetchone()
+            if row is None:
+                tokens, updated = float(self.burst), now
+            else:
+                tokens = min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+                updated = max(row[1], now)
+            admitted = tokens >= 1
+            if admitted:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (client, tokens, updated, admitted) "
+                         "VALUES (?, ?, ?, ?)", (client, tokens, updated, admitted))
+            if random.randrange(PRUNE_EVERY) == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - BUCKET_TTL,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if admitted:
+            return True, 0.0
+        return False, (1 - tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests run at once across all worker processes.
+
+    Each of the limit slots is a lock file; a request takes the first free
+    one with a non-blocking flock() and releases it when done. The kernel
+    drops the lock if a worker dies, so a crash cannot leak a slot. Without
+    fcntl the cap applies per process.
+    """
+
+    def __init__(self, directory: str, limit: int):
+        self.directory = directory
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        """
+        Take a free slot without waiting.
+
+        Returns:
+            A handle to pass to release(), or None if every slot is taken
+        """
+        if fcntl is None:
+            return self._semaphore if self._semaphore.acquire(blocking=False) else None
+        os.makedirs(self.directory, exist_ok=True)
+        # Start at a random slot so workers do not all probe slot 0 first
+        first = random.randrange(self.limit)
+        for i in range(self.limit):
+            fd = os.open(os.path.join(self.directory, f"write-{(first + i) % self.limit}.lock"),
+                         os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, handle) -> None:
+        if handle is self._semaphore:
+            self._semaphore.release()
+        else:
+            # Closing the descriptor drops the flock
+            os.close(handle)
+
+
+class WriteSlotsBusy(Exception):
+    """Every global write slot is taken; the write should be retried later."""
+
+
+class AdmissionController:
+    """
+    Admission decisions for write requests: the client's rate, checked
+    before the request is handled, and the global concurrency cap, held
+    only around the database write itself.
+    """
+
+    def __init__(self, directory: str, rate: float, burst: int, concurrency: int):
+        self.rate_limiter = TokenBucketLimiter(os.path.join(directory, "buckets.db"), rate, burst)
+        self.concurrency = ConcurrencyLimiter(os.path.join(directory, "slots"), concurrency)
+
+    def admit(self, client: str) -> Optional[Tuple[int, int]]:
+        """
+        Decide whether client may make a write request now.
+
+        Returns:
+            None when admitted, or (429, retry_after) when the client is
+            over its rate
+        """
+        allowed, wait = self.rate_limiter.acquire(client)
+        if not allowed:
+            return 429, max(1, math.ceil(wait))
+        return None
+
+    @contextlib.contextmanager
+    def write_slot(self) -> Iterator[None]:
+        """
+        Hold one of the global write slots for the duration of the block.
+
+        Raises:
+            WriteSlotsBusy: If every slot is taken
+        """
+        slot = self.concurrency.try_acquire()
+        if slot is None:
+            raise WriteSlotsBusy()
+        try:
+            yield
+        finally:
+            self.concurrency.release(slot)
+
+
+def write_slot():
+    """
+    Context manager holding a global write slot for the current app.
+
+    Enter it around the database write, after the request body has been
+    read and validated, so a slow client never holds a slot. A no-op when
+    ADMISSION_CONTROL is off or the app is testing.
+
+    Raises:
+        WriteSlotsBusy: If every slot is taken
+    """
+    app = current_app
+    if not app.config["ADMISSION_CONTROL"] or app.testing:
+        return contextlib.nullcontext()
+    return app.extensions["admission"].write_slot()
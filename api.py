@@ -0,0 +1,160 @@
+"""
+JSON API for Personal Website
+Machine-facing endpoints under /api for working with projects.
+"""
+
+import io
+import itertools
+from json.encoder import encode_basestring_ascii
+
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from admission import write_slot
+from bulk_import import SUPPORTED_FORMATS, detect_format, import_projects
+from DAL import (PROJECT_FIELDS, get_project_by_id, get_projects_page, iter_projects,
+                 project_columns)
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# Rows serialized per chunk of an NDJSON export
+NDJSON_BATCH_SIZE = 500
+
+
+def _json_nullable(value):
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
+# JSON encoder for each project column's values: id is an INTEGER primary
+# key, created_at may be NULL, and the other columns are NOT NULL text
+_FIELD_ENCODERS = {
+    'id': str,
+    'title': encode_basestring_ascii,
+    'description': encode_basestring_ascii,
+    'image_filename': encode_basestring_ascii,
+    'created_at': _json_nullable,
+}
+
+
+def _parse_fields():
+    """
+    Return ?fields= as a tuple of column names, or None for all columns.
+
+    Raises:
+        ValueError: If a field is not one of PROJECT_FIELDS
+    """
+    return parse_fields(request.args.get('fields'))
+
+
+def parse_fields(raw):
+    """
+    Parse a comma separated fields= value into a tuple of column names.
+
+    Args:
+        raw: The parameter value, or None/empty for all columns
+
+    Returns:
+        Tuple of names from PROJECT_FIELDS, or None for all columns
+
+    Raises:
+        ValueError: If a field is not one of PROJECT_FIELDS
+    """
+    if not raw:
+        return None
+    return project_columns(field.strip() for field in raw.split(',') if field.strip())
+
+
+def _ndjson_export(fields):
+    """
+    Stream every project as one JSON object per line.
+
+    Rows come straight from the DAL cursor and are encoded column by column
+    for each batch: every value goes through the C string encoder from the
+    json module and lines are filled into a precomputed template, so no dict
+    is built per row.
+    """
+    fields = fields or PROJECT_FIELDS
+    rows = iter_projects(NDJSON_BATCH_SIZE, fields)
+    line = '{' + ','.join(f'"{field}":%s' for field in fields) + '}\n'
+    encoders = [_FIELD_ENCODERS[field] for field in fields]
+
+    def generate():
+        while True:
+            batch = list(itertools.islice(rows, NDJSON_BATCH_SIZE))
+            if not batch:
+                break
+            columns = [map(encode, column) for encode, column in zip(encoders, zip(*batch))]
+            yield ''.join(map(line.__mod__, zip(*columns))).encode('ascii')
+
+    return current_app.response_class(stream_with_context(generate()),
+                                      mimetype='application/x-ndjson')
+
+
+@api.route('/projects')
+def list_projects():
+    """
+    List projects newest first.
+
+    JSON responses are paginated like /projects (?after=, ?before=, ?limit=)
+    and include next/prev cursors. ?format=ndjson streams every project
+    instead. ?fields=id,title limits the columns read and returned.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        return jsonify(error='Unsupported format; use json or ndjson'), 400
+    try:
+        fields = _parse_fields()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    if fmt == 'ndjson':
+        return _ndjson_export(fields)
+
+    limit = request.args.get('limit', current_app.config['PROJECTS_PAGE_SIZE'], type=int)
+    try:
+        page = get_projects_page(after=request.args.get('after'),
+                                 before=request.args.get('before'),
+                                 limit=limit, fields=fields)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(page)
+
+
+@api.route('/projects/<int:project_id>')
+def get_project(project_id):
+    """
+    Return one project, optionally limited to ?fields=.
+    """
+    try:
+        project = get_project_by_id(project_id, fields=_parse_fields())
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if project is None:
+        return jsonify(error='Project not found'), 404
+    return jsonify(project)
+
+
+@api.route('/projects/bulk', methods=['POST'])
+def bulk_import_projects():
+    """
+    Import many projects from a JSONL or CSV request body.
+
+    The format comes from ?format= or the Content-Type. The body, at most
+    BULK_IMPORT_MAX_BYTES, is streamed and validated into a spool, then
+    each valid row is inserted in one transaction; invalid rows are
+    reported without aborting the import.
+    """
+    fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+    if fmt not in SUPPORTED_FORMATS:
+        return jsonify(error=f"Unsupported format; use one of: {', '.join(SUPPORTED_FORMATS)}"), 415
+
+    max_bytes = current_app.config['BULK_IMPORT_MAX_BYTES']
+    request.max_content_length = max_bytes
+    try:
+        source = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        report = import_projects(source, fmt, write_lock=write_slot())
+    except RequestEntityTooLarge:
+        return jsonify(error=f'Request body is limited to {max_bytes} bytes.'), 413
+    except UnicodeDecodeError:
+        return jsonify(error='Request body must be UTF-8.'), 400
+    return jsonify(report)
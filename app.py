@@ -3,67 +3,715 @@ Personal Website Flask Application
 A modern, responsive personal portfolio website built with Flask and Bootstrap 5.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import (Flask, render_template, request, redirect, url_for, flash, abort, jsonify,
+                   make_response, send_file, send_from_directory, session, stream_with_context)
+from datetime import datetime, timezone
+from urllib.parse import quote
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import is_resource_modified
+from werkzeug.utils import safe_join
+from jinja2 import FileSystemBytecodeCache, pass_context
+from markupsafe import Markup, escape
+import click
+import cssbuild
+import functools
+import hashlib
+import itertools
+import mimetypes
 import os
-from DAL import init_db, get_all_projects, insert_project, delete_project
+import re
+import sys
+import uuid
+from time import perf_counter
+import freeze
+import images
+import migrations
+from admission import AdmissionController, WriteSlotsBusy, write_slot
+from api import api
+from assets import BUILD_DIRNAME, MANIFEST_NAME, build_assets, choose_encoding, load_manifest
+from bulk_import import SUPPORTED_FORMATS, detect_format, import_projects
+from compression import CompressionMiddleware
+from metrics import Metrics
+from outbox import LogSink, OutboxWorker, WebhookSink
+from querylog import QueryLog, SQL_PREVIEW_LENGTH
+from uploads import UploadRequest
+from validation import validate_project
+from DAL import (init_db, get_connection, get_data_stamp, get_projects_page, iter_projects, insert_project, delete_project,
+                 search_projects, enqueue_contact_message, outbox_counts,
+                 add_query_listener, HIGHLIGHT_START, HIGHLIGHT_END, QUERY_LOG_PATH)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 # Enable debug mode by default for development
 app.config['DEBUG'] = True
 
-# Initialize database on startup
-init_db()
+# FLASK_ENV=production (set in the Dockerfile) turns off the checks for
+# edited templates and static files, which stat files on every render
+app.config['TEMPLATES_AUTO_RELOAD'] = os.environ.get('FLASK_ENV') != 'production'
+
+# Compiled templates are kept in this directory so a new worker loads them
+# instead of parsing every template again; `flask compile-templates` fills it
+# at build time. Set JINJA_CACHE_DIR to an empty string to disable it.
+app.config['JINJA_CACHE_DIR'] = os.environ.get('JINJA_CACHE_DIR',
+                                               os.path.join(app.instance_path, 'jinja_cache'))
+if app.config['JINJA_CACHE_DIR']:
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {**app.jinja_options,
+                         'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])}
+
+# Number of projects shown per page on /projects
+app.config['PROJECTS_PAGE_SIZE'] = 20
+
+# Streamed pages are sent in chunks of roughly this many bytes
+app.config['STREAM_CHUNK_SIZE'] = 8192
+
+# Browser cache lifetime (seconds) for pre-rendered pages; they revalidate
+# with If-None-Match after this
+app.config['STATIC_PAGE_MAX_AGE'] = 300
+
+# Fingerprinted assets never change, so browsers may keep them for a year
+app.config['ASSET_MAX_AGE'] = 31536000
+
+# On-the-fly compression of text responses (see compression.py)
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_GZIP_LEVEL'] = 6
+app.config['COMPRESS_BROTLI_QUALITY'] = 4
+
+# Resized image variants (see images.py), cached on disk and shared by workers
+app.config['IMAGE_CACHE_DIR'] = os.environ.get('IMAGE_CACHE_DIR',
+                                               os.path.join(app.instance_path, 'image_cache'))
+app.config['IMAGE_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+app.config['IMAGE_QUALITY'] = 80
+app.config['IMAGE_MAX_AGE'] = 86400
+
+# Contact messages are queued in the outbox and delivered by OutboxWorker:
+# to CONTACT_WEBHOOK_URL when set, otherwise to the application log. With
+# OUTBOX_WORKER_THREAD each web process drains the outbox on a background
+# thread; turn it off when running `flask outbox-worker` separately.
+app.config['CONTACT_WEBHOOK_URL'] = os.environ.get('CONTACT_WEBHOOK_URL')
+app.config['OUTBOX_WORKER_THREAD'] = os.environ.get('OUTBOX_WORKER_THREAD', '1') == '1'
+
+# Admission control for the write routes (see admission.py): each client may
+# post WRITE_BURST times in a row and then WRITE_RATE times per second, and
+# at most WRITE_CONCURRENCY writes run at once across all workers. Requests
+# beyond that are answered at once with 429/503 and Retry-After. State is
+# kept in ADMISSION_DIR, which all workers must share.
+app.config['ADMISSION_CONTROL'] = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+app.config['ADMISSION_DIR'] = os.environ.get('ADMISSION_DIR',
+                                             os.path.join(app.instance_path, 'admission'))
+app.config['WRITE_RATE'] = 0.5
+app.config['WRITE_BURST'] = 10
+app.config['WRITE_CONCURRENCY'] = 2
+
+# Request and query metrics, shared by all worker processes through files in
+# this directory and served at /metrics
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+
+# Project images uploaded through /projects/new (see uploads.py) are stored
+# under static/images/IMAGE_UPLOAD_SUBDIR, named by their SHA-256 so the same
+# image is kept once. Each upload may be up to IMAGE_UPLOAD_MAX_BYTES, and
+# its request body UPLOAD_FORM_OVERHEAD bytes more for the other fields.
+app.config['IMAGE_UPLOAD_SUBDIR'] = 'uploads'
+app.config['IMAGE_UPLOAD_MAX_BYTES'] = 10 * 1024 * 1024
+app.config['UPLOAD_FORM_OVERHEAD'] = 64 * 1024
+
+# Largest request body accepted by the bulk import API
+app.config['BULK_IMPORT_MAX_BYTES'] = 32 * 1024 * 1024
+
+# Static export (see freeze.py): `flask freeze` renders the read-only pages
+# into FREEZE_DIR for a static file server. When FREEZE_DIR is set in the
+# environment, the pages built from projects are regenerated after each
+# write this process commits.
+app.config['FREEZE_DIR'] = os.environ.get('FREEZE_DIR')
+
+def create_app(config=None):
+    """
+    Apply config overrides and bring the database schema up to date.
+
+    Servers should start the site through this factory (e.g. gunicorn
+    'app:create_app()') so a pending migration runs at boot rather than on
+    the first request, and the outbox worker thread starts right away to
+    deliver messages left from before a restart. Importing this module
+    never touches the database, and once the schema is current the check
+    is a single PRAGMA read.
+
+    Args:
+        config: Optional mapping of settings to put into app.config
+
+    Returns:
+        The configured Flask application
+    """
+    if config:
+        app.config.update(config)
+    init_db()
+    start_outbox_worker()
+    return app
+
+app.register_blueprint(api)
+
+metrics = Metrics(app.config['METRICS_DIR'])
+
+def record_query(function, seconds, rows):
+    """Forward DAL query timings to the metrics of this process."""
+    metrics.observe_query(function, seconds, rows)
+
+add_query_listener(record_query)
+
+if app.config['FREEZE_DIR']:
+    add_query_listener(freeze.refresh_after_write(app, app.config['FREEZE_DIR']))
+
+# These hooks run on every request. Each attribute read through the request
+# proxy costs about as much as recording the metrics, so the underlying
+# request object is fetched once.
+
+@app.before_request
+def start_request_timer():
+    """Note when the request started, for the latency histogram."""
+    request._get_current_object().environ['app.request_start'] = perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the endpoint's latency and response status."""
+    req = request._get_current_object()
+    start = req.environ.get('app.request_start')
+    if start is not None:
+        metrics.observe_request(req.endpoint or 'unmatched', req.method,
+                                response.status_code, perf_counter() - start)
+    return response
+
+admission = AdmissionController(app.config['ADMISSION_DIR'], app.config['WRITE_RATE'],
+                                app.config['WRITE_BURST'], app.config['WRITE_CONCURRENCY'])
+app.extensions['admission'] = admission
+
+# POST endpoints that write to the database and go through admission control;
+# each holds admission.write_slot() around its write
+WRITE_ENDPOINTS = frozenset({'new_project', 'delete_project_route', 'contact',
+                             'api.bulk_import_projects'})
+
+def _refusal(status, retry_after):
+    """A 429/503 response with Retry-After, as JSON for the API."""
+    message = 'Too many requests' if status == 429 else 'Server busy'
+    if request.blueprint == 'api':
+        response = jsonify(error=message)
+    else:
+        response = app.response_class(f'{message}, retry in {retry_after}s\n',
+                                      mimetype='text/plain')
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.before_request
+def admit_write():
+    """Refuse writes beyond the client's rate before the body is read."""
+    req = request._get_current_object()
+    if (req.method != 'POST' or req.endpoint not in WRITE_ENDPOINTS
+            or not app.config['ADMISSION_CONTROL'] or app.testing):
+        return None
+    refusal = app.extensions['admission'].admit(req.remote_addr or 'unknown')
+    if refusal is None:
+        return None
+    return _refusal(*refusal)
+
+@app.errorhandler(WriteSlotsBusy)
+def write_slots_busy(error):
+    """Answer 503 when every global write slot is taken."""
+    return _refusal(503, 1)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, summed over every worker process."""
+    return app.response_class(metrics.render(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Compress HTML/CSS/JS responses for clients that accept gzip or brotli
+app.wsgi_app = CompressionMiddleware(app.wsgi_app,
+                                     min_size=app.config['COMPRESS_MIN_SIZE'],
+                                     gzip_level=app.config['COMPRESS_GZIP_LEVEL'],
+                                     brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'])
+
+# Fingerprinted asset paths written by `flask build-assets`
+asset_manifest = load_manifest(app.static_folder)
+_asset_manifest_mtime = os.path.getmtime(
+    os.path.join(app.static_folder, BUILD_DIRNAME, MANIFEST_NAME)) if asset_manifest else 0
+
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    """Point url_for('static', ...) at the fingerprinted copy of a file."""
+    if endpoint != 'static' or not asset_manifest:
+        return
+    filename = values.get('filename')
+    hashed = asset_manifest.get(filename)
+    if hashed is None:
+        return
+    # While reloading is on, fall back to the source file once it has been
+    # edited, or removed (the 404 then points at the real culprit)
+    if app.jinja_env.auto_reload:
+        try:
+            mtime = os.path.getmtime(os.path.join(app.static_folder, filename))
+        except OSError:
+            return
+        if mtime > _asset_manifest_mtime:
+            return
+    values['filename'] = hashed
+
+def static_asset(filename):
+    """
+    Static file handler that serves fingerprinted assets precompressed.
+
+    Files under static/build/ are immutable, so they get a one year
+    Cache-Control and the best .br/.gz variant the client accepts. Anything
+    else falls through to Flask's default static handling.
+    """
+    if not filename.startswith(BUILD_DIRNAME + '/'):
+        return app.send_static_file(filename)
+
+    variant = choose_encoding(app.static_folder, filename, request.accept_encodings)
+    if variant is None:
+        response = send_from_directory(app.static_folder, filename, max_age=app.config['ASSET_MAX_AGE'])
+    else:
+        encoding, variant_filename = variant
+        response = send_from_directory(app.static_folder, variant_filename,
+                                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                                       max_age=app.config['ASSET_MAX_AGE'])
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Disposition', None)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = static_asset
+
+image_cache = images.ImageVariantCache(app.config['IMAGE_CACHE_DIR'],
+                                      max_bytes=app.config['IMAGE_CACHE_MAX_BYTES'],
+                                      quality=app.config['IMAGE_QUALITY'])
+
+@app.route('/img/<path:filename>')
+def image_variant(filename):
+    """
+    Serve a static image resized to ?w= pixels wide, encoded as ?fmt=.
+
+    Widths are rounded up to images.WIDTHS. Without ?fmt= the format is
+    negotiated from the Accept header (WebP when supported). Files Pillow
+    cannot resize, including corrupt or oversized images, or every file when
+    Pillow is not installed, are served unchanged.
+    """
+    source = safe_join(app.static_folder, filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+    if images.Image is None or not images.is_raster(filename):
+        return send_from_directory(app.static_folder, filename, max_age=app.config['IMAGE_MAX_AGE'])
+
+    fmt = request.args.get('fmt')
+    if fmt is not None and fmt not in images.FORMATS:
+        abort(400)
+    negotiated = fmt is None
+    if negotiated:
+        fmt = images.default_format(filename, request.accept_mimetypes)
+    width = images.snap_width(request.args.get('w', type=int))
+
+    try:
+        path, key = image_cache.get(source, width, fmt)
+    except images.DECODE_ERRORS:
+        app.logger.warning('Cannot resize %s; serving the original', filename, exc_info=True)
+        return send_from_directory(app.static_folder, filename, max_age=app.config['IMAGE_MAX_AGE'])
+    response = send_file(path, mimetype=images.FORMATS[fmt][1], etag=key,
+                         max_age=app.config['IMAGE_MAX_AGE'])
+    response.cache_control.public = True
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+# /img/ URL prefix per script root; image_url() runs several times per table
+# row, so the route is built once instead of through url_for() every time
+_image_url_prefixes = {}
+
+@app.template_global()
+def image_url(filename, width, fmt=None):
+    """URL of a resized variant of a file under static/."""
+    prefix = _image_url_prefixes.get(request.script_root)
+    if prefix is None:
+        prefix = url_for('image_variant', filename='_')[:-1]
+        _image_url_prefixes[request.script_root] = prefix
+    url = f'{prefix}{quote(filename)}?w={images.snap_width(width)}'
+    return url if fmt is None else f'{url}&fmt={quote(fmt)}'
+
+@app.template_global()
+def image_srcset(filename, widths):
+    """A srcset attribute value listing variants of filename at each width."""
+    return ', '.join(f'{image_url(filename, width)} {images.snap_width(width)}w' for width in widths)
+
+# Critical CSS of each page template, read once per worker
+_critical_css = {}
+
+@app.template_global()
+@pass_context
+def critical_css(context):
+    """
+    CSS to inline for the page being rendered (see cssbuild.py), or None to
+    link the full stylesheets instead: before `flask build-css` has run, or
+    while TEMPLATES_AUTO_RELOAD is on and a source changed after the build.
+    """
+    return _page_critical_css(context.name)
+
+def _page_critical_css(name):
+    if app.jinja_env.auto_reload:
+        if cssbuild.is_stale(app.static_folder, os.path.join(app.root_path, app.template_folder)):
+            return None
+        css = cssbuild.load_critical(app.static_folder, name)
+        return Markup(css) if css is not None else None
+    if name not in _critical_css:
+        css = cssbuild.load_critical(app.static_folder, name)
+        # Built from our own stylesheets; escaping would break selectors like a>b
+        _critical_css[name] = Markup(css) if css is not None else None
+    return _critical_css[name]
+
+outbox_worker = OutboxWorker(WebhookSink(app.config['CONTACT_WEBHOOK_URL'])
+                             if app.config['CONTACT_WEBHOOK_URL'] else LogSink())
+
+def start_outbox_worker():
+    """Drain the outbox on a thread of this process unless OUTBOX_WORKER_THREAD is off."""
+    if app.config['OUTBOX_WORKER_THREAD'] and not app.testing:
+        outbox_worker.start()  # no-op once running
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver what is due and exit.')
+def outbox_worker_command(once):
+    """Deliver queued contact messages."""
+    if once:
+        while outbox_worker.drain_once() == outbox_worker.batch_size:
+            pass
+        click.echo(', '.join(f'{status}: {count}' for status, count in outbox_counts().items()))
+        return
+    click.echo('Delivering contact messages; press Ctrl+C to stop')
+    try:
+        outbox_worker.run()
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending database schema migrations."""
+    init_db()
+    version = migrations.schema_version(get_connection())
+    click.echo(f'Database schema is at version {version} of {migrations.LATEST_VERSION}')
+
+def compile_templates():
+    """
+    Compile every template so its bytecode is written to JINJA_CACHE_DIR.
+
+    Templates whose source has not changed since they were cached are
+    skipped. Only templates not yet in this process's template cache are
+    compiled, so this is meant to run in a fresh process.
+
+    Returns:
+        Names of the templates found
+    """
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Precompile templates into the Jinja bytecode cache."""
+    if app.jinja_env.bytecode_cache is None:
+        raise click.UsageError('JINJA_CACHE_DIR is empty; there is no cache to fill.')
+    names = compile_templates()
+    click.echo(f"Compiled {len(names)} templates into {app.config['JINJA_CACHE_DIR']}")
+
+@app.cli.command('build-css')
+def build_css_command():
+    """Purge and minify the stylesheets into a bundle and per-page critical CSS."""
+    sizes = cssbuild.build_css(app.static_folder, os.path.join(app.root_path, app.template_folder))
+    click.echo(f"Bundled {sizes['sources']} bytes of CSS into {sizes[cssbuild.BUNDLE_NAME]} "
+               f"({cssbuild.BUNDLE_NAME}), with critical CSS for {len(sizes) - 2} templates")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static files into static/build/."""
+    # Uploaded project images are content-addressed already and not part of a deploy
+    manifest = build_assets(app.static_folder,
+                            exclude=[os.path.join('images', app.config['IMAGE_UPLOAD_SUBDIR'])])
+    click.echo(f'Built {len(manifest)} assets into {os.path.join(app.static_folder, BUILD_DIRNAME)}')
+
+@app.cli.command('freeze')
+@click.option('--output', type=click.Path(file_okay=False),
+              help='Output directory (default: FREEZE_DIR or instance/frozen).')
+@click.option('--watch', is_flag=True, help='Keep regenerating the project pages when the data changes.')
+@click.option('--interval', default=1.0, show_default=True, help='Seconds between checks with --watch.')
+def freeze_command(output, watch, interval):
+    """Render the read-only pages into static files for a static server."""
+    output = output or app.config['FREEZE_DIR'] or os.path.join(app.instance_path, 'frozen')
+    written = freeze.freeze(app, output)
+    click.echo(f'Froze {len(written)} pages into {output}')
+    if watch:
+        click.echo('Watching for project changes; press Ctrl+C to stop')
+        try:
+            freeze.watch(app, output, interval)
+        except KeyboardInterrupt:
+            pass
+
+@app.cli.command('import-projects')
+@click.argument('source')
+@click.option('--format', 'fmt', type=click.Choice(SUPPORTED_FORMATS),
+              help='Input format (default: from the file extension).')
+def import_projects_command(source, fmt):
+    """Bulk import projects from a JSONL or CSV file ('-' for stdin)."""
+    fmt = fmt or detect_format(filename=source)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+
+    if source == '-':
+        report = import_projects(sys.stdin, fmt)
+    else:
+        with open(source, encoding='utf-8', newline='') as f:
+            report = import_projects(f, fmt)
+
+    for error in report['errors']:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f"Imported {report['inserted']} projects, {report['error_count']} rows rejected")
+
+@app.cli.command('query-report')
+@click.option('--log', 'log_path', type=click.Path(dir_okay=False), default=QUERY_LOG_PATH,
+              show_default=True, help='Slow query log written by the DAL.')
+@click.option('--top', default=10, show_default=True, help='Number of statements to list.')
+def query_report_command(log_path, top):
+    """List the slowest logged SQL statements by total time, with their query plans."""
+    stats = QueryLog(log_path).summarize(top)
+    if not stats:
+        click.echo(f'No slow queries in {log_path}; run the site with DAL_QUERY_DIAGNOSTICS=1 '
+                   'to record them.')
+        return
+    click.echo(f'Top {len(stats)} statements by total time in {log_path}')
+    for rank, stat in enumerate(stats, 1):
+        click.echo(f"{rank:3}. {stat['total_ms']:.1f} ms total, {stat['calls']} calls, "
+                   f"{stat['max_ms']:.1f} ms max, {stat['rows']} rows")
+        click.echo(f"     {stat['sql'][:SQL_PREVIEW_LENGTH]}")
+        for line in stat['plan'] or ():
+            click.echo(f'     plan: {line}')
+        for flag in stat['flags']:
+            click.echo(f'     WARNING: {flag}')
+
+# Rendered bytes of pages whose output only depends on the templates and the
+# active nav item, keyed by (endpoint, template, script root)
+_static_pages = {}
+
+def _templates_fingerprint():
+    """Modification times of all templates, used to spot edits while reloading is on."""
+    with os.scandir(os.path.join(app.root_path, app.template_folder)) as entries:
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries))
+
+def render_static_page(template_name):
+    """
+    Serve a template rendered once per worker, with a strong ETag.
+
+    The page is re-rendered only when a template changes (checked while
+    TEMPLATES_AUTO_RELOAD is on) and conditional requests are answered with
+    304 Not Modified.
+    """
+    key = (request.endpoint, template_name, request.script_root)
+    fingerprint = _templates_fingerprint() if app.jinja_env.auto_reload else None
+    page = _static_pages.get(key)
+    if page is None or page[0] != fingerprint:
+        body = render_template(template_name).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        page = (fingerprint, body, etag, f'"{etag}"')
+        _static_pages[key] = page
+
+    # Headers are set as plain strings; this path runs on every hit
+    headers = {
+        'ETag': page[3],
+        'Cache-Control': f"public, max-age={app.config['STATIC_PAGE_MAX_AGE']}",
+    }
+    if request.if_none_match.contains_weak(page[2]):
+        return app.response_class(status=304, headers=headers)
+    return app.response_class(page[1], mimetype='text/html', headers=headers)
 
 @app.route('/')
 def index():
     """Home page - main landing page with hero section and quick links."""
-    return render_template('index.html')
+    return render_static_page('index.html')
 
 @app.route('/about')
 def about():
     """About page - personal information, skills, and background."""
-    return render_template('about.html')
+    return render_static_page('about.html')
 
 @app.route('/resume')
 def resume():
     """Resume page - professional experience, education, and skills."""
-    return render_template('resume.html')
+    return render_static_page('resume.html')
+
+def stream_page(template_name, **context):
+    """
+    Render a template incrementally and return a streamed response.
+
+    Jinja yields many tiny strings; they are grouped into chunks of about
+    STREAM_CHUNK_SIZE bytes so each write (and compression flush) is worth
+    sending, while the page head and nav still go out before the body is
+    done. The critical CSS inlined in the head does not count towards the
+    first chunk, which would otherwise end inside the head.
+    """
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+    first_chunk_size = chunk_size + len(_page_critical_css(template.name) or '')
+
+    def generate():
+        buffer, size, limit = [], 0, first_chunk_size
+        for piece in template.generate(context):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= limit:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size, limit = [], 0, chunk_size
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+
+    return app.response_class(stream_with_context(generate()), mimetype='text/html')
+
+# (fingerprint, digest, newest mtime) of the templates and asset manifest
+# that data pages are rendered with; see _render_version
+_render_state = None
+
+def _render_version():
+    """
+    Digest and modification time of everything besides the data that a
+    data page is rendered from. Computed once per worker, or on every call
+    while TEMPLATES_AUTO_RELOAD is on.
+    """
+    global _render_state
+    if _render_state is None or app.jinja_env.auto_reload:
+        templates = _templates_fingerprint()
+        fingerprint = (templates, _asset_manifest_mtime)
+        if _render_state is None or _render_state[0] != fingerprint:
+            digest = hashlib.sha256(repr(fingerprint).encode('utf-8')).hexdigest()[:16]
+            newest = max([mtime / 1e9 for _, mtime in templates] + [_asset_manifest_mtime])
+            _render_state = (fingerprint, digest,
+                             datetime.fromtimestamp(int(newest), timezone.utc))
+    return _render_state[1], _render_state[2]
+
+def conditional_on_data(view):
+    """
+    Answer conditional GETs of a page built from the projects table.
+
+    The ETag covers the DAL change counter, the full URL and the templates
+    and assets, and Last-Modified is the later of the last data change and
+    the newest template, so a matching request gets 304 without running the
+    view. Responses carrying flash messages differ per session, so they are
+    rendered in full and never stored.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('_flashes'):
+            response = make_response(view(*args, **kwargs))
+            response.cache_control.no_store = True
+            return response
+
+        version, changed_at = get_data_stamp()
+        digest, rendered_at = _render_version()
+        etag = hashlib.sha256(
+            f'{version}:{digest}:{request.script_root}{request.full_path}'.encode('utf-8')
+        ).hexdigest()[:32]
+        last_modified = max(changed_at, rendered_at) if changed_at else rendered_at
+        if not is_resource_modified(request.environ, etag, last_modified=last_modified):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # The change time has one second resolution: a write later in the
+        # same second would not move it, so it is only sent once that
+        # second is over
+        if (datetime.now(timezone.utc) - last_modified).total_seconds() >= 1:
+            response.last_modified = last_modified
+        # Stored, but revalidated before every reuse
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
 
 @app.route('/projects')
+@conditional_on_data
 def projects():
     """Projects page - portfolio of work and GitHub repositories."""
-    projects_list = get_all_projects()
-    return render_template('projects.html', projects=projects_list)
+    if request.args.get('all'):
+        # Whole portfolio: stream rows straight from the DAL cursor
+        rows = iter_projects()
+        first = next(rows, None)
+        return stream_page('projects.html',
+                           projects=itertools.chain([first], rows) if first else [],
+                           next_cursor=None, prev_cursor=None, link_args={})
+
+    limit = request.args.get('limit', app.config['PROJECTS_PAGE_SIZE'], type=int)
+    try:
+        page = get_projects_page(after=request.args.get('after'),
+                                 before=request.args.get('before'),
+                                 limit=limit)
+    except ValueError:
+        abort(400)
+
+    # Only carry an explicit page size through the next/prev links
+    link_args = {'limit': limit} if 'limit' in request.args else {}
+    return render_template('projects.html',
+                           projects=page['projects'],
+                           next_cursor=page['next_cursor'],
+                           prev_cursor=page['prev_cursor'],
+                           link_args=link_args)
+
+@app.template_filter('highlight')
+def highlight_filter(text):
+    """Escape search output and mark matched terms with <mark>."""
+    return Markup(str(escape(text))
+                  .replace(HIGHLIGHT_START, '<mark>')
+                  .replace(HIGHLIGHT_END, '</mark>'))
+
+@app.route('/projects/search')
+def search_projects_route():
+    """Search page - ranked full-text search over project titles and descriptions."""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', app.config['PROJECTS_PAGE_SIZE'], type=int)
+    results = search_projects(query, limit) if query else []
+    return render_template('search.html', query=query, results=results)
 
 @app.route('/projects/new', methods=['GET', 'POST'])
 def new_project():
     """Add new project page - form to create new projects."""
     if request.method == 'POST':
+        # Uploaded images stream to disk as the body is parsed
+        max_bytes = app.config['IMAGE_UPLOAD_MAX_BYTES']
+        request.accept_uploads(os.path.join(app.static_folder, 'images',
+                                            app.config['IMAGE_UPLOAD_SUBDIR']),
+                               max_bytes, max_bytes + app.config['UPLOAD_FORM_OVERHEAD'])
+        try:
+            form, files = request.form, request.files
+        except RequestEntityTooLarge:
+            flash(f'Images must be at most {max_bytes // (1024 * 1024)} MB.', 'error')
+            return render_template('project_form.html'), 413
+
         # Handle form submission
-        title = request.form.get('title', '').strip()
-        description = request.form.get('description', '').strip()
-        image_filename = request.form.get('image_filename', '').strip()
-        
+        title = form.get('title', '').strip()
+        description = form.get('description', '').strip()
+        image_filename = form.get('image_filename', '').strip()
+        upload = files.get('image')
+        if upload is not None and not upload.filename:
+            upload = None  # the file input was left empty
+
         # Basic validation
-        if not all([title, description, image_filename]):
-            flash('All fields are required.', 'error')
-            return render_template('project_form.html', 
-                                 title=title, 
-                                 description=description, 
-                                 image_filename=image_filename)
-        
-        if len(title) < 3:
-            flash('Title must be at least 3 characters long.', 'error')
-            return render_template('project_form.html', 
-                                 title=title, 
-                                 description=description, 
-                                 image_filename=image_filename)
-        
-        if len(description) < 10:
-            flash('Description must be at least 10 characters long.', 'error')
+        error = validate_project(title, description,
+                                 upload.filename if upload else image_filename)
+        if not error and upload:
+            try:
+                image_filename = f"{app.config['IMAGE_UPLOAD_SUBDIR']}/{upload.stream.store()}"
+            except ValueError as e:
+                error = str(e)
+        if error:
+            flash(error, 'error')
             return render_template('project_form.html', 
                                  title=title, 
                                  description=description, 
@@ -71,9 +719,12 @@ def new_project():
         
         try:
             # Insert the new project
-            insert_project(title, description, image_filename)
+            with write_slot():
+                insert_project(title, description, image_filename)
             flash('Project added successfully!', 'success')
             return redirect(url_for('projects'))
+        except WriteSlotsBusy:
+            raise
         except Exception as e:
             flash(f'Error adding project: {str(e)}', 'error')
             return render_template('project_form.html', 
@@ -87,16 +738,22 @@ def new_project():
 def delete_project_route(project_id):
     """Delete a project by ID."""
     try:
-        success = delete_project(project_id)
+        with write_slot():
+            success = delete_project(project_id)
         if success:
             flash('Project deleted successfully!', 'success')
         else:
             flash('Project not found.', 'error')
+    except WriteSlotsBusy:
+        raise
     except Exception as e:
         flash(f'Error deleting project: {str(e)}', 'error')
     
     return redirect(url_for('projects'))
 
+# Form-supplied idempotency keys are uuid4 hex strings rendered into the form
+CONTACT_KEY_PATTERN = re.compile(r'[0-9a-f]{32}')
+
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
     """Contact page - contact form and information."""
@@ -111,23 +768,33 @@ def contact():
         # Basic validation
         if not all([first_name, last_name, email, subject, message]):
             flash('All fields are required.', 'error')
-            return render_template('contact.html')
+            return render_template('contact.html', idempotency_key=uuid.uuid4().hex)
         
         if len(message) < 10:
             flash('Message must be at least 10 characters long.', 'error')
-            return render_template('contact.html')
+            return render_template('contact.html', idempotency_key=uuid.uuid4().hex)
         
-        # In a real application, you would send an email or save to database here
-        # For now, we'll just redirect to thank you page
+        # Queue the message; delivery happens off the request path
+        payload = {'first_name': first_name, 'last_name': last_name, 'email': email,
+                   'subject': subject, 'message': message}
+        key = request.form.get('idempotency_key', '')
+        if not CONTACT_KEY_PATTERN.fullmatch(key):
+            key = hashlib.sha256(repr(sorted(payload.items())).encode('utf-8')).hexdigest()
+        with write_slot():
+            enqueue_contact_message(payload, key)
+        # Also restarts the thread in workers forked after create_app() ran
+        start_outbox_worker()
+        outbox_worker.wake()
+
         flash('Thank you for your message! I\'ll get back to you soon.', 'success')
         return redirect(url_for('thank_you'))
     
-    return render_template('contact.html')
+    return render_template('contact.html', idempotency_key=uuid.uuid4().hex)
 
 @app.route('/thank-you')
 def thank_you():
     """Thank you page - confirmation after form submission."""
-    return render_template('thankyou.html')
+    return render_static_page('thankyou.html')
 
 # Error handlers
 @app.errorhandler(404)
@@ -142,4 +809,4 @@ def internal_error(error):
 
 if __name__ == '__main__':
     # Run the Flask development server
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
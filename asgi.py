@@ -0,0 +1,302 @@
+"""
+ASGI Entry Point for Personal Website
+Serves the site from an asyncio event loop, e.g.
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+Request bodies are read and responses are written by the event loop, so a
+slow client costs a coroutine rather than a worker. The hot JSON API reads
+are answered natively through AsyncDAL; every other route runs the regular
+Flask application on a bounded thread pool. When a pool is full the server
+answers 503 with Retry-After instead of queueing without limit.
+"""
+
+import contextvars
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import app as app_module
+from api import parse_fields
+from async_dal import AsyncDAL, BoundedExecutor, PoolSaturatedError
+from compression import CompressionMiddleware
+
+# Threads running Flask for routes without a native handler, and how many
+# more requests may wait for one
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "16"))
+WSGI_MAX_PENDING = int(os.environ.get("ASGI_WSGI_MAX_PENDING", "64"))
+
+# Threads running DAL queries for the native handlers
+DAL_THREADS = int(os.environ.get("ASGI_DAL_THREADS", "8"))
+DAL_MAX_PENDING = int(os.environ.get("ASGI_DAL_MAX_PENDING", "128"))
+
+# Request bodies larger than this are spooled to a temporary file
+BODY_SPOOL_SIZE = 1024 * 1024
+
+# Seconds clients are asked to wait after a 503
+RETRY_AFTER = 1
+
+_PROJECT_PATH = re.compile(r"/api/projects/(\d+)")
+
+
+def build_environ(scope: Dict, body) -> Dict:
+    """
+    Translate an ASGI HTTP scope into a WSGI environ.
+
+    Args:
+        scope: ASGI connection scope
+        body: File object holding the request body
+
+    Returns:
+        WSGI environ dictionary
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path,
+        # WSGI carries the decoded path as latin-1 "bytes in a str"
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # The body is read in full beforehand, so it may be consumed without
+        # a Content-Length (chunked uploads)
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    """
+    ASGI application serving the Flask site.
+
+    Native handlers cover GET /api/projects (JSON pages) and
+    GET /api/projects/<id>; they return the same data as the Flask views
+    and record the same request metrics. Everything else, including
+    ?format=ndjson, is passed to flask_app: its response is pulled chunk by
+    chunk on the WSGI pool, so a thread is only held while Flask produces a
+    chunk, never while a slow client receives it.
+    """
+
+    def __init__(self, flask_app, dal: Optional[AsyncDAL] = None,
+                 wsgi_pool: Optional[BoundedExecutor] = None):
+        self.flask_app = flask_app
+        self.dal = dal or AsyncDAL(DAL_THREADS, DAL_MAX_PENDING)
+        self.wsgi_pool = wsgi_pool or BoundedExecutor(WSGI_THREADS, WSGI_MAX_PENDING,
+                                                      thread_name_prefix="asgi-wsgi")
+        compression = flask_app.wsgi_app
+        self.compression = compression if isinstance(compression, CompressionMiddleware) else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            start = time.perf_counter()
+            try:
+                handled = await self._native(scope, send, start)
+                if not handled:
+                    await self._wsgi(scope, receive, send)
+            except PoolSaturatedError:
+                await self._respond(send, 503, b"Server busy, retry shortly\n", "text/plain",
+                                    [(b"retry-after", str(RETRY_AFTER).encode())])
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.dal.shutdown(wait=False)
+                self.wsgi_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _respond(self, send, status: int, body: bytes, content_type: str,
+                       headers: List[Tuple[bytes, bytes]] = ()):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode("latin-1")),
+                                (b"content-length", str(len(body)).encode()), *headers]})
+        await send({"type": "http.response.body", "body": body})
+
+    # Native handlers
+
+    async def _native(self, scope, send, start: float) -> bool:
+        """Answer the request without Flask if a native handler covers it."""
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        if scope["method"] != "GET" or not path.startswith("/api/projects"):
+            return False
+        args = {key: values[0] for key, values in
+                parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        if path == "/api/projects":
+            if args.get("format", "json") != "json":
+                return False
+            endpoint = "api.list_projects"
+            status, data = await self._list_projects(args)
+        else:
+            match = _PROJECT_PATH.fullmatch(path)
+            if match is None:
+                return False
+            endpoint = "api.get_project"
+            status, data = await self._get_project(int(match.group(1)), args)
+
+        body = self.flask_app.json.dumps(data).encode("utf-8") + b"\n"
+        headers = []
+        if self.compression is not None and len(body) >= self.compression.min_size:
+            accept = next((value.decode("latin-1") for name, value in scope["headers"]
+                           if name == b"accept-encoding"), "")
+            encoding = self.compression.negotiate(accept)
+            if encoding is not None:
+                body = self.compression.compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+        await self._respond(send, status, body, "application/json", headers)
+        app_module.metrics.observe_request(endpoint, "GET", status, time.perf_counter() - start)
+        return True
+
+    async def _list_projects(self, args: Dict[str, str]):
+        try:
+            fields = parse_fields(args.get("fields"))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        try:
+            limit = int(args["limit"])
+        except (KeyError, ValueError):
+            limit = self.flask_app.config["PROJECTS_PAGE_SIZE"]
+        try:
+            page = await self.dal.get_projects_page(after=args.get("after"),
+                                                    before=args.get("before"),
+                                                    limit=limit, fields=fields)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        return 200, page
+
+    async def _get_project(self, project_id: int, args: Dict[str, str]):
+        try:
+            project = await self.dal.get_project_by_id(project_id,
+                                                       fields=parse_fields(args.get("fields")))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if project is None:
+            return 404, {"error": "Project not found"}
+        return 200, project
+
+    # Everything else: the Flask application on the WSGI pool
+
+    def max_body_bytes(self) -> int:
+        """
+        Largest request body any route accepts: an image upload with its
+        form, a bulk import, or MAX_CONTENT_LENGTH if that is larger.
+        """
+        config = self.flask_app.config
+        return max(config["IMAGE_UPLOAD_MAX_BYTES"] + config["UPLOAD_FORM_OVERHEAD"],
+                   config["BULK_IMPORT_MAX_BYTES"], config.get("MAX_CONTENT_LENGTH") or 0)
+
+    async def _read_body(self, scope, receive):
+        """
+        The request body in a spooled file, None if the client disconnected,
+        or False if it is longer than max_body_bytes(). An oversized
+        Content-Length is refused before any of the body is read, and any
+        body stops being read as soon as it passes the limit.
+        """
+        limit = self.max_body_bytes()
+        length = next((value for name, value in scope["headers"] if name == b"content-length"), b"")
+        if length.isdigit() and int(length) > limit:
+            return False
+        body = tempfile.SpooledTemporaryFile(BODY_SPOOL_SIZE)
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                body.close()
+                return False
+            body.write(chunk)
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+        return body
+
+    async def _wsgi(self, scope, receive, send):
+        body = await self._read_body(scope, receive)
+        if body is None:
+            return
+        if body is False:
+            await self._respond(send, 413, b"Request body too large\n", "text/plain")
+            return
+        environ = build_environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                   for name, value in headers]
+
+        # Flask's contexts live in context variables, and a streamed body
+        # keeps its request context across chunks pulled on different pool
+        # threads, so every step runs inside this request's own context
+        context = contextvars.copy_context()
+        iterable = await self.wsgi_pool.run(context.run, self.flask_app, environ, start_response)
+        iterator = iter(iterable)
+        try:
+            while True:
+                chunk = await self.wsgi_pool.run_waiting(context.run, next, iterator, None)
+                if chunk is None:
+                    break
+                if not response.get("sent"):
+                    await send({"type": "http.response.start", "status": response["status"],
+                                "headers": response["headers"]})
+                    response["sent"] = True
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not response.get("sent"):
+                await send({"type": "http.response.start", "status": response["status"],
+                            "headers": response["headers"]})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                await self.wsgi_pool.run_waiting(context.run, iterable.close)
+            body.close()
+
+
+app = AsgiApp(app_module.create_app())
@@ -0,0 +1,140 @@
+"""
+Static Asset Pipeline for Personal Website
+Fingerprints files under static/ by content hash, writes gzip and brotli
+variants next to each hashed copy and records the mapping in a manifest.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+# Hashed copies are written to static/<BUILD_DIRNAME>/ mirroring static/
+BUILD_DIRNAME = "build"
+MANIFEST_NAME = "manifest.json"
+
+# Only text formats benefit from compression; images are already compressed
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt", ".xml", ".map"}
+
+# Precompressed variants in order of preference: (encoding, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+HASH_LENGTH = 12
+
+
+def _hashed_name(relpath: str, digest: str) -> str:
+    """Insert the content digest before the extension: css/a.css -> css/a.<digest>.css"""
+    root, ext = os.path.splitext(relpath)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def write_compressed(path: str, data: bytes, brotli_quality: int = 11) -> None:
+    """
+    Write .gz (and .br when available) next to path if they are smaller.
+
+    Variants left by an earlier version of the file are replaced or, when
+    not worth writing this time, removed. Each is written to a temporary
+    file and renamed into place, so a server never reads a partial one.
+    """
+    variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(data, quality=brotli_quality)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            write_atomic(path + suffix, compressed)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Replace the file at path with data in a single rename."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_dir: str, exclude: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Fingerprint and precompress every file under static_dir.
+
+    The previous build directory is replaced. Each source file is copied to
+    static/build/<path>.<hash><ext> with compressed variants alongside, and
+    static/build/manifest.json maps source paths to hashed paths.
+
+    Args:
+        static_dir: The Flask static folder
+        exclude: Directories relative to static_dir to leave out, e.g. ones
+                 holding user uploads rather than deployed files
+
+    Returns:
+        Manifest mapping "css/styles.css" -> "build/css/styles.<hash>.css"
+    """
+    build_dir = os.path.join(static_dir, BUILD_DIRNAME)
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+
+    skipped = {os.path.normpath(os.path.join(static_dir, path)) for path in exclude}
+    skipped.add(os.path.normpath(build_dir))
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.normpath(os.path.join(root, d)) not in skipped)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relpath = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            hashed = f"{BUILD_DIRNAME}/{_hashed_name(relpath, hashlib.sha256(data).hexdigest())}"
+            target = os.path.join(static_dir, *hashed.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                write_compressed(target, data)
+            manifest[relpath] = hashed
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir: str) -> Dict[str, str]:
+    """
+    Load the manifest written by build_assets.
+
+    Returns:
+        The manifest, or an empty dict if assets have not been built
+    """
+    path = os.path.join(static_dir, BUILD_DIRNAME, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def choose_encoding(static_dir: str, filename: str, accept_encodings) -> Optional[tuple]:
+    """
+    Pick the best precompressed variant of filename the client accepts.
+
+    Args:
+        static_dir: The Flask static folder
+        filename: Path relative to static_dir
+        accept_encodings: The request's parsed Accept-Encoding header
+
+    Returns:
+        Tuple of (encoding, variant filename), or None to send the original
+    """
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+            return encoding, filename + suffix
+    return None
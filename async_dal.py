@@ -0,0 +1,116 @@
+"""
+Async Data Access for Personal Website
+Lets asyncio code call the DAL without blocking the event loop: SQLite calls
+run on a bounded thread pool, and callers are turned away once the pool and
+its queue are full instead of piling up without limit.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import DAL
+
+
+class PoolSaturatedError(RuntimeError):
+    """
+    Raised when a BoundedExecutor cannot accept more work in time; servers
+    should answer 503 so clients back off.
+    """
+
+
+class BoundedExecutor:
+    """
+    Thread pool for blocking calls made from an event loop.
+
+    At most max_workers calls run at once and up to max_pending more wait
+    for a thread. A caller arriving when both are full waits up to
+    acquire_timeout seconds for room, then gets PoolSaturatedError. The
+    limit is what provides backpressure: without it a burst of requests
+    would queue unbounded work behind a few slow queries.
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 32,
+                 acquire_timeout: float = 1.0, thread_name_prefix: str = "pool"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.acquire_timeout = acquire_timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=thread_name_prefix)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.rejected = 0
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) on the pool and return its result.
+
+        Raises:
+            PoolSaturatedError: If no slot frees up within acquire_timeout
+        """
+        return await self._run(self.acquire_timeout, func, args, kwargs)
+
+    async def run_waiting(self, func: Callable, *args, **kwargs):
+        """
+        Like run(), but wait for a slot however long it takes.
+
+        For work that continues something already admitted, such as the rest
+        of a response whose headers were sent, which can no longer be refused.
+        """
+        return await self._run(None, func, args, kwargs)
+
+    async def _run(self, timeout: Optional[float], func: Callable, args, kwargs):
+        if self._slots is None:
+            # Created on first use so it belongs to the running loop
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_pending)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolSaturatedError(
+                f"{self.max_workers} threads busy and {self.max_pending} calls queued") from None
+        try:
+            call = functools.partial(func, *args, **kwargs) if args or kwargs else func
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._slots.release()
+
+    @property
+    def in_use(self) -> int:
+        """Number of calls running or queued."""
+        if self._slots is None:
+            return 0
+        return self.max_workers + self.max_pending - self._slots._value
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+class AsyncDAL:
+    """
+    Awaitable versions of the DAL functions.
+
+    Any public DAL function is available as a coroutine function of the same
+    name, e.g. ``await adal.get_project_by_id(3)``. Calls go through a
+    BoundedExecutor, and each pool thread keeps its own connection through
+    DAL.get_connection(), as the sync code does.
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 32,
+                 acquire_timeout: float = 1.0):
+        self.pool = BoundedExecutor(max_workers, max_pending, acquire_timeout,
+                                    thread_name_prefix="async-dal")
+
+    def __getattr__(self, name: str):
+        func = getattr(DAL, name) if not name.startswith("_") else None
+        if not callable(func):
+            raise AttributeError(f"DAL has no function {name!r}")
+
+        async def call(*args, **kwargs):
+            return await self.pool.run(func, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = func.__doc__
+        return call
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.pool.shutdown(wait)
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Personal Website Flask Application.
+``python -m benchmarks`` runs the route suite (see benchmarks/suite.py); each
+bench_* module can also be run directly, e.g. ``python -m benchmarks.bench_dal``.
+"""
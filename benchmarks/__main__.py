@@ -0,0 +1,75 @@
+"""
+Route benchmark CLI
+
+Usage:
+    python -m benchmarks [--mode inprocess|gunicorn] [--requests 500]
+                         [--clients 8] [--workers 4] [--sizes 10,1000,10000]
+                         [--output results.json]
+                         [--baseline baseline.json [--threshold 0.15]]
+                         [--save-baseline baseline.json]
+
+Exits with status 1 when a route regressed against --baseline.
+"""
+
+import argparse
+import sys
+
+from benchmarks import suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark every route of the site.")
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn"), default="inprocess",
+                        help="drive app.test_client() or a local gunicorn over loopback")
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per route")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="concurrent clients (gunicorn mode)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--sizes", default=",".join(map(str, suite.DEFAULT_SIZES)),
+                        help="comma separated table sizes for /projects")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a results file saved earlier")
+    parser.add_argument("--threshold", type=float, default=suite.DEFAULT_THRESHOLD,
+                        help="relative p95/throughput change counted as a regression")
+    parser.add_argument("--save-baseline", metavar="PATH",
+                        help="also write the results to PATH for later comparisons")
+    args = parser.parse_args(argv)
+
+    scenarios = suite.default_scenarios(int(size) for size in args.sizes.split(","))
+    if args.mode == "inprocess":
+        results = suite.run_inprocess(scenarios, args.requests)
+        settings = {"requests": args.requests, "sizes": args.sizes}
+    else:
+        results = suite.run_gunicorn(scenarios, args.requests, args.clients,
+                                     args.workers, args.threads)
+        settings = {"requests": args.requests, "sizes": args.sizes, "clients": args.clients,
+                    "workers": args.workers, "threads": args.threads}
+    data = suite.report(results, args.mode, **settings)
+
+    print(f"{'route':45} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name, r in results.items():
+        print(f"{name:45} {r['throughput_rps']:9.1f} {r['p50_ms']:8.2f} "
+              f"{r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['errors']:6}")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        suite.save_report(data, path)
+
+    if not args.baseline:
+        return 0
+    baseline = suite.load_report(args.baseline)
+    if baseline.get("mode") != args.mode:
+        print(f"\nwarning: baseline was measured in {baseline.get('mode')} mode", file=sys.stderr)
+    comparison = suite.compare(data, baseline, args.threshold)
+    print(f"\n{'route':45} {'p95':>8} {'req/s':>8}")
+    for row in comparison:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['route']:45} {row['p95_change']:+8.1%} {row['throughput_change']:+8.1%}{flag}")
+    regressions = sum(row["regression"] for row in comparison)
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
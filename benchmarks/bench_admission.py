@@ -0,0 +1,121 @@
+"""
+Write shedding stress test
+Floods POST /projects/new from many client threads while readers time
+GET /projects, against gunicorn with admission control on and off. Read
+latency under the flood should stay close to the no-flood baseline when
+writes are shed.
+
+Usage:
+    python -m benchmarks.bench_admission [--readers 8] [--writers 32]
+                                         [--duration 5] [--workers 4]
+"""
+
+import argparse
+import collections
+import http.client
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from benchmarks.suite import GunicornServer, seed, summarize, temporary_database
+
+FORM = urlencode({"title": "Flood", "description": "Posted by the write flood benchmark",
+                  "image_filename": "flood.png"})
+
+
+def _reader(port, path, deadline, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append("connection")
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+
+def _writer(port, deadline, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.perf_counter() < deadline:
+        try:
+            conn.request("POST", "/projects/new", body=FORM,
+                         headers={"Content-Type": "application/x-www-form-urlencoded"})
+            response = conn.getresponse()
+            response.read()
+            statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            statuses["connection error"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.close()
+
+
+def run_phase(port, readers, writers, duration, path="/projects"):
+    """
+    Returns:
+        Tuple of (read summary, Counter of write response statuses)
+    """
+    deadline = time.perf_counter() + duration
+    statuses = collections.Counter()
+    per_reader = [([], []) for _ in range(readers)]
+    threads = [threading.Thread(target=_writer, args=(port, deadline, statuses))
+               for _ in range(writers)]
+    threads += [threading.Thread(target=_reader, args=(port, path, deadline, *lists))
+                for lists in per_reader]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reads = summarize([latency for latencies, _ in per_reader for latency in latencies],
+                      time.perf_counter() - start, sum(len(errors) for _, errors in per_reader))
+    return reads, statuses
+
+
+def run(readers=8, writers=32, duration=5.0, workers=4, rows=1000):
+    """
+    Returns:
+        List of (label, read summary, write statuses)
+    """
+    results = []
+    with temporary_database() as db_path:
+        for admission in ("1", "0"):
+            seed(rows)
+            with tempfile.TemporaryDirectory() as state:
+                env = {"ADMISSION_CONTROL": admission, "ADMISSION_DIR": os.path.join(state, "admission")}
+                with GunicornServer(db_path, workers, env=env) as server:
+                    label = "admission on" if admission == "1" else "admission off"
+                    if admission == "1":
+                        results.append(("reads only",) + run_phase(server.port, readers, 0, duration))
+                    results.append((f"flood, {label}",) +
+                                   run_phase(server.port, readers, writers, duration))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'GET /projects':24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  writes")
+    for label, reads, statuses in run(args.readers, args.writers, args.duration, args.workers):
+        writes = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str))
+        print(f"{label:24} {reads['throughput_rps']:8.1f} {reads['p50_ms']:8.2f} "
+              f"{reads['p95_ms']:8.2f} {reads['p99_ms']:8.2f}  {writes or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Projects API benchmark
+Compares the JSON API with the HTML projects page: one page of 20 projects,
+and a full export (/api/projects?format=ndjson vs /projects?all=1).
+
+Usage:
+    python -m benchmarks.bench_api [--rows 20000] [--iterations 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+from benchmarks.bench_projects_page import _seed
+
+PAGE_URLS = (
+    ("html page", "/projects"),
+    ("json page", "/api/projects"),
+    ("json page, fields=id,title", "/api/projects?fields=id,title"),
+)
+
+EXPORT_URLS = (
+    ("html all rows", "/projects?all=1"),
+    ("ndjson export", "/api/projects?format=ndjson"),
+    ("ndjson export, fields=id,title", "/api/projects?format=ndjson&fields=id,title"),
+)
+
+
+def _time_request(client, url, iterations):
+    client.get(url).close()  # warm template and statement caches
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response = client.get(url)
+        assert response.status_code == 200
+        response.get_data()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run(rows=20000, iterations=200, export_iterations=5):
+    """
+    Returns:
+        Dictionary of milliseconds per request keyed by "label (url)"
+    """
+    from app import app
+
+    results = {}
+    original_path = DAL.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            DAL.DB_PATH = os.path.join(tmp, "bench.db")
+            DAL.init_db()
+            _seed(rows)
+            with app.test_client() as client:
+                for label, url in PAGE_URLS:
+                    results[label] = _time_request(client, url, iterations)
+                for label, url in EXPORT_URLS:
+                    results[label] = _time_request(client, url, export_iterations)
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, ms in run(rows=args.rows, iterations=args.iterations).items():
+        print(f"{label:35} {ms:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
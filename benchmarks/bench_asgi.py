@@ -0,0 +1,127 @@
+"""
+Sync vs ASGI serving benchmark
+Runs the site under gunicorn twice with the same number of worker processes:
+sync workers serving app:create_app(), then uvicorn workers serving
+asgi:app. In each mode fast clients request a route as quickly as they can
+while slow clients hold connections open, trickling their request headers
+a line at a time the way a client on a poor network does. Reports the fast
+clients' throughput, latency and failures.
+
+Usage:
+    python -m benchmarks.bench_asgi [--clients 32] [--slow-clients 16]
+                                    [--duration 5] [--workers 4]
+                                    [--path /api/projects/1]
+"""
+
+import argparse
+import http.client
+import socket
+import threading
+import time
+
+from benchmarks.suite import GunicornServer, seed, summarize, temporary_database
+
+MODES = {
+    "sync": {"target": "app:create_app()"},
+    "asgi": {"target": "asgi:app", "worker_class": "uvicorn.workers.UvicornWorker"},
+}
+
+
+def _fast_client(port, path, deadline, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append("connection")
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def _slow_client(port, path, deadline, interval=0.5):
+    """Send the request headers one line per interval until the deadline."""
+    try:
+        sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+    except OSError:
+        return
+    try:
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n".encode())
+        n = 0
+        while time.perf_counter() < deadline:
+            sock.sendall(f"X-Slow-{n}: {'x' * 16}\r\n".encode())
+            n += 1
+            time.sleep(interval)
+        sock.sendall(b"Connection: close\r\n\r\n")
+        sock.recv(65536)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def run_mode(mode, db_path, clients=32, slow_clients=16, duration=5.0, workers=4,
+             path="/api/projects/1"):
+    """
+    Returns:
+        Summary of the fast clients' requests (see suite.summarize)
+    """
+    with GunicornServer(db_path, workers, **MODES[mode]) as server:
+        deadline = time.perf_counter() + duration
+        slow = [threading.Thread(target=_slow_client, args=(server.port, path, deadline + 1))
+                for _ in range(slow_clients)]
+        for thread in slow:
+            thread.start()
+        time.sleep(0.2)  # let the slow clients occupy what they can
+
+        per_client = [([], []) for _ in range(clients)]
+        fast = [threading.Thread(target=_fast_client, args=(server.port, path, deadline, *lists))
+                for lists in per_client]
+        start = time.perf_counter()
+        for thread in fast:
+            thread.start()
+        for thread in fast:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for thread in slow:
+            thread.join()
+    return summarize([latency for latencies, _ in per_client for latency in latencies],
+                     elapsed, sum(len(errors) for _, errors in per_client))
+
+
+def run(clients=32, slow_clients=16, duration=5.0, workers=4, path="/api/projects/1", rows=1000):
+    """
+    Returns:
+        Dictionary mapping mode to the fast clients' summary
+    """
+    with temporary_database() as db_path:
+        seed(rows)
+        return {mode: run_mode(mode, db_path, clients, slow_clients, duration, workers, path)
+                for mode in MODES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--slow-clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--path", default="/api/projects/1")
+    args = parser.parse_args()
+
+    results = run(args.clients, args.slow_clients, args.duration, args.workers, args.path)
+    print(f"{'mode':6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, r in results.items():
+        print(f"{mode:6} {r['throughput_rps']:9.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+              f"{r['p99_ms']:8.2f} {r['errors']:7}")
+
+
+if __name__ == "__main__":
+    main()
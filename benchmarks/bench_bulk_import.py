@@ -0,0 +1,82 @@
+"""
+Bulk import benchmark
+Measures import_projects() throughput (rows/s) for JSONL and CSV input
+against a throwaway database, next to one-row-per-commit insert_project().
+
+Usage:
+    python -m benchmarks.bench_bulk_import [--rows 100000]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+
+import DAL
+from bulk_import import import_projects
+
+
+def _jsonl(rows):
+    return "".join(
+        json.dumps({"title": f"Project {i}", "description": f"Description for project {i}",
+                    "image_filename": f"p{i}.png"}) + "\n"
+        for i in range(rows))
+
+
+def _csv(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["title", "description", "image_filename"])
+    for i in range(rows):
+        writer.writerow([f"Project {i}", f"Description for project {i}", f"p{i}.png"])
+    return out.getvalue()
+
+
+def _fresh_db(tmp, name):
+    DAL.close_connection()
+    DAL.DB_PATH = os.path.join(tmp, name)
+    DAL.init_db()
+
+
+def run(rows=100000, single_rows=2000):
+    """
+    Returns:
+        Dictionary of rows per second keyed by method
+    """
+    results = {}
+    original_path = DAL.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for fmt, payload in (("jsonl", _jsonl(rows)), ("csv", _csv(rows))):
+                _fresh_db(tmp, f"{fmt}.db")
+                start = time.perf_counter()
+                report = import_projects(io.StringIO(payload, newline=""), fmt)
+                elapsed = time.perf_counter() - start
+                assert report["inserted"] == rows
+                results[f"import_projects/{fmt}"] = rows / elapsed
+
+            _fresh_db(tmp, "single.db")
+            start = time.perf_counter()
+            for i in range(single_rows):
+                DAL.insert_project(f"Project {i}", f"Description for project {i}", f"p{i}.png")
+            results["insert_project/one-per-commit"] = single_rows / (time.perf_counter() - start)
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, rate in run(rows=args.rows).items():
+        print(f"{name:35} {rate:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compression benchmark
+Reports CPU cost per KB and bytes saved for each gzip level and brotli
+quality on a rendered /projects page, to help tune CompressionMiddleware.
+
+Usage:
+    python -m benchmarks.bench_compression [--rows 50] [--iterations 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+from compression import CompressionMiddleware, brotli
+
+
+def _render_projects_page(rows):
+    from app import app
+
+    original_path = DAL.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        DAL.DB_PATH = os.path.join(tmp, "bench.db")
+        try:
+            DAL.init_db()
+            for i in range(rows):
+                DAL.insert_project(f"Project {i}", f"Description for project number {i} " * 3, f"p{i}.png")
+            with app.test_client() as client:
+                return client.get(f"/projects?limit={rows}").data
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+
+
+def run(rows=50, iterations=200):
+    """
+    Compress a rendered page at every level.
+
+    Returns:
+        List of dicts with encoding, level, us_per_kb, ratio and saved_bytes
+    """
+    page = _render_projects_page(rows)
+    kb = len(page) / 1024
+    settings = [("gzip", level) for level in range(1, 10)]
+    if brotli is not None:
+        settings += [("br", quality) for quality in range(0, 12)]
+
+    results = []
+    for encoding, level in settings:
+        middleware = CompressionMiddleware(None, gzip_level=level, brotli_quality=level)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            compressed = middleware.compress(page, encoding)
+        elapsed = (time.perf_counter() - start) / iterations
+        results.append({
+            "encoding": encoding,
+            "level": level,
+            "page_bytes": len(page),
+            "us_per_kb": elapsed * 1e6 / kb,
+            "ratio": len(compressed) / len(page),
+            "saved_bytes": len(page) - len(compressed),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    results = run(rows=args.rows, iterations=args.iterations)
+    print(f"page size: {results[0]['page_bytes']} bytes")
+    print(f"{'encoding':>8} {'level':>5} {'us/KB':>8} {'ratio':>7} {'saved':>8}")
+    for r in results:
+        print(f"{r['encoding']:>8} {r['level']:>5} {r['us_per_kb']:8.2f} {r['ratio']:7.3f} {r['saved_bytes']:8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+CSS payload benchmark
+Compares what the browser must fetch before first paint: the full Bootstrap
+and custom stylesheets as render-blocking links, against the critical CSS
+inlined per page with the purged bundle loaded asynchronously. Reports raw
+and gzip sizes and how long the build takes.
+
+Usage:
+    python -m benchmarks.bench_css
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+import cssbuild
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sizes(data: bytes):
+    return len(data), len(gzip.compress(data, compresslevel=9))
+
+
+def run():
+    """
+    Returns:
+        Dictionary of (raw bytes, gzip bytes) per item, plus build seconds
+    """
+    static_dir = os.path.join(ROOT_DIR, "static")
+    template_dir = os.path.join(ROOT_DIR, "templates")
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, "static")
+        shutil.copytree(static_dir, work, ignore=shutil.ignore_patterns("build", "critical",
+                                                                        "bundle.min.css"))
+        start = time.perf_counter()
+        sizes = cssbuild.build_css(work, template_dir)
+        build_seconds = time.perf_counter() - start
+
+        results = {}
+        blocking = b"".join(open(os.path.join(work, *name.split("/")), "rb").read()
+                            for name in cssbuild.CSS_SOURCES)
+        results["blocking stylesheets, before"] = _sizes(blocking)
+        with open(os.path.join(work, *cssbuild.BUNDLE_NAME.split("/")), "rb") as f:
+            results["purged bundle, async"] = _sizes(f.read())
+        for name in sorted(sizes):
+            if name.startswith(cssbuild.CRITICAL_DIRNAME):
+                with open(os.path.join(work, *name.split("/")), "rb") as f:
+                    results[f"inlined {os.path.basename(name)}"] = _sizes(f.read())
+    return results, build_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    results, build_seconds = run()
+    print(f"{'':40} {'bytes':>9} {'gzip':>8}")
+    for name, (raw, compressed) in results.items():
+        print(f"{name:40} {raw:9} {compressed:8}")
+    print(f"build-css took {build_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
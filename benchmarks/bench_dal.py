@@ -0,0 +1,97 @@
+"""
+DAL connection benchmark
+Compares the per-query cost of opening a connection on every call against the
+DAL's persistent, tuned per-thread connection.
+
+Usage:
+    python -m benchmarks.bench_dal [--rows 50] [--iterations 2000]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import DAL
+
+
+def _legacy_get_all_projects(db_path):
+    """Connect-per-call implementation the DAL used before pooling."""
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, title, description, image_filename, created_at
+            FROM projects
+            ORDER BY created_at DESC
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def _legacy_get_project_by_id(db_path, project_id):
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, title, description, image_filename, created_at
+            FROM projects
+            WHERE id = ?
+        """, (project_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+def _time_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(rows=50, iterations=2000):
+    """
+    Run the benchmark against a throwaway database.
+
+    Returns:
+        Dictionary of microseconds per call keyed by "<query>/<mode>"
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        original_path = DAL.DB_PATH
+        DAL.DB_PATH = os.path.join(tmp, "bench.db")
+        try:
+            DAL.init_db()
+            for i in range(rows):
+                DAL.insert_project(f"Project {i}", f"Description for project {i}", f"p{i}.png")
+            db_path = DAL.DB_PATH
+
+            results = {
+                "get_all_projects/connect-per-call": _time_per_call(
+                    lambda: _legacy_get_all_projects(db_path), iterations),
+                "get_all_projects/persistent": _time_per_call(
+                    DAL.get_all_projects, iterations),
+                "get_project_by_id/connect-per-call": _time_per_call(
+                    lambda: _legacy_get_project_by_id(db_path, 1), iterations),
+                "get_project_by_id/persistent": _time_per_call(
+                    lambda: DAL.get_project_by_id(1), iterations),
+            }
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run(rows=args.rows, iterations=args.iterations)
+    print(f"{'query/mode':45} {'us/call':>10}")
+    for name, micros in results.items():
+        print(f"{name:45} {micros:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
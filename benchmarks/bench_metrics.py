@@ -0,0 +1,87 @@
+"""
+Metrics overhead benchmark
+Measures what instrumentation adds to each request and DAL query: the
+request hooks run inside a request context, and a DAL read timed with and
+without a metrics listener. Each figure is the best of several rounds.
+
+Usage:
+    python -m benchmarks.bench_metrics [--iterations 20000] [--rounds 5]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+from metrics import Metrics
+
+
+def _per_call_us(func, iterations, rounds):
+    func()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - start) / iterations * 1e6)
+    return best
+
+
+def run(iterations=20000, rounds=5):
+    """
+    Returns:
+        Dictionary of microseconds per operation
+    """
+    import app as app_module
+    app = app_module.app
+
+    results = {}
+    original_metrics, original_path = app_module.metrics, DAL.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics = Metrics(os.path.join(tmp, "metrics"))
+        try:
+            app_module.metrics = metrics
+            results["observe_request"] = _per_call_us(
+                lambda: metrics.observe_request("index", "GET", 200, 0.001), iterations, rounds)
+            results["observe_query"] = _per_call_us(
+                lambda: metrics.observe_query("get_project_by_id", 0.0001, 1), iterations, rounds)
+
+            with app.test_request_context("/"):
+                response = app.response_class("ok")
+
+                def hooks():
+                    app_module.start_request_timer()
+                    app_module.record_request_metrics(response)
+
+                results["request hooks (total per request)"] = _per_call_us(hooks, iterations, rounds)
+
+            DAL.DB_PATH = os.path.join(tmp, "bench.db")
+            DAL.init_db()
+            DAL.insert_project("Benchmark", "Row read by the benchmark", "b.png")
+            query = DAL.get_project_by_id.__wrapped__  # skip the read cache
+            DAL.remove_query_listener(app_module.record_query)
+            results["DAL query, no listener"] = _per_call_us(lambda: query(1), iterations, rounds)
+            DAL.add_query_listener(app_module.record_query)
+            results["DAL query, metrics listener"] = _per_call_us(lambda: query(1), iterations, rounds)
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+            app_module.metrics = original_metrics
+    results["DAL overhead per query"] = (results["DAL query, metrics listener"]
+                                         - results["DAL query, no listener"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, us in run(iterations=args.iterations, rounds=args.rounds).items():
+        print(f"{name:36} {us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Projects page benchmark
+Measures /projects render time at several table sizes to confirm that keyset
+pagination keeps the cost of a page independent of the number of rows.
+
+Usage:
+    python -m benchmarks.bench_projects_page [--sizes 10,10000,1000000] [--iterations 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+
+
+def _seed(rows, batch=10000):
+    conn = DAL.get_connection()
+    with conn:
+        for start in range(0, rows, batch):
+            conn.executemany(
+                "INSERT INTO projects (title, description, image_filename, created_at) "
+                "VALUES (?, ?, ?, datetime('2024-01-01', '+' || ? || ' seconds'))",
+                [(f"Project {i}", f"Description for project {i}", f"p{i}.png", i)
+                 for i in range(start, min(start + batch, rows))])
+
+
+def _time_request(client, url, iterations):
+    client.get(url)  # warm template and statement caches
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response = client.get(url)
+        assert response.status_code == 200
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run(sizes=(10, 10000, 100000), iterations=200):
+    """
+    Time the first and a deep page of /projects for each table size.
+
+    Returns:
+        Dictionary mapping table size to {"first_page_ms", "deep_page_ms"}
+    """
+    from app import app
+
+    results = {}
+    original_path = DAL.DB_PATH
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                DAL.DB_PATH = os.path.join(tmp, "bench.db")
+                DAL.init_db()
+                _seed(size)
+                middle = DAL.get_connection().execute(
+                    "SELECT id, created_at FROM projects ORDER BY created_at DESC, id DESC "
+                    "LIMIT 1 OFFSET ?", (size // 2,)).fetchone()
+                deep_url = f"/projects?after={DAL.encode_cursor(middle['created_at'], middle['id'])}"
+
+                with app.test_client() as client:
+                    results[size] = {
+                        "first_page_ms": _time_request(client, "/projects", iterations),
+                        "deep_page_ms": _time_request(client, deep_url, iterations),
+                    }
+                DAL.close_connection()
+    finally:
+        DAL.DB_PATH = original_path
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,10000,100000",
+                        help="comma separated table sizes")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(sizes=sizes, iterations=args.iterations)
+    print(f"{'rows':>10} {'first page ms':>15} {'deep page ms':>15}")
+    for size, timings in results.items():
+        print(f"{size:>10} {timings['first_page_ms']:15.2f} {timings['deep_page_ms']:15.2f}")
+
+
+if __name__ == "__main__":
+    main()
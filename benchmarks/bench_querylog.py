@@ -0,0 +1,83 @@
+"""
+Query diagnostics benchmark
+Times the project read functions and a single-row insert with query
+diagnostics off, on with nothing slow enough to log, and on with every
+statement logged, with the read cache off so every call runs its query.
+
+Usage:
+    python -m benchmarks.bench_querylog [--rows 1000] [--iterations 2000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+
+# (diagnostics on, SLOW_QUERY_MS) per mode
+MODES = {
+    "off": (False, 50.0),
+    "on, nothing slow": (True, 60000.0),
+    "on, log everything": (True, 0.0),
+}
+
+
+def _time_per_call(func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _calls(project_id):
+    return {
+        "get_project_by_id": lambda: DAL.get_project_by_id(project_id),
+        "get_projects_page": lambda: DAL.get_projects_page(limit=20),
+        "get_all_projects": DAL.get_all_projects,
+        "insert_project": lambda: DAL.insert_project("Timed", "Written by the benchmark", "t.png"),
+    }
+
+
+def run(rows=1000, iterations=2000):
+    """
+    Returns:
+        Dictionary of microseconds per call keyed by "<call>/<mode>"
+    """
+    results = {}
+    settings = (DAL.DB_PATH, DAL.READ_CACHE_ENABLED, DAL.QUERY_DIAGNOSTICS,
+                DAL.SLOW_QUERY_MS, DAL.QUERY_LOG_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        DAL.READ_CACHE_ENABLED = False
+        DAL.QUERY_LOG_PATH = os.path.join(tmp, "slow_queries.jsonl")
+        try:
+            for index, (mode, (enabled, threshold)) in enumerate(MODES.items()):
+                DAL.QUERY_DIAGNOSTICS, DAL.SLOW_QUERY_MS = enabled, threshold
+                # A fresh database per mode, which also reopens the connection
+                DAL.DB_PATH = os.path.join(tmp, f"diagnostics{index}.db")
+                DAL.init_db()
+                DAL.insert_projects((f"Project {i}", f"Description for project {i}", f"p{i}.png")
+                                    for i in range(rows))
+                for name, func in _calls(rows // 2).items():
+                    results[f"{name}/{mode}"] = _time_per_call(func, iterations)
+        finally:
+            DAL.close_connection()
+            (DAL.DB_PATH, DAL.READ_CACHE_ENABLED, DAL.QUERY_DIAGNOSTICS,
+             DAL.SLOW_QUERY_MS, DAL.QUERY_LOG_PATH) = settings
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'call/mode':45} {'us/call':>10}")
+    for name, value in run(args.rows, args.iterations).items():
+        print(f"{name:45} {value:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Project search benchmark
+Measures search_projects() latency on a seeded database with the read cache
+disabled, so every call runs the FTS5 query.
+
+Usage:
+    python -m benchmarks.bench_search [--rows 100000] [--iterations 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+
+WORDS = ("flask", "sqlite", "python", "dashboard", "analytics", "portfolio", "pipeline",
+         "automation", "simulation", "enrollment", "strategy", "visualization")
+
+QUERIES = ("flask", "dashboard analytics", "sim", "portfolio pipeline automation", "nomatch")
+
+
+def _rows(rows):
+    for i in range(rows):
+        a, b, c = WORDS[i % 12], WORDS[(i * 7) % 12], WORDS[(i * 5 + 3) % 12]
+        yield (f"{a.title()} project {i}", f"A {b} tool using {c} and {a}, version {i}", f"p{i}.png")
+
+
+def run(rows=100000, iterations=200, limit=20):
+    """
+    Returns:
+        Dictionary of median latency in microseconds keyed by query
+    """
+    results = {}
+    original_path, original_cache = DAL.DB_PATH, DAL.READ_CACHE_ENABLED
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            DAL.close_connection()
+            DAL.DB_PATH = os.path.join(tmp, "search.db")
+            DAL.READ_CACHE_ENABLED = False
+            DAL.init_db()
+            start = time.perf_counter()
+            DAL.insert_projects(_rows(rows))
+            results["insert_projects (rows/s, with index)"] = rows / (time.perf_counter() - start)
+
+            for query in QUERIES:
+                timings = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    DAL.search_projects(query, limit)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                results[f"search_projects({query!r}) (us)"] = timings[len(timings) // 2] * 1e6
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH, DAL.READ_CACHE_ENABLED = original_path, original_cache
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, value in run(rows=args.rows, iterations=args.iterations).items():
+        print(f"{name:55} {value:12,.1f}")
+
+
+if __name__ == "__main__":
+    main()
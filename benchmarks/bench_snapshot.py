@@ -0,0 +1,87 @@
+"""
+Read snapshot benchmark
+Times the project read functions against the on-disk database and against
+the in-memory read snapshot, with the read cache off so every call runs its
+query. Also times the first read after a write, which reloads the snapshot.
+
+Usage:
+    python -m benchmarks.bench_snapshot [--rows 1000] [--iterations 2000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import DAL
+
+
+def _time_per_call(func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _reads(project_id):
+    return {
+        "get_project_by_id": lambda: DAL.get_project_by_id(project_id),
+        "get_projects_page": lambda: DAL.get_projects_page(limit=20),
+        "get_all_projects": DAL.get_all_projects,
+        "search_projects": lambda: DAL.search_projects("project 7"),
+    }
+
+
+def _read_after_write(iterations):
+    """Microseconds for an insert followed by the read that sees it."""
+    def write_then_read():
+        DAL.insert_project("Fresh", "Written between reads", "f.png")
+        DAL.get_project_by_id(1)
+    return _time_per_call(write_then_read, iterations)
+
+
+def run(rows=1000, iterations=2000):
+    """
+    Returns:
+        Dictionary of microseconds per call keyed by "<query>/<mode>"
+    """
+    results = {}
+    settings = (DAL.DB_PATH, DAL.READ_CACHE_ENABLED, DAL.SNAPSHOT_READS)
+    with tempfile.TemporaryDirectory() as tmp:
+        DAL.DB_PATH = os.path.join(tmp, "snapshot.db")
+        DAL.READ_CACHE_ENABLED = False
+        try:
+            DAL.init_db()
+            DAL.insert_projects((f"Project {i}", f"Description for project {i}", f"p{i}.png")
+                                for i in range(rows))
+            project_id = rows // 2
+            for mode, enabled in (("disk", False), ("snapshot", True)):
+                DAL.SNAPSHOT_READS = enabled
+                DAL.read_snapshot = DAL.ReadSnapshot()
+                for name, func in _reads(project_id).items():
+                    results[f"{name}/{mode}"] = _time_per_call(func, iterations)
+            for mode, enabled in (("disk", False), ("snapshot", True)):
+                DAL.SNAPSHOT_READS = enabled
+                results[f"write then read/{mode}"] = _read_after_write(max(1, iterations // 20))
+            results["snapshot size (KiB)"] = DAL.read_snapshot.size / 1024
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH, DAL.READ_CACHE_ENABLED, DAL.SNAPSHOT_READS = settings
+            DAL.read_snapshot = DAL.ReadSnapshot()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'query/mode':40} {'us/call':>10}")
+    for name, value in run(args.rows, args.iterations).items():
+        print(f"{name:40} {value:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
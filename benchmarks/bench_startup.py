@@ -0,0 +1,126 @@
+"""
+Startup benchmark
+Compares the schema work done when a worker boots: the old init_db, which
+re-ran every CREATE ... IF NOT EXISTS in a write transaction, against the
+migration runner's PRAGMA user_version check. Both are timed in-process,
+with and without another connection holding the write lock, and as whole
+worker boots (a fresh interpreter importing the app and starting it).
+
+Usage:
+    python -m benchmarks.bench_startup [--iterations 200] [--boots 10] [--hold-ms 200]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import migrations
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Boot scripts run in a fresh interpreter; the database comes from
+# PROJECTS_DB_PATH. The legacy one reproduces the DDL the old import ran.
+BOOT_CURRENT = "import app; app.create_app()"
+BOOT_LEGACY = ("import app, DAL, migrations\n"
+               "conn = DAL.get_connection()\n"
+               "with conn:\n"
+               "    for step in migrations.MIGRATIONS:\n"
+               "        step(conn)\n")
+
+
+def legacy_init(conn):
+    """Run every schema statement unconditionally, as init_db used to."""
+    with conn:
+        for step in migrations.MIGRATIONS:
+            step(conn)
+
+
+def _per_call_ms(func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def _while_locked(path, func, hold_seconds):
+    """Time one call of func while another connection holds the write lock."""
+    locked, done = threading.Event(), threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE change_counter SET version = version WHERE id = 1")
+        locked.set()
+        done.wait(hold_seconds)
+        conn.execute("COMMIT")
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    locked.wait()
+    start = time.perf_counter()
+    func()
+    elapsed = (time.perf_counter() - start) * 1000
+    done.set()
+    thread.join()
+    return elapsed
+
+
+def _boot_ms(script, db_path, boots):
+    env = dict(os.environ, PROJECTS_DB_PATH=db_path, OUTBOX_WORKER_THREAD="0")
+    times = []
+    for _ in range(boots):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, env=env, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def run(iterations=200, boots=10, hold_ms=200):
+    """
+    Returns:
+        Dictionary of milliseconds per operation, legacy and current
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrations.migrate(conn)
+
+        results["schema check, legacy DDL"] = _per_call_ms(lambda: legacy_init(conn), iterations)
+        results["schema check, user_version"] = _per_call_ms(lambda: migrations.migrate(conn), iterations)
+
+        hold = hold_ms / 1000
+        results[f"schema check, legacy DDL, writer busy {hold_ms}ms"] = _while_locked(
+            path, lambda: legacy_init(conn), hold)
+        results[f"schema check, user_version, writer busy {hold_ms}ms"] = _while_locked(
+            path, lambda: migrations.migrate(conn), hold)
+        conn.close()
+
+        results["worker boot, legacy DDL"] = _boot_ms(BOOT_LEGACY, path, boots)
+        results["worker boot, create_app()"] = _boot_ms(BOOT_CURRENT, path, boots)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--boots", type=int, default=10)
+    parser.add_argument("--hold-ms", type=int, default=200,
+                        help="how long the competing writer holds its lock")
+    args = parser.parse_args()
+
+    for name, ms in run(args.iterations, args.boots, args.hold_ms).items():
+        print(f"{name:50} {ms:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
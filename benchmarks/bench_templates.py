@@ -0,0 +1,75 @@
+"""
+Cold worker template benchmark
+Measures the first request to each route in a freshly started interpreter,
+which is when every template it renders is compiled, with and without a
+bytecode cache filled by `flask compile-templates`. Each figure is the
+median over several cold starts.
+
+Usage:
+    python -m benchmarks.bench_templates [--starts 7]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = ("/", "/about", "/resume", "/projects", "/projects/search?q=project",
+          "/projects/new", "/contact")
+
+# Runs in the fresh interpreter: start the app, then time one request. The
+# database is migrated before timing so only request work is measured.
+FIRST_REQUEST = """
+import sys, time
+import app
+client = app.create_app({'TESTING': True}).test_client()
+start = time.perf_counter()
+client.get(sys.argv[1]).get_data()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def _first_request_ms(route, env):
+    output = subprocess.run([sys.executable, "-c", FIRST_REQUEST, route], cwd=ROOT_DIR,
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run(starts=7):
+    """
+    Returns:
+        Dictionary mapping route to (no cache ms, precompiled ms)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ, PROJECTS_DB_PATH=os.path.join(tmp, "bench.db"),
+                        METRICS_DIR=os.path.join(tmp, "metrics"), OUTBOX_WORKER_THREAD="0",
+                        FLASK_ENV="production")
+        cold_env = dict(base_env, JINJA_CACHE_DIR="")
+        warm_env = dict(base_env, JINJA_CACHE_DIR=os.path.join(tmp, "jinja_cache"))
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "compile-templates"],
+                       cwd=ROOT_DIR, env=warm_env, check=True, capture_output=True)
+
+        results = {}
+        for route in ROUTES:
+            cold = [_first_request_ms(route, cold_env) for _ in range(starts)]
+            warm = [_first_request_ms(route, warm_env) for _ in range(starts)]
+            results[route] = (statistics.median(cold), statistics.median(warm))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--starts", type=int, default=7, help="cold starts per route and mode")
+    args = parser.parse_args()
+
+    print(f"{'first request to':28} {'no cache':>10} {'precompiled':>12}")
+    for route, (cold, warm) in run(args.starts).items():
+        print(f"{route:28} {cold:8.2f}ms {warm:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Write throughput benchmark
+Runs many processes, each with several threads, inserting projects through
+the DAL into one database, with group-commit write coalescing off (one
+transaction per write) and on. Reports committed writes per second, how
+many writes shared each commit, and writes that failed with "database is
+locked".
+
+Usage:
+    python -m benchmarks.bench_writes [--processes 4] [--threads 8] [--duration 3]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import DAL
+
+
+def _worker(db_path, coalescing, threads, duration, queue):
+    DAL.DB_PATH = db_path
+    DAL.WRITE_COALESCING = coalescing
+    DAL.write_coalescer = DAL.WriteCoalescer()
+    deadline = time.perf_counter() + duration
+    counts = {"writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def writer():
+        writes = locked = 0
+        while time.perf_counter() < deadline:
+            try:
+                DAL.insert_project("Benchmark", "Inserted by the write benchmark", "b.png")
+                writes += 1
+            except sqlite3.OperationalError:
+                locked += 1
+        with lock:
+            counts["writes"] += writes
+            counts["locked"] += locked
+
+    pool = [threading.Thread(target=writer) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    counts["commits"] = DAL.write_coalescer.groups if coalescing else counts["writes"]
+    queue.put(counts)
+
+
+def run_mode(coalescing, processes=4, threads=8, duration=3.0):
+    """
+    Returns:
+        Dictionary with writes/s, writes per commit and locked errors
+    """
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "writes.db")
+        DAL.DB_PATH = db_path
+        DAL.init_db()
+        DAL.close_connection()
+        queue = ctx.Queue()
+        workers = [ctx.Process(target=_worker, args=(db_path, coalescing, threads, duration, queue))
+                   for _ in range(processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    writes = sum(r["writes"] for r in results)
+    commits = sum(r["commits"] for r in results)
+    return {
+        "writes/s": writes / elapsed,
+        "writes per commit": writes / commits if commits else 0.0,
+        "locked errors": sum(r["locked"] for r in results),
+    }
+
+
+def run(processes=4, threads=8, duration=3.0):
+    return {
+        "one transaction per write": run_mode(False, processes, threads, duration),
+        "group commit": run_mode(True, processes, threads, duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="writer threads per process")
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.duration:g}s per mode")
+    for mode, stats in run(args.processes, args.threads, args.duration).items():
+        print(f"{mode:28} {stats['writes/s']:9.0f} writes/s  "
+              f"{stats['writes per commit']:5.1f} writes/commit  "
+              f"{stats['locked errors']} locked errors")
+
+
+if __name__ == "__main__":
+    main()
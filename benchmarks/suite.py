@@ -0,0 +1,353 @@
+"""
+Route benchmark suite
+Times every main route either in-process through app.test_client() or over
+loopback HTTP against a locally started gunicorn, and summarizes each route
+as throughput plus p50/p95/p99 latency. Run it through the CLI:
+``python -m benchmarks --help``.
+"""
+
+import http.client
+import itertools
+import json
+import math
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import DAL
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Table sizes /projects is measured at
+DEFAULT_SIZES = (10, 1000, 10000)
+
+# Regressions are reported when p95 latency grows, or throughput drops, by
+# more than this fraction of the baseline
+DEFAULT_THRESHOLD = 0.15
+
+_counter = itertools.count()
+
+
+def _new_project_form():
+    n = next(_counter)
+    return {"title": f"Benchmark project {n}",
+            "description": f"Created by the benchmark suite, request {n}.",
+            "image_filename": f"bench{n}.png"}
+
+
+def _contact_form():
+    n = next(_counter)
+    return {"firstName": "Bench", "lastName": "Mark", "email": "bench@example.com",
+            "subject": f"Benchmark {n}", "message": f"Benchmark message number {n}."}
+
+
+class Scenario:
+    """
+    One request to time: method, path and an optional form body factory.
+
+    rows is the table size the scenario needs (None to keep whatever the
+    previous scenario left).
+    """
+
+    def __init__(self, method: str, path: str, rows: Optional[int] = None,
+                 form: Optional[Callable[[], Dict[str, str]]] = None,
+                 expect=(200,)):
+        self.method = method
+        self.path = path
+        self.rows = rows
+        self.form = form
+        self.expect = expect
+
+    @property
+    def name(self) -> str:
+        name = f"{self.method} {self.path}"
+        return f"{name} [rows={self.rows}]" if self.rows is not None else name
+
+
+def default_scenarios(sizes=DEFAULT_SIZES) -> List[Scenario]:
+    """
+    Return the routes covered by the suite.
+
+    Read-only routes run first at each table size; the POST routes write
+    rows and run last.
+    """
+    scenarios = [Scenario("GET", "/"), Scenario("GET", "/about"), Scenario("GET", "/resume")]
+    for rows in sizes:
+        scenarios += [
+            Scenario("GET", "/projects", rows),
+            Scenario("GET", "/projects/search?q=project", rows),
+            Scenario("GET", "/api/projects", rows),
+        ]
+    scenarios += [
+        Scenario("POST", "/projects/new", form=_new_project_form, expect=(302,)),
+        Scenario("POST", "/contact", form=_contact_form, expect=(302,)),
+    ]
+    return scenarios
+
+
+def seed(rows: int) -> None:
+    """
+    Replace the projects table contents with rows generated projects.
+    """
+    conn = DAL.get_connection()
+    with conn:
+        conn.execute("DELETE FROM projects")
+    DAL.insert_projects((f"Project {i}", f"Description for project {i}", f"p{i}.png")
+                        for i in range(rows))
+
+
+@contextmanager
+def temporary_database():
+    """
+    Point the DAL at a fresh database in a temporary directory.
+
+    Yields:
+        Path of the database file
+    """
+    original_path = DAL.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            DAL.close_connection()
+            DAL.DB_PATH = os.path.join(tmp, "bench.db")
+            DAL.init_db()
+            yield DAL.DB_PATH
+        finally:
+            DAL.close_connection()
+            DAL.DB_PATH = original_path
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """
+    Reduce per-request latencies (seconds) to throughput and percentiles (ms).
+    """
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return 0.0
+        # Nearest-rank percentile
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+def run_inprocess(scenarios: List[Scenario], requests: int, warmup: int = 20) -> Dict[str, Dict]:
+    """
+    Time each scenario through the Flask test client, one request at a time.
+    """
+    from app import app
+
+    app.config["OUTBOX_WORKER_THREAD"] = False
+    # Admission control would answer most timed POSTs with 429
+    app.config["ADMISSION_CONTROL"] = False
+    results = {}
+    with temporary_database(), app.test_client() as client:
+        for scenario in scenarios:
+            if scenario.rows is not None:
+                seed(scenario.rows)
+
+            def call():
+                if scenario.method == "POST":
+                    return client.post(scenario.path, data=scenario.form())
+                return client.get(scenario.path)
+
+            for _ in range(warmup):
+                call()
+            latencies, errors = [], 0
+            start = time.perf_counter()
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                response = call()
+                response.get_data()
+                latencies.append(time.perf_counter() - t0)
+                errors += response.status_code not in scenario.expect
+            results[scenario.name] = summarize(latencies, time.perf_counter() - start, errors)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _http_request(port: int, scenario: Scenario) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        if scenario.method == "POST":
+            body = urlencode(scenario.form())
+            conn.request("POST", scenario.path, body=body,
+                         headers={"Content-Type": "application/x-www-form-urlencoded"})
+        else:
+            conn.request("GET", scenario.path, headers={"Accept-Encoding": "gzip, br"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+class GunicornServer:
+    """
+    A gunicorn serving target (app:create_app() by default) on a free loopback
+    port, for use as a context manager. worker_class selects e.g. the uvicorn
+    worker for the ASGI entry point, and env adds environment variables. The
+    outbox thread is disabled so contact POSTs only queue, and admission
+    control is off (with its state kept next to the database) so timed POSTs
+    are not refused with 429; pass env to turn it back on.
+    """
+
+    def __init__(self, db_path: str, workers: int = 4, threads: int = 1,
+                 target: str = "app:create_app()", worker_class: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None):
+        self.db_path = db_path
+        self.workers = workers
+        self.threads = threads
+        self.target = target
+        self.worker_class = worker_class
+        self.env = env or {}
+        self.port = _free_port()
+        self._process = None
+
+    def __enter__(self):
+        env = dict(os.environ, PROJECTS_DB_PATH=self.db_path, OUTBOX_WORKER_THREAD="0",
+                   ADMISSION_CONTROL="0",
+                   ADMISSION_DIR=os.path.join(os.path.dirname(self.db_path), "admission"))
+        env.update(self.env)
+        command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{self.port}",
+                   "--workers", str(self.workers), "--threads", str(self.threads),
+                   "--log-level", "warning"]
+        if self.worker_class:
+            command += ["--worker-class", self.worker_class]
+        self._process = subprocess.Popen(command + [self.target], cwd=ROOT_DIR, env=env)
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("gunicorn did not start within 30 seconds")
+
+    def __exit__(self, *exc_info):
+        if self._process is not None and self._process.poll() is None:
+            self._process.send_signal(signal.SIGTERM)
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+
+
+def run_gunicorn(scenarios: List[Scenario], requests: int, clients: int,
+                 workers: int = 4, threads: int = 1, warmup: int = 20) -> Dict[str, Dict]:
+    """
+    Time each scenario over HTTP with `clients` concurrent connections.
+
+    The benchmark process seeds the same SQLite file the server reads; the
+    server notices through the change counter.
+    """
+    results = {}
+    with temporary_database() as db_path, GunicornServer(db_path, workers, threads) as server:
+        for scenario in scenarios:
+            if scenario.rows is not None:
+                seed(scenario.rows)
+            for _ in range(warmup):
+                _http_request(server.port, scenario)
+
+            # next() on a shared count is atomic under the GIL, so clients
+            # split the requests between them without a lock
+            issued = itertools.count()
+            per_client = [([], []) for _ in range(clients)]
+
+            def client_loop(latencies, failures):
+                while next(issued) < requests:
+                    t0 = time.perf_counter()
+                    try:
+                        ok = _http_request(server.port, scenario) in scenario.expect
+                    except OSError:
+                        ok = False
+                    latencies.append(time.perf_counter() - t0)
+                    if not ok:
+                        failures.append(scenario.name)
+
+            workers_ = [threading.Thread(target=client_loop, args=lists) for lists in per_client]
+            start = time.perf_counter()
+            for thread in workers_:
+                thread.start()
+            for thread in workers_:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            results[scenario.name] = summarize(
+                [latency for latencies, _ in per_client for latency in latencies],
+                elapsed, sum(len(failures) for _, failures in per_client))
+    return results
+
+
+def report(results: Dict[str, Dict], mode: str, **settings) -> Dict:
+    """
+    Wrap results with the settings and environment they were measured in.
+    """
+    return {
+        "mode": mode,
+        "settings": settings,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    Compare two reports route by route.
+
+    Returns:
+        One entry per route present in both, with the relative change in p95
+        latency and throughput and whether it counts as a regression
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = result["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        rows.append({
+            "route": name,
+            "p95_change": p95_change,
+            "throughput_change": rps_change,
+            "regression": p95_change > threshold or rps_change < -threshold,
+        })
+    return rows
+
+
+def load_report(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_report(data: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
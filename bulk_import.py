@@ -0,0 +1,161 @@
+"""
+Bulk Project Import for Personal Website
+Streams JSONL or CSV project records, validates each one with the project
+form rules, spools the valid rows to a temporary file and then inserts them
+in a single batched transaction.
+"""
+
+import contextlib
+import csv
+import itertools
+import json
+import pickle
+import tempfile
+from typing import IO, ContextManager, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from DAL import insert_projects
+from validation import validate_project
+
+SUPPORTED_FORMATS = ('jsonl', 'csv')
+FIELDS = ('title', 'description', 'image_filename')
+
+# Only the first errors are listed in the report; the count covers all
+MAX_REPORTED_ERRORS = 100
+
+# Validated rows are spooled in memory up to this size, then on disk
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Rows pickled together in the spool
+SPOOL_BATCH_ROWS = 1000
+
+_CONTENT_TYPES = {
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json': 'jsonl',
+    'text/csv': 'csv',
+}
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Guess the import format from a file name or a Content-Type.
+
+    Returns:
+        "jsonl", "csv" or None if it cannot be determined
+    """
+    if content_type:
+        return _CONTENT_TYPES.get(content_type.split(';', 1)[0].strip().lower())
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        if extension == 'csv':
+            return 'csv'
+    return None
+
+
+def _read_records(source: TextIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, record, parse error) for every input row."""
+    if fmt == 'csv':
+        reader = csv.DictReader(source)
+        try:
+            reader.fieldnames
+        except csv.Error as e:
+            yield reader.line_num + 1, None, f'Invalid CSV header: {e}'
+            return
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # The failing line is consumed but not counted in line_num;
+                # the next call resumes after it
+                yield reader.line_num + 1, None, f'Invalid CSV: {e}'
+                continue
+            yield reader.line_num, record, None
+
+    for number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Each line must be a JSON object.'
+            continue
+        yield number, record, None
+
+
+def _valid_rows(source: TextIO, fmt: str, report: Dict) -> Iterator[Tuple[str, str, str]]:
+    """Yield validated (title, description, image_filename) rows, counting errors in report."""
+    for number, record, error in _read_records(source, fmt):
+        if error is None:
+            values = tuple(record.get(field) for field in FIELDS)
+            if not all(isinstance(value, str) for value in values):
+                error = 'All fields are required.'
+            else:
+                values = tuple(value.strip() for value in values)
+                error = validate_project(*values)
+        if error is None:
+            yield values
+        else:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': number, 'error': error})
+
+
+def _spool(rows: Iterable[Tuple[str, str, str]]) -> IO[bytes]:
+    """Write rows to a temporary file in pickled batches; return it rewound."""
+    spool = tempfile.SpooledTemporaryFile(SPOOL_MEMORY_BYTES)
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(itertools.islice(rows, SPOOL_BATCH_ROWS))
+            if not batch:
+                break
+            pickle.dump(batch, spool, pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _spooled_rows(spool: IO[bytes]) -> Iterator[Tuple[str, str, str]]:
+    """Yield the rows written by _spool()."""
+    while True:
+        try:
+            yield from pickle.load(spool)
+        except EOFError:
+            return
+
+
+def import_projects(source: TextIO, fmt: str,
+                    write_lock: Optional[ContextManager] = None) -> Dict:
+    """
+    Import projects from a text stream.
+
+    Invalid rows are skipped and reported; they do not abort the import.
+    The whole source is read and validated into a temporary spool before
+    the insert starts, so the write lock is held only while rows are copied
+    from local storage, never while waiting on a slow client.
+
+    Args:
+        source: Text stream of JSONL lines or CSV with a header row
+        fmt: "jsonl" or "csv"
+        write_lock: Context manager held around the insert only, such as
+                    a global write slot
+
+    Returns:
+        Dictionary with "inserted", "error_count" and the first
+        MAX_REPORTED_ERRORS "errors" as {"row", "error"} dicts
+    """
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported import format: {fmt!r}')
+    report = {'inserted': 0, 'error_count': 0, 'errors': []}
+    with _spool(_valid_rows(source, fmt, report)) as spool:
+        with write_lock or contextlib.nullcontext():
+            report['inserted'] = insert_projects(_spooled_rows(spool))
+    return report
@@ -0,0 +1,95 @@
+"""
+Versioned LRU cache for the Data Access Layer
+Keeps recent query results in memory and tags each entry with the database
+change counter it was read at, so an entry is only served while the counter
+is unchanged.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class VersionedLRUCache:
+    """
+    Thread-safe LRU cache whose entries are valid for a single data version.
+
+    Entries are stored as (version, value). A lookup with a different version
+    counts as a miss and drops the entry, so callers never see results that
+    predate the latest committed write.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Tuple[bool, Any]:
+        """
+        Look up key for the given data version.
+
+        Args:
+            key: Cache key
+            version: Current data version
+
+        Returns:
+            Tuple of (hit, value); value is None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, version: Any, value: Any) -> None:
+        """
+        Store value for key at the given data version, evicting the least
+        recently used entry when the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def reset_after_fork(self) -> None:
+        """
+        Replace the lock in a forked child, where it may have been held by a
+        thread that no longer exists.
+        """
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss/eviction counters and the current size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,434 @@
+"""
+CSS Build for Personal Website
+Purges the vendored Bootstrap and our own stylesheet down to the rules the
+templates and scripts can use, minifies them into one self-hosted bundle,
+and extracts a small critical block per page template to inline in
+base.html while the bundle loads without blocking rendering.
+
+Runs offline: the only inputs are the files under static/ and templates/.
+"""
+
+import glob
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Stylesheets bundled, in cascade order, relative to the static folder
+CSS_SOURCES = ("vendor/bootstrap/css/bootstrap.min.css", "css/styles.css")
+
+# Outputs, relative to the static folder; build_assets fingerprints them
+BUNDLE_NAME = "css/bundle.min.css"
+CRITICAL_DIRNAME = "css/critical"
+
+# Classes only ever added by Bootstrap's own JavaScript (collapse, alerts),
+# which is vendored whole and so is not scanned. None of them is in the
+# markup the server sends, so critical CSS leaves them out
+SAFELIST = frozenset({"show", "showing", "hiding", "collapsing", "fade", "collapse-horizontal"})
+
+# Lines of a page's content block assumed to be above the fold; rules only
+# used further down arrive with the bundle
+CRITICAL_FOLD_LINES = 40
+
+# Pseudo-classes that only match once the user interacts with the page, and
+# declarations with no effect on how it first paints: critical CSS drops both
+INTERACTION_PSEUDO_CLASSES = ("hover", "focus", "focus-visible", "focus-within", "active")
+NON_PAINT_PROPERTIES = frozenset({"transition", "cursor"})
+
+# At-rules whose blocks hold further rules rather than declarations
+_GROUPING_AT_RULES = ("@media", "@supports", "@container", "@layer", "@document")
+
+_STRING_OR_COMMENT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*[\s\S]*?\*/')
+_TOKEN = re.compile(r"[\w-]+")
+_JINJA_EXPRESSION = re.compile(r"([\w-]*)\{\{(.*?)\}\}([\w-]*)", re.S)
+_QUOTED = re.compile(r"""'([\w -]*)'|"([\w -]*)\"""")
+_CLASS_OR_ID = re.compile(r"([.#])((?:[\w-]|\\.)+)")
+_CUSTOM_PROPERTY = re.compile(r"(?:^|;)\s*(--[\w-]+)\s*:")
+
+
+class _Rule:
+    """A style rule, or an at-rule whose body is kept whole (@font-face, @keyframes)."""
+
+    def __init__(self, prelude: str, body: str):
+        self.prelude = prelude
+        self.body = body
+
+
+class _Group:
+    """An at-rule holding rules, such as @media."""
+
+    def __init__(self, prelude: str, children: List):
+        self.prelude = prelude
+        self.children = children
+
+
+class _Statement:
+    """A body-less at-rule such as @charset or @import."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _strip_comments(css: str) -> Tuple[str, List[str]]:
+    """Remove comments outside strings; return the CSS and its /*! license banners."""
+    banners = []
+
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(0).startswith("/*!"):
+            banners.append(match.group(0))
+        return ""
+
+    return _STRING_OR_COMMENT.sub(replace, css), banners
+
+
+def _scan(css: str, i: int, stops: str) -> int:
+    """Index of the first character of stops at or after i, skipping strings and brackets."""
+    depth = 0
+    while i < len(css):
+        char = css[i]
+        if char in "\"'":
+            i += 1
+            while i < len(css) and css[i] != char:
+                i += 2 if css[i] == "\\" else 1
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and char in stops:
+            return i
+        i += 1
+    return i
+
+
+def _block_end(css: str, i: int) -> int:
+    """Index of the brace closing the block whose body starts at i."""
+    depth = 1
+    while i < len(css):
+        i = _scan(css, i, "{}")
+        if i >= len(css):
+            break
+        depth += 1 if css[i] == "{" else -1
+        if depth == 0:
+            return i
+        i += 1
+    return i
+
+
+def parse(css: str) -> List:
+    """
+    Parse comment-free CSS into a list of _Rule, _Group and _Statement.
+    """
+    nodes, i = [], 0
+    while i < len(css):
+        end = _scan(css, i, "{;}")
+        prelude = css[i:end].strip()
+        if end >= len(css) or css[end] == "}":
+            break
+        if css[end] == ";":
+            if prelude:
+                nodes.append(_Statement(prelude + ";"))
+            i = end + 1
+            continue
+        close = _block_end(css, end + 1)
+        body = css[end + 1:close]
+        if prelude.lower().startswith(_GROUPING_AT_RULES):
+            nodes.append(_Group(prelude, parse(body)))
+        else:
+            nodes.append(_Rule(prelude, body))
+        i = close + 1
+    return nodes
+
+
+def _minify(text: str, punctuation: str) -> str:
+    """Collapse whitespace and drop it around punctuation, leaving strings alone."""
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', text)
+    pattern = re.compile(r"\s*([" + re.escape(punctuation) + r"])\s*")
+    for index in range(0, len(parts), 2):
+        parts[index] = pattern.sub(r"\1", re.sub(r"\s+", " ", parts[index]))
+    return "".join(parts).strip()
+
+
+def _minify_body(body: str) -> str:
+    return _minify(body, ";:,{}").rstrip(";")
+
+
+def serialize(nodes: Iterable) -> str:
+    """Write nodes back out as minified CSS."""
+    out = []
+    for node in nodes:
+        if isinstance(node, _Statement):
+            out.append(node.text)
+        elif isinstance(node, _Group):
+            inner = serialize(node.children)
+            if inner:
+                out.append(f"{_minify(node.prelude, ',')}{{{inner}}}")
+        else:
+            out.append(f"{_minify(node.prelude, ',>~+')}{{{_minify_body(node.body)}}}")
+    return "".join(out)
+
+
+def _selector_used(selector: str, used: Set[str], tags: Optional[Set[str]] = None) -> bool:
+    """
+    Whether every class and id the selector requires appears in used and,
+    when tags is given, every element name in tags.
+
+    With tags, the selector is matched against markup as the server sends
+    it, before any script or user has touched it: attribute names and
+    values must appear in used too, and selectors needing an interaction
+    such as :hover are dropped. Without tags, attribute selectors are
+    ignored. The arguments of functional pseudo-classes such as :not() are
+    always ignored, which can only keep a selector, never drop one that
+    might match.
+    """
+    # Names, and values compared whole ([a=v], [a~=v], [a|=v]), not substrings
+    attributes = re.findall(r"\[\s*([\w-]+)\s*(?:[~|]?=\s*[\"']?([\w-]*))?", selector)
+    selector = re.sub(r"\[[^\]]*\]", "", selector)
+    while True:
+        stripped = re.sub(r"\([^()]*\)", "", selector)
+        if stripped == selector:
+            break
+        selector = stripped
+    if not all(name.replace("\\", "") in used for _, name in _CLASS_OR_ID.findall(selector)):
+        return False
+    if tags is None:
+        return True
+    if any(word and word not in used for attribute in attributes for word in attribute):
+        return False
+    if set(re.findall(r"(?<!:):([\w-]+)", selector)) & set(INTERACTION_PSEUDO_CLASSES):
+        return False
+    rest = re.sub(r"::?[\w-]+", "", _CLASS_OR_ID.sub("", selector))
+    return all(name.lower() in tags for name in re.findall(r"(?<![\w-])[a-zA-Z][\w-]*", rest))
+
+
+def _purge(nodes: List, used: Set[str], tags: Optional[Set[str]] = None) -> List:
+    kept = []
+    for node in nodes:
+        if isinstance(node, _Group):
+            children = _purge(node.children, used, tags)
+            if children:
+                kept.append(_Group(node.prelude, children))
+        elif isinstance(node, _Rule) and not node.prelude.startswith("@"):
+            selectors = [s for s in _split(node.prelude, ",") if _selector_used(s, used, tags)]
+            if selectors:
+                kept.append(_Rule(",".join(selectors), node.body))
+        else:
+            kept.append(node)
+    return kept
+
+
+def _first_paint(nodes: List) -> List:
+    """Drop print-only @media blocks and NON_PAINT_PROPERTIES declarations."""
+    kept = []
+    for node in nodes:
+        if isinstance(node, _Group):
+            if re.fullmatch(r"@media\s+(only\s+)?print", node.prelude.strip(), re.I):
+                continue
+            node = _Group(node.prelude, _first_paint(node.children))
+        elif isinstance(node, _Rule) and not node.prelude.startswith("@"):
+            declarations = [d for d in _split(node.body, ";")
+                            if d.split(":", 1)[0].strip().lower() not in NON_PAINT_PROPERTIES]
+            node = _Rule(node.prelude, ";".join(declarations))
+        kept.append(node)
+    return kept
+
+
+def _split(text: str, separator: str) -> List[str]:
+    """Split on separator outside strings and brackets, dropping empty parts."""
+    parts, i = [], 0
+    while i <= len(text):
+        end = _scan(text, i, separator)
+        parts.append(text[i:end].strip())
+        i = end + 1
+    return [part for part in parts if part]
+
+
+def _walk_rules(nodes: Iterable):
+    for node in nodes:
+        if isinstance(node, _Group):
+            yield from _walk_rules(node.children)
+        elif isinstance(node, _Rule):
+            yield node
+
+
+def _prune_unreferenced(nodes: List, referenced_text: str) -> List:
+    """
+    Drop @keyframes and custom property declarations nothing refers to.
+
+    Custom properties referring to each other are resolved by repeating
+    until nothing more is dropped.
+    """
+    while True:
+        css = serialize(nodes)
+        text = css + referenced_text
+        references = set(re.findall(r"var\(\s*(--[\w-]+)", text)) | set(re.findall(r"--[\w-]+", referenced_text))
+        changed = False
+        for rule in _walk_rules(nodes):
+            if rule.prelude.startswith("@"):
+                continue
+            declarations = _split(rule.body, ";")
+            kept = [d for d in declarations
+                    if not (m := _CUSTOM_PROPERTY.match(";" + d)) or m.group(1) in references]
+            if len(kept) != len(declarations):
+                rule.body = ";".join(kept)
+                changed = True
+        animations = set(_TOKEN.findall(" ".join(
+            rule.body for rule in _walk_rules(nodes) if not rule.prelude.startswith("@keyframes"))))
+        before = len(nodes)
+        nodes = _drop_keyframes(nodes, animations)
+        if not changed and len(nodes) == before:
+            return _drop_empty(nodes)
+
+
+def _drop_keyframes(nodes: List, animations: Set[str]) -> List:
+    kept = []
+    for node in nodes:
+        if isinstance(node, _Group):
+            node = _Group(node.prelude, _drop_keyframes(node.children, animations))
+        elif isinstance(node, _Rule) and re.match(r"@(-\w+-)?keyframes\s", node.prelude):
+            if node.prelude.split()[-1] not in animations:
+                continue
+        kept.append(node)
+    return kept
+
+
+def _drop_empty(nodes: List) -> List:
+    kept = []
+    for node in nodes:
+        if isinstance(node, _Group):
+            node = _Group(node.prelude, _drop_empty(node.children))
+            if not node.children:
+                continue
+        elif isinstance(node, _Rule) and not _minify_body(node.body):
+            continue
+        kept.append(node)
+    return kept
+
+
+def extract_tokens(text: str) -> Set[str]:
+    """
+    Every word that could name a class or id in a template or script.
+
+    Class names assembled in Jinja, such as alert-{{ 'danger' if x else
+    'success' }}, are expanded with each quoted alternative.
+    """
+    tokens = set(_TOKEN.findall(text))
+    for prefix, expression, suffix in _JINJA_EXPRESSION.findall(text):
+        for single, double in _QUOTED.findall(expression):
+            for word in (single or double).split():
+                tokens.add(prefix + word + suffix)
+    return tokens
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _content_block(template: str) -> str:
+    match = re.search(r"{%-?\s*block\s+content\s*-?%}(.*?){%-?\s*endblock", template, re.S)
+    return match.group(1) if match else ""
+
+
+def _above_the_fold(name: str, template_dir: str) -> str:
+    """Markup of template name assumed visible before scrolling, includes expanded."""
+    base = _read(os.path.join(template_dir, "base.html"))
+    header = re.split(r"{%-?\s*block\s+content\b", base)[0]
+    fold = "\n".join(_content_block(_read(os.path.join(template_dir, name)))
+                     .splitlines()[:CRITICAL_FOLD_LINES])
+
+    def include(match):
+        path = os.path.join(template_dir, match.group(1))
+        return _read(path) if os.path.isfile(path) else ""
+
+    return header + re.sub(r"""{%-?\s*include\s+["']([^"']+)["'].*?%}""", include, fold)
+
+
+def _sources(static_dir: str, template_dir: str) -> Dict[str, str]:
+    """Files scanned for used selectors: page templates, partials and our scripts."""
+    paths = sorted(glob.glob(os.path.join(template_dir, "*.html")))
+    paths += sorted(glob.glob(os.path.join(static_dir, "js", "*.js")))
+    return {path: _read(path) for path in paths}
+
+
+def input_paths(static_dir: str, template_dir: str) -> List[str]:
+    """Every file the build reads."""
+    return ([os.path.join(static_dir, *name.split("/")) for name in CSS_SOURCES]
+            + list(_sources(static_dir, template_dir)))
+
+
+def build_css(static_dir: str, template_dir: str) -> Dict[str, int]:
+    """
+    Write the purged bundle and the critical CSS of every page template.
+
+    Args:
+        static_dir: The Flask static folder
+        template_dir: The Flask template folder
+
+    Returns:
+        Sizes in bytes: "sources", BUNDLE_NAME and one entry per critical file
+    """
+    raw = "".join(_read(os.path.join(static_dir, *name.split("/"))) for name in CSS_SOURCES)
+    css, banners = _strip_comments(raw)
+    nodes = parse(css)
+
+    sources = _sources(static_dir, template_dir)
+    source_text = "\n".join(sources.values())
+    used = set(SAFELIST)
+    for text in sources.values():
+        used |= extract_tokens(text)
+
+    # @charset must come first; banners keep the MIT notice
+    charset = '@charset "UTF-8";' if any(isinstance(n, _Statement) and n.text.lower().startswith("@charset")
+                                         for n in nodes) else ""
+    nodes = [n for n in nodes if not (isinstance(n, _Statement) and n.text.lower().startswith("@charset"))]
+    bundle = charset + "".join(banners) + serialize(_prune_unreferenced(_purge(nodes, used), source_text))
+
+    sizes = {"sources": len(raw.encode("utf-8"))}
+    _write(os.path.join(static_dir, *BUNDLE_NAME.split("/")), bundle)
+    sizes[BUNDLE_NAME] = len(bundle.encode("utf-8"))
+
+    critical_dir = os.path.join(static_dir, *CRITICAL_DIRNAME.split("/"))
+    for path in sources:
+        name = os.path.basename(path)
+        if not path.startswith(template_dir) or "{% extends" not in sources[path]:
+            continue
+        fold = _above_the_fold(name, template_dir)
+        fold_used = extract_tokens(fold)
+        # Rules for elements that only appear further down wait for the bundle
+        tags = {"html", "body"} | {tag.lower() for tag in re.findall(r"<([a-zA-Z][\w-]*)", fold)}
+        critical = serialize(_prune_unreferenced(_first_paint(_purge(nodes, fold_used, tags)), fold))
+        target = os.path.join(critical_dir, os.path.splitext(name)[0] + ".css")
+        _write(target, critical)
+        sizes[f"{CRITICAL_DIRNAME}/{os.path.basename(target)}"] = len(critical.encode("utf-8"))
+    return sizes
+
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def load_critical(static_dir: str, template_name: str) -> Optional[str]:
+    """
+    Critical CSS built for a page template.
+
+    Returns:
+        The CSS, or None if none has been built for it
+    """
+    path = os.path.join(static_dir, *CRITICAL_DIRNAME.split("/"),
+                        os.path.splitext(os.path.basename(template_name))[0] + ".css")
+    try:
+        return _read(path)
+    except FileNotFoundError:
+        return None
+
+
+def is_stale(static_dir: str, template_dir: str) -> bool:
+    """Whether the bundle is missing or older than any file it was built from."""
+    try:
+        built = os.path.getmtime(os.path.join(static_dir, *BUNDLE_NAME.split("/")))
+    except FileNotFoundError:
+        return True
+    return any(os.path.getmtime(path) > built for path in input_paths(static_dir, template_dir))
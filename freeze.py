@@ -0,0 +1,189 @@
+"""
+Static Export for Personal Website
+Renders the read-only pages through the Flask app into plain HTML files,
+with gzip and brotli copies, so a static file server can answer them
+without Python. Pages built from the projects table are regenerated when
+the data changes; the write routes stay on Flask.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from flask import after_this_request, g, has_request_context, render_template
+
+import DAL
+from assets import write_atomic, write_compressed
+
+logger = logging.getLogger(__name__)
+
+# URL rendered for each frozen page -> output file. /projects is frozen as
+# the unpaginated listing, since a static server cannot follow ?after=
+# cursors; the paginated views stay on Flask.
+STATIC_PAGES = {
+    "/": "index.html",
+    "/about": "about.html",
+    "/resume": "resume.html",
+    "/thank-you": "thank-you.html",
+}
+DATA_PAGES = {
+    "/projects?all=1": "projects.html",
+}
+
+# Templates written for the static server's error_page directives
+ERROR_PAGES = {
+    "404.html": "404.html",
+    "500.html": "500.html",
+}
+
+# Written next to the pages: the data version the data pages were built from
+MANIFEST_NAME = "freeze.json"
+
+# DAL functions whose commit changes what DATA_PAGES show
+DATA_WRITES = frozenset({"insert_project", "insert_projects", "delete_project"})
+
+# Brotli quality for DATA_PAGES, which are compressed while a write request
+# waits: quality 11 takes about 50 times as long for output ~20% smaller
+DATA_BROTLI_QUALITY = 9
+
+_lock = threading.Lock()
+
+
+def _write_page(output_dir: str, filename: str, body: bytes, brotli_quality: int = 11) -> None:
+    path = os.path.join(output_dir, filename)
+    # Variants first: a server picking up the new page must never be
+    # handed an older compressed copy
+    write_compressed(path, body, brotli_quality)
+    write_atomic(path, body)
+
+
+def _render(flask_app, url: str) -> bytes:
+    response = flask_app.test_client().get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} answered {response.status_code}")
+    return response.get_data()
+
+
+def read_manifest(output_dir: str) -> Dict:
+    """
+    Load the manifest of a frozen site.
+
+    Returns:
+        The manifest, or an empty dict if nothing has been frozen there
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _freeze_data_pages(flask_app, output_dir: str) -> List[str]:
+    # Read before rendering: a write landing meanwhile makes the pages newer
+    # than the recorded version, and the next refresh renders them again
+    version = DAL.get_data_version()
+    written = []
+    for url, filename in DATA_PAGES.items():
+        _write_page(output_dir, filename, _render(flask_app, url), DATA_BROTLI_QUALITY)
+        written.append(filename)
+    manifest = read_manifest(output_dir)
+    manifest["data_version"] = version
+    write_atomic(os.path.join(output_dir, MANIFEST_NAME),
+                 json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return written
+
+
+def freeze(flask_app, output_dir: str) -> List[str]:
+    """
+    Render every frozen page into output_dir.
+
+    Args:
+        flask_app: The Flask application to render with
+        output_dir: Directory the static server serves
+
+    Returns:
+        Names of the files written (compressed copies not included)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with _lock:
+        for url, filename in STATIC_PAGES.items():
+            _write_page(output_dir, filename, _render(flask_app, url))
+            written.append(filename)
+        for template, filename in ERROR_PAGES.items():
+            # A URL matching no route, so no nav item is marked active
+            with flask_app.test_request_context("/" + filename):
+                body = render_template(template).encode("utf-8")
+            _write_page(output_dir, filename, body)
+            written.append(filename)
+        written += _freeze_data_pages(flask_app, output_dir)
+    return written
+
+
+def refresh(flask_app, output_dir: str) -> List[str]:
+    """
+    Regenerate the data pages if the projects table changed since they were
+    written, by this or any other process.
+
+    Returns:
+        Names of the files written; empty when the pages were current
+    """
+    with _lock:
+        if read_manifest(output_dir).get("data_version") == DAL.get_data_version():
+            return []
+        return _freeze_data_pages(flask_app, output_dir)
+
+
+def refresh_after_write(flask_app, output_dir: str):
+    """
+    Build a DAL query listener that refreshes the data pages once a write
+    to projects has committed.
+
+    During a request, regeneration waits until the view has returned, so it
+    never runs inside the write slot the view held around the write (see
+    admission.write_slot), and happens once however many writes the request
+    made. It still runs before the response is sent, so a redirect to a
+    frozen page already shows the change. Writes outside a request refresh
+    at once. Rendering errors are logged, not raised: the write has already
+    committed and the next one retries.
+    """
+    def regenerate() -> None:
+        try:
+            refresh(flask_app, output_dir)
+        except Exception:
+            logger.exception("Could not regenerate the frozen pages in %s", output_dir)
+
+    def after_request(response):
+        regenerate()
+        return response
+
+    def listener(function: str, seconds: float, rows: int) -> None:
+        if function not in DATA_WRITES or not rows:
+            return
+        if not has_request_context():
+            regenerate()
+        elif not g.get("freeze_refresh_pending"):
+            g.freeze_refresh_pending = True
+            after_this_request(after_request)
+
+    return listener
+
+
+def watch(flask_app, output_dir: str, interval: float = 1.0,
+          stop: Optional[threading.Event] = None) -> None:
+    """
+    Refresh the data pages whenever the data version moves, for writes made
+    outside the web app (e.g. with the sqlite3 shell). Runs until stop is set.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            written = refresh(flask_app, output_dir)
+        except Exception:
+            logger.exception("Could not regenerate the frozen pages in %s", output_dir)
+        else:
+            if written:
+                logger.info("Regenerated %s", ", ".join(written))
+        stop.wait(interval)
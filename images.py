@@ -0,0 +1,345 @@
+"""
+Responsive Image Variants for Personal Website
+Resizes and re-encodes images under static/ on first request and keeps the
+results in a content-addressed, size-capped disk cache shared by all
+workers.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import warnings
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; coalescing is per process there
+    fcntl = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; originals are served without it
+    Image = ImageOps = None
+
+# What Pillow raises for files it cannot decode: unknown or truncated data
+# (OSError, which includes UnidentifiedImageError), corrupt chunks
+# (SyntaxError, ValueError) and images over Image.MAX_IMAGE_PIXELS
+DECODE_ERRORS = (OSError, SyntaxError, ValueError) + (
+    (Image.DecompressionBombError,) if Image is not None else ())
+
+# Output formats: name -> (Pillow format, mimetype, file extension)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+# Requested widths are rounded up to one of these so the number of variants
+# per image (and the cache) stays bounded
+WIDTHS = (80, 160, 320, 480, 640, 960, 1280, 1920)
+
+# Source files Pillow should resize; anything else (e.g. SVG) is sent as is
+RASTER_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+# Bump when the encoding pipeline changes so stale variants are not reused
+PIPELINE_VERSION = 1
+
+# Number of lock files used to coalesce concurrent encodes of the same variant
+LOCK_STRIPES = 64
+
+# Cache hits refresh a file's mtime (its LRU timestamp) at most this often
+TOUCH_INTERVAL = 3600
+
+
+def snap_width(width: Optional[int]) -> int:
+    """
+    Round a requested width up to the nearest entry in WIDTHS.
+
+    Args:
+        width: Requested width in pixels, or None for the largest
+
+    Returns:
+        A width from WIDTHS
+    """
+    if width is None:
+        return WIDTHS[-1]
+    for candidate in WIDTHS:
+        if candidate >= width:
+            return candidate
+    return WIDTHS[-1]
+
+
+def is_raster(filename: str) -> bool:
+    """Whether filename is an image format the variant pipeline can resize."""
+    return os.path.splitext(filename)[1].lower() in RASTER_EXTENSIONS
+
+
+def default_format(filename: str, accept_mimetypes) -> str:
+    """
+    Pick an output format when the URL does not name one.
+
+    WebP is used when the client advertises it; otherwise PNG sources stay
+    PNG (they may carry transparency) and everything else becomes JPEG.
+    """
+    if accept_mimetypes["image/webp"]:
+        return "webp"
+    return "png" if filename.lower().endswith(".png") else "jpeg"
+
+
+def verify_image(path: str) -> None:
+    """
+    Check that path holds an image Pillow can decode, without decoding pixels.
+
+    Images over Image.MAX_IMAGE_PIXELS are refused, not just warned about.
+    Without Pillow installed every file passes.
+
+    Raises:
+        ValueError: If the file is unreadable, corrupt or truncated, or too large
+    """
+    if Image is None:
+        return
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(path) as image:
+                image.verify()
+    except (Image.DecompressionBombWarning,) + DECODE_ERRORS as e:
+        raise ValueError(f"The image could not be read ({e}).") from e
+
+
+def encode_variant(source_path: str, width: int, fmt: str, quality: int) -> bytes:
+    """
+    Resize an image to at most width pixels wide and encode it.
+
+    Images are never upscaled. JPEG sources are decoded at reduced scale
+    where possible (Image.thumbnail uses the decoder's draft mode), and EXIF
+    orientation is applied so the variant displays upright without metadata.
+
+    Args:
+        source_path: Path of the original image
+        width: Maximum output width
+        fmt: Key of FORMATS
+        quality: Encoder quality for lossy formats
+
+    Returns:
+        The encoded image
+
+    Raises:
+        One of DECODE_ERRORS if the source is not a readable image
+    """
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source_path) as image:
+        # Orientations 5-8 are rotated by 90 degrees: width is the stored height
+        rotated = image.getexif().get(0x0112, 1) >= 5
+        image.thumbnail((10**6, width) if rotated else (width, 10**6),
+                        Image.LANCZOS, reducing_gap=3.0)
+        image = ImageOps.exif_transpose(image)
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode == "P":
+            image = image.convert("RGBA")
+
+        options = {
+            "WEBP": {"quality": quality, "method": 4},
+            "JPEG": {"quality": quality, "optimize": True, "progressive": True},
+            "PNG": {"optimize": True},
+        }[pil_format]
+        out = io.BytesIO()
+        image.save(out, pil_format, **options)
+        return out.getvalue()
+
+
+class ImageVariantCache:
+    """
+    Content-addressed disk cache of resized images.
+
+    A variant's file name is a hash of the source file's contents and the
+    encoding parameters, so editing an image produces new variants and never
+    serves a stale one. Files are sharded into 256 subdirectories by the
+    first two hex digits of their key.
+
+    The first request for a variant takes an exclusive flock() on one of
+    LOCK_STRIPES lock files and encodes it while holding the lock; other
+    workers (and threads) asking for the same variant block on the lock and
+    then find the finished file. Each write is followed by an eviction pass
+    that deletes the least recently used files until the cache is below
+    max_bytes. Hits refresh the file's mtime, which serves as the LRU clock.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024,
+                 quality: int = 80):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.quality = quality
+        # path -> (mtime_ns, size, sha256) so sources are hashed once per edit
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._digest_lock = threading.Lock()
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def source_digest(self, source_path: str) -> str:
+        """
+        Return the SHA-256 of a source image, re-hashing only after it changes.
+        """
+        st = os.stat(source_path)
+        with self._digest_lock:
+            cached = self._digests.get(source_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+        with self._digest_lock:
+            self._digests[source_path] = (st.st_mtime_ns, st.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+    def variant_key(self, source_path: str, width: int, fmt: str) -> str:
+        """
+        Return the content address of a variant.
+        """
+        params = f"{self.source_digest(source_path)}:{width}:{fmt}:{self.quality}:{PIPELINE_VERSION}"
+        return hashlib.sha256(params.encode("ascii")).hexdigest()[:40]
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + FORMATS[fmt][2])
+
+    def get(self, source_path: str, width: int, fmt: str) -> Tuple[str, str]:
+        """
+        Return the cached variant of source_path, encoding it on a miss.
+
+        Args:
+            source_path: Path of the original image
+            width: Output width, normally from snap_width()
+            fmt: Key of FORMATS
+
+        Returns:
+            Tuple of (path to the variant file, variant key)
+        """
+        key = self.variant_key(source_path, width, fmt)
+        path = self._path(key, fmt)
+        if self._touch(path):
+            return path, key
+
+        stripe = int(key[:8], 16) % LOCK_STRIPES
+        with self._thread_locks[stripe], self._file_lock(f"{stripe:02d}.lock"):
+            # Someone else may have produced it while we waited for the lock
+            if not os.path.exists(path):
+                data = encode_variant(source_path, width, fmt, self.quality)
+                self._write(path, data)
+                written = True
+            else:
+                written = False
+        if written:
+            self.evict()
+        return path, key
+
+    def evict(self) -> int:
+        """
+        Delete least recently used variants until the cache fits in max_bytes.
+
+        Only one worker evicts at a time; others skip the pass.
+
+        Returns:
+            Number of files removed
+        """
+        with self._file_lock("evict.lock", blocking=False) as acquired:
+            if not acquired:
+                return 0
+            entries, total = [], 0
+            for shard in _scandir(self.cache_dir):
+                if not shard.is_dir() or len(shard.name) != 2:
+                    continue
+                for entry in _scandir(shard.path):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return 0
+
+            removed = 0
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            return removed
+
+    def _touch(self, path: str) -> bool:
+        """Refresh path's LRU timestamp if it exists; return whether it does."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - st.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:  # evicted in between; still a hit for this request
+                pass
+        return True
+
+    def _write(self, path: str, data: bytes) -> None:
+        """Write data to path atomically so readers never see a partial file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _file_lock(self, name: str, blocking: bool = True):
+        return _FileLock(os.path.join(self.cache_dir, "locks", name), blocking)
+
+
+class _FileLock:
+    """
+    Exclusive flock() on a lock file; entering yields whether it was acquired.
+    """
+
+    def __init__(self, path: str, blocking: bool):
+        self.path = path
+        self.blocking = blocking
+        self._file = None
+
+    def __enter__(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a+b")
+        flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._file.fileno(), flags)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def __exit__(self, *exc_info) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def _scandir(path: str):
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,432 @@
+"""
+Multi-process Metrics for Personal Website
+Counters and histograms stored in one memory-mapped file per process, so
+every gunicorn worker records without locking the others, and rendered in
+the Prometheus text format by summing the files of all processes.
+"""
+
+import bisect
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+import weakref
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; files of exited processes are kept there
+    fcntl = None
+
+# Upper bounds (seconds) of the latency histogram buckets
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5)
+
+# Metric families: name -> (type, help)
+FAMILIES = {
+    "http_requests_total": ("counter", "HTTP responses by endpoint, method and status."),
+    "http_request_duration_seconds": ("histogram", "Time spent handling a request, by endpoint."),
+    "dal_query_duration_seconds": ("histogram", "Time spent in DAL queries, by function."),
+    "dal_query_rows_total": ("counter", "Rows read or written by DAL queries, by function."),
+}
+
+# Other request methods are counted as "OTHER" so clients cannot create
+# unbounded label values
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+_INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct("<I4x")  # bytes used, padding to keep values 8-byte aligned
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+# Totals of exited processes, merged so their files can be deleted
+ARCHIVE_FILE = "metrics_archive.db"
+
+
+class MmapValues:
+    """
+    A file of (key, float) entries appended through a memory map.
+
+    Layout: an 8 byte header holding the number of bytes in use, then
+    entries of [uint32 key length][utf-8 key, padded to 8 byte alignment]
+    [float64 value]. Only the owning process writes the file; values are
+    mirrored in a dict so increments never read the map back.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._values: Dict[int, float] = {}
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, value, offset in _read_entries(self._map, self._used):
+            self._offsets[key] = offset
+            self._values[offset] = value
+
+    def offset(self, key: str) -> int:
+        """
+        Return the offset of key's value, appending an entry if it is new.
+        """
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+        return offset
+
+    def add(self, offset: int, amount: float) -> None:
+        """
+        Add amount to the value stored at offset.
+        """
+        with self._lock:
+            value = self._values[offset] + amount
+            self._values[offset] = value
+            _VALUE.pack_into(self._map, offset, value)
+
+    def add_many(self, updates: Iterable[Tuple[int, float]]) -> None:
+        """
+        Apply several (offset, amount) additions under one lock acquisition.
+        """
+        values, pack_into = self._values, _VALUE.pack_into
+        with self._lock:
+            # Read inside the lock: _append() may replace the map while growing it
+            data = self._map
+            for offset, amount in updates:
+                value = values[offset] + amount
+                values[offset] = value
+                pack_into(data, offset, value)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        # Pad so that the value after the key is 8-byte aligned
+        padded = len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        entry_size = _KEY_LENGTH.size + padded + _VALUE.size
+        if self._used + entry_size > len(self._map):
+            self._grow(self._used + entry_size)
+
+        start = self._used
+        _KEY_LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _KEY_LENGTH.size:start + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = start + _KEY_LENGTH.size + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += entry_size
+        # Publish the entry only once it is complete
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        self._values[offset] = 0.0
+        return offset
+
+    def _grow(self, needed: int) -> None:
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+
+def _read_entries(data, used: int) -> Iterator[Tuple[str, float, int]]:
+    """Yield (key, value, value offset) for every entry in a values file."""
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        key = bytes(data[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length])
+        offset = position + _KEY_LENGTH.size + length + (-(_KEY_LENGTH.size + length) % 8)
+        yield key.decode("utf-8"), _VALUE.unpack_from(data, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+def _file_pid(path: str):
+    """The pid in a metrics_<pid>.db name, or None for other files."""
+    name = os.path.basename(path)[len("metrics_"):-len(".db")]
+    return int(name) if name.isdigit() else None
+
+
+def _process_alive(pid) -> bool:
+    if pid is None or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+class Metrics:
+    """
+    Record request and query metrics for this process and render the totals
+    of all processes sharing directory.
+
+    Each process writes metrics_<pid>.db in directory and reopens its file
+    after fork(). collect() folds the files of exited processes into
+    metrics_archive.db and deletes them, so totals never go backwards when a
+    worker is replaced and the directory does not grow with every restart.
+
+    Sample keys are the Prometheus sample lines themselves
+    (e.g. 'http_requests_total{endpoint="index",method="GET",status="200"}'),
+    and the offsets of each label set's samples are cached so recording a
+    histogram observation costs one bisect and three float writes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._values = None
+        self._open()
+        _instances.add(self)
+
+    def _open(self) -> MmapValues:
+        self._values = MmapValues(os.path.join(self.directory, f"metrics_{os.getpid()}.db"))
+        self._counters: Dict[tuple, int] = {}
+        self._histograms: Dict[tuple, Tuple[tuple, List[int]]] = {}
+        # (endpoint, method, status) -> (counter offset, histogram offsets)
+        self._request_slots: Dict[tuple, Tuple[int, List[int]]] = {}
+        self._query_slots: Dict[str, Tuple[int, List[int]]] = {}
+        return self._values
+
+    def _forked(self) -> None:
+        # The inherited map belongs to the parent; open our own file on next use
+        self._values = None
+
+    def inc(self, name: str, labels: Tuple[Tuple[str, str], ...], amount: float = 1.0) -> None:
+        """
+        Increment a counter.
+
+        Args:
+            name: Metric family name
+            labels: Tuple of (label, value) pairs
+            amount: Increment
+        """
+        values = self._values or self._open()
+        key = (name, labels)
+        offset = self._counters.get(key)
+        if offset is None:
+            offset = values.offset(f"{name}{{{_format_labels(labels)}}}")
+            self._counters[key] = offset
+        values.add(offset, amount)
+
+    def observe(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float,
+                buckets: Tuple[float, ...]) -> None:
+        """
+        Record one observation in a histogram.
+
+        Bucket counts are stored per bucket (not cumulatively) and summed at
+        render time, so each observation touches a single bucket.
+        """
+        values = self._values or self._open()
+        key = (name, labels)
+        entry = self._histograms.get(key)
+        if entry is None:
+            entry = (buckets, self._histogram_offsets(name, labels, buckets))
+            self._histograms[key] = entry
+        bounds, offsets = entry
+        values.add_many(((offsets[bisect.bisect_left(bounds, value)], 1.0),
+                         (offsets[-2], value), (offsets[-1], 1.0)))
+
+    def _histogram_offsets(self, name, labels, buckets) -> List[int]:
+        label_text = _format_labels(labels)
+        prefix = label_text + "," if label_text else ""
+        offsets = [self._values.offset(f'{name}_bucket{{{prefix}le="{_format_bound(bound)}"}}')
+                   for bound in (*buckets, math.inf)]
+        offsets.append(self._values.offset(f"{name}_sum{{{label_text}}}"))
+        offsets.append(self._values.offset(f"{name}_count{{{label_text}}}"))
+        return offsets
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float) -> None:
+        """
+        Record a finished request.
+
+        This runs on every request, so the offsets of the status counter and
+        the latency histogram are looked up once per (endpoint, method,
+        status) and all four writes share one lock acquisition.
+        """
+        if method not in HTTP_METHODS:
+            method = "OTHER"
+        values = self._values or self._open()
+        slot = self._request_slots.get((endpoint, method, status))
+        if slot is None:
+            counter = values.offset('http_requests_total{%s}' % _format_labels(
+                (("endpoint", endpoint), ("method", method), ("status", str(status)))))
+            histogram = self._histogram_offsets("http_request_duration_seconds",
+                                                (("endpoint", endpoint),), REQUEST_BUCKETS)
+            slot = self._request_slots[(endpoint, method, status)] = (counter, histogram)
+        counter, offsets = slot
+        values.add_many(((counter, 1.0),
+                         (offsets[bisect.bisect_left(REQUEST_BUCKETS, seconds)], 1.0),
+                         (offsets[-2], seconds), (offsets[-1], 1.0)))
+
+    def observe_query(self, function: str, seconds: float, rows: int) -> None:
+        """
+        Record a DAL query; suitable as a DAL query listener.
+        """
+        values = self._values or self._open()
+        slot = self._query_slots.get(function)
+        if slot is None:
+            labels = (("function", function),)
+            rows_counter = values.offset('dal_query_rows_total{%s}' % _format_labels(labels))
+            histogram = self._histogram_offsets("dal_query_duration_seconds", labels, QUERY_BUCKETS)
+            slot = self._query_slots[function] = (rows_counter, histogram)
+        rows_counter, offsets = slot
+        values.add_many(((rows_counter, rows),
+                         (offsets[bisect.bisect_left(QUERY_BUCKETS, seconds)], 1.0),
+                         (offsets[-2], seconds), (offsets[-1], 1.0)))
+
+    def collect(self) -> Dict[str, float]:
+        """
+        Sum every sample across the files of all processes.
+
+        Returns:
+            Mapping of sample line (name and labels) to total value
+        """
+        self._archive_dead_processes()
+        totals: Dict[str, float] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "metrics_*.db"))):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            if len(data) < _HEADER.size:
+                continue
+            used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+            for key, value, _ in _read_entries(data, used):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def _archive_dead_processes(self) -> None:
+        """
+        Add the values of exited processes to the archive file and delete
+        their files.
+
+        An exclusive flock on the archive keeps two workers scraping at once
+        from merging the same file twice. A file is deleted before its values
+        are added, so a crash in between loses them (a counter reset, which
+        Prometheus handles) rather than counting them twice.
+        """
+        if fcntl is None:
+            return
+        dead = [path for path in glob.glob(os.path.join(self.directory, "metrics_*.db"))
+                if not _process_alive(_file_pid(path))]
+        if not dead:
+            return
+        archive = MmapValues(os.path.join(self.directory, ARCHIVE_FILE))
+        try:
+            fcntl.flock(archive._file.fileno(), fcntl.LOCK_EX)
+            for path in dead:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Merged by another process while we waited for the lock
+                    continue
+                if len(data) < _HEADER.size:
+                    continue
+                used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+                # Offsets first: offset() takes the lock add_many() holds
+                archive.add_many([(archive.offset(key), value)
+                                  for key, value, _ in _read_entries(data, used)])
+        finally:
+            archive.close()
+
+    def render(self) -> str:
+        """
+        Render the totals in the Prometheus text exposition format.
+        """
+        families: Dict[str, List[Tuple[str, float]]] = {}
+        for sample, value in self.collect().items():
+            name = sample.split("{", 1)[0]
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+                    name = name[:-len(suffix)]
+                    break
+            families.setdefault(name, []).append((sample, value))
+
+        lines = []
+        for name in sorted(families):
+            kind, help_text = FAMILIES.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            samples = families[name]
+            if kind == "histogram":
+                samples = _cumulative_buckets(samples)
+            for sample, value in sorted(samples, key=_sample_order):
+                lines.append(f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Live Metrics objects, told to reopen their file in forked children
+_instances = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for instance in list(_instances):
+        instance._forked()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _bucket_bound(sample: str) -> float:
+    bound = sample.rsplit('le="', 1)[1].split('"', 1)[0]
+    return math.inf if bound == "+Inf" else float(bound)
+
+
+def _series(sample: str) -> str:
+    """The labels of a sample without le, identifying its histogram series."""
+    labels = sample.partition("{")[2]
+    if 'le="' in labels:
+        labels = labels.rpartition('le="')[0].rstrip(",")
+    return labels.rstrip("}")
+
+
+def _sample_order(item):
+    sample = item[0]
+    name = sample.partition("{")[0]
+    if name.endswith("_bucket"):
+        return _series(sample), 0, _bucket_bound(sample)
+    return _series(sample), 2 if name.endswith("_count") else 1, 0.0
+
+
+def _cumulative_buckets(samples):
+    """Turn per-bucket counts into the cumulative counts Prometheus expects."""
+    running: Dict[str, float] = {}
+    result = []
+    for sample, value in sorted(samples, key=_sample_order):
+        if sample.partition("{")[0].endswith("_bucket"):
+            series = _series(sample)
+            value = running[series] = running.get(series, 0.0) + value
+        result.append((sample, value))
+    return result
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
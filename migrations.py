@@ -0,0 +1,219 @@
+"""
+Schema Migrations for Personal Website
+Brings the SQLite schema up to date with an ordered list of migrations,
+tracking the applied version in PRAGMA user_version.
+"""
+
+import sqlite3
+from typing import Callable, Tuple
+
+
+def _create_projects(conn: sqlite3.Connection) -> None:
+    """Projects table, listing index and change counter."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            image_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Covers the newest-first listing and keyset pagination
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_projects_created_at_id
+        ON projects (created_at, id)
+    """)
+
+    # Single-row change counter bumped by triggers on every write to
+    # projects, whatever process or tool makes it. Readers compare it
+    # against cached results to detect writes from other workers.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO change_counter (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS projects_bump_version_{event.lower()}
+            AFTER {event} ON projects
+            BEGIN
+                UPDATE change_counter
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = 1;
+            END
+        """)
+
+
+def _create_search(conn: sqlite3.Connection) -> None:
+    """
+    FTS5 index over project titles and descriptions.
+
+    projects_fts is an external-content table: it stores only the index and
+    reads text back from projects. Triggers keep it in sync, and it is
+    rebuilt from existing rows when it is created. When SQLite was built
+    without FTS5 the step does nothing and search falls back to LIKE.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'projects_fts'"
+    ).fetchone()
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+                title, description,
+                content='projects', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects
+        BEGIN
+            INSERT INTO projects_fts (rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects
+        BEGIN
+            INSERT INTO projects_fts (projects_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE ON projects
+        BEGIN
+            INSERT INTO projects_fts (projects_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO projects_fts (rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """)
+
+    if not exists:
+        # Index rows written before search existed
+        conn.execute("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')")
+
+
+def _create_outbox(conn: sqlite3.Connection) -> None:
+    """Contact form submissions waiting for delivery (see outbox.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS contact_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivered_at TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_contact_outbox_due
+        ON contact_outbox (status, next_attempt_at)
+    """)
+
+
+def _defer_bulk_indexing(conn: sqlite3.Connection) -> None:
+    """
+    Let bulk inserts skip the per-row insert triggers.
+
+    While bulk_load.active is 1, inserting into projects neither adds the
+    row to projects_fts nor bumps change_counter; DAL.insert_projects()
+    sets it inside its transaction, indexes each chunk with one
+    INSERT ... SELECT, bumps the counter once and clears it before
+    committing, so other connections only ever see 0.
+    """
+    conn.execute("""
+        CREATE TABLE bulk_load (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            active INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT INTO bulk_load (id, active) VALUES (1, 0)")
+
+    conn.execute("DROP TRIGGER IF EXISTS projects_bump_version_insert")
+    conn.execute("""
+        CREATE TRIGGER projects_bump_version_insert AFTER INSERT ON projects
+        WHEN (SELECT active FROM bulk_load WHERE id = 1) = 0
+        BEGIN
+            UPDATE change_counter
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+        END
+    """)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                    "AND name = 'projects_fts_insert'").fetchone():
+        conn.execute("DROP TRIGGER projects_fts_insert")
+        conn.execute("""
+            CREATE TRIGGER projects_fts_insert AFTER INSERT ON projects
+            WHEN (SELECT active FROM bulk_load WHERE id = 1) = 0
+            BEGIN
+                INSERT INTO projects_fts (rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END
+        """)
+
+
+# Ordered schema changes; migration N (1-based) brings user_version to N.
+# Append new steps, never edit or reorder applied ones. The first three use
+# IF NOT EXISTS because databases created before versioning (user_version 0)
+# may already have some or all of their objects.
+MIGRATIONS: Tuple[Callable[[sqlite3.Connection], None], ...] = (
+    _create_projects,
+    _create_search,
+    _create_outbox,
+    _defer_bulk_indexing,
+)
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Return the migration version recorded in the database.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations in order.
+
+    When the schema is current this is a single PRAGMA read and takes no
+    lock. Otherwise the migrations run in one exclusive transaction, so
+    workers starting together wait for whichever got the lock first and
+    then find nothing left to do. A database newer than this code is left
+    alone.
+
+    Args:
+        conn: Connection to migrate; must not be inside a transaction
+
+    Returns:
+        Number of migrations applied
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return 0
+
+    conn.execute("BEGIN EXCLUSIVE")
+    try:
+        # Re-read under the lock: another process may have migrated meanwhile
+        current = schema_version(conn)
+        for step in MIGRATIONS[current:]:
+            step(conn)
+        applied = max(0, LATEST_VERSION - current)
+        if applied:
+            conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return applied
@@ -0,0 +1,206 @@
+"""
+Contact Outbox Delivery for Personal Website
+Drains the contact_outbox table in the background and hands each message to
+a delivery sink, retrying failures with exponential backoff and moving
+messages that keep failing to a dead-letter state.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional
+
+from DAL import claim_outbox_batch, mark_outbox_delivered, mark_outbox_failed
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """
+    Raised by a sink when retrying cannot help (e.g. the target rejected the
+    message as invalid); the message is dead-lettered immediately.
+    """
+
+
+class MemorySink:
+    """
+    In-process sink that records deliveries, for tests and local development.
+
+    Deliveries are keyed by idempotency key, so a retried message is stored
+    once, as a real idempotent receiver would. fail_first makes the first N
+    calls raise, and delay simulates a slow target.
+    """
+
+    def __init__(self, fail_first: int = 0, delay: float = 0.0):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.calls = 0
+        self.delivered: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, idempotency_key: str, payload: Dict) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                raise ConnectionError(f"simulated failure {self.calls}")
+            self.delivered[idempotency_key] = payload
+
+
+class LogSink:
+    """
+    Sink that writes each message to the application log.
+    """
+
+    def deliver(self, idempotency_key: str, payload: Dict) -> None:
+        logger.info("contact message %s: %s", idempotency_key, json.dumps(payload))
+
+
+class WebhookSink:
+    """
+    Sink that POSTs each message as JSON to a URL.
+
+    The idempotency key is sent in an Idempotency-Key header so the receiver
+    can drop retries of a message it already accepted. 4xx responses other
+    than 408 and 429 are treated as permanent failures.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, idempotency_key: str, payload: Dict) -> None:
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode("utf-8"), method="POST",
+            headers={"Content-Type": "application/json", "Idempotency-Key": idempotency_key})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                raise PermanentDeliveryError(f"HTTP {e.code}") from e
+            raise
+
+
+class OutboxWorker:
+    """
+    Deliver outbox messages in batches, on a background thread or inline.
+
+    Each batch is claimed with a lease (see DAL.claim_outbox_batch), so any
+    number of workers across processes can drain the same outbox. A message
+    that fails is retried after base_delay * 2**(attempts - 1) seconds,
+    capped at max_delay and jittered down by up to half to spread retries
+    out. After max_attempts failures it is dead-lettered and left in the
+    table for inspection.
+    """
+
+    def __init__(self, sink, batch_size: int = 50, max_attempts: int = 8,
+                 base_delay: float = 2.0, max_delay: float = 3600.0,
+                 poll_interval: float = 5.0, lease_seconds: float = 300.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def backoff(self, attempts: int) -> float:
+        """
+        Return the delay in seconds before retrying after the given number of
+        failed attempts.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def drain_once(self, now: Optional[float] = None) -> int:
+        """
+        Claim and deliver one batch of due messages.
+
+        Each outcome is recorded as soon as it is known, so a crash part way
+        through the batch re-sends only the messages not yet delivered. Once
+        the batch's lease runs out, the rest of it is left alone: another
+        worker may already have claimed those messages.
+
+        Args:
+            now: Current Unix time (defaults to time.time())
+
+        Returns:
+            Number of messages claimed
+        """
+        now = time.time() if now is None else now
+        lease_end = time.monotonic() + self.lease_seconds
+        messages = claim_outbox_batch(self.batch_size, self.lease_seconds, now)
+        for message in messages:
+            if time.monotonic() >= lease_end:
+                break
+            attempts = message["attempts"] + 1
+            try:
+                self.sink.deliver(message["idempotency_key"], message["payload"])
+            except PermanentDeliveryError as e:
+                mark_outbox_failed(message["id"], str(e), None)
+            except Exception as e:
+                retry_at = None if attempts >= self.max_attempts else now + self.backoff(attempts)
+                mark_outbox_failed(message["id"], f"{type(e).__name__}: {e}", retry_at)
+                if retry_at is None:
+                    logger.warning("contact message %s dead-lettered after %d attempts: %s",
+                                   message["idempotency_key"], attempts, e)
+            else:
+                mark_outbox_delivered([message["id"]])
+        return len(messages)
+
+    def run(self) -> None:
+        """
+        Drain the outbox until stop() is called.
+
+        Full batches are followed immediately by the next one; otherwise the
+        worker sleeps for poll_interval or until wake() is called.
+        """
+        while not self._stopping.is_set():
+            # Cleared before draining so a wake() during the batch is not lost
+            self._wakeup.clear()
+            try:
+                claimed = self.drain_once()
+            except Exception:
+                logger.exception("outbox worker failed to drain a batch")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """
+        Run the worker on a daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        """
+        Ask a sleeping worker to check for new messages now.
+        """
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background thread after its current batch.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,168 @@
+"""
+Slow Query Log for Personal Website
+Records SQL statements that ran longer than a threshold, with redacted
+parameters and SQLite's query plan, and summarizes the log into a report of
+the statements that cost the most time. The DAL feeds it when its query
+diagnostics are on (see DAL.QUERY_DIAGNOSTICS).
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Plan lines that read every row of a table, in SQLite 3.36+ and older wording
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS \S+)?(?: USING (?:COVERING )?INDEX (\S+))?")
+_TEMP_SORT = re.compile(r"^USE TEMP B-TREE FOR (.+)")
+
+# Characters of SQL kept in the one-line summary of a statement
+SQL_PREVIEW_LENGTH = 100
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace so one statement always has the same text."""
+    return " ".join(sql.split())
+
+
+def _redact_value(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact(params: Any) -> Any:
+    """
+    Describe bound parameters without their values.
+
+    Args:
+        params: A sequence or mapping of parameters, as given to execute()
+
+    Returns:
+        The same shape with each value replaced by its type (and length for
+        text and blobs), so the log never holds form input or contact data
+    """
+    if isinstance(params, dict):
+        return {name: _redact_value(value) for name, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_redact_value(value) for value in params]
+    return _redact_value(params)
+
+
+def plan_flags(plan: Optional[List[str]]) -> List[str]:
+    """
+    Pick out the plan steps that read a whole table or sort in memory.
+
+    Args:
+        plan: The detail column of EXPLAIN QUERY PLAN, one line per step
+
+    Returns:
+        Human-readable warnings, empty for plans that only use index searches
+    """
+    flags = []
+    for line in plan or ():
+        if " VIRTUAL TABLE" in line or line.startswith("SCAN CONSTANT ROW"):
+            continue
+        scan = _SCAN.match(line)
+        if scan and scan.group(2):
+            flags.append(f"full index scan of {scan.group(1)} ({scan.group(2)})")
+        elif scan:
+            flags.append(f"full table scan of {scan.group(1)}")
+        sort = _TEMP_SORT.match(line)
+        if sort:
+            flags.append(f"temp b-tree for {sort.group(1)}")
+    return flags
+
+
+class QueryLog:
+    """
+    Append-only JSON Lines file of slow statements.
+
+    Every worker process appends to the same file; each record is written
+    with a single write() on a file opened in append mode, so records from
+    different processes never interleave. Each record is also logged as a
+    warning.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def record(self, sql: str, params: Any, seconds: float, rows: int,
+               plan: Optional[List[str]]) -> None:
+        """
+        Write one slow statement to the log.
+
+        Args:
+            sql: Statement text
+            params: Bound parameters; only their redacted form is kept
+            seconds: Time from execute() until the last row was read
+            rows: Rows read, or rows changed for a write
+            plan: EXPLAIN QUERY PLAN details, or None if unavailable
+        """
+        sql = normalize_sql(sql)
+        entry = {
+            "time": time.time(),
+            "pid": os.getpid(),
+            "sql": sql,
+            "params": redact(params),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "plan": plan,
+        }
+        logger.warning("slow query (%.1f ms, %d rows): %s", seconds * 1000, rows,
+                       sql[:SQL_PREVIEW_LENGTH])
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            logger.exception("Could not write to the slow query log %s", self.path)
+
+    def entries(self):
+        """Yield the records in the log, skipping lines that do not parse."""
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def summarize(self, top: int = 10) -> List[Dict]:
+        """
+        Aggregate the log by statement text.
+
+        Args:
+            top: Number of statements to return
+
+        Returns:
+            Dictionaries with "sql", "calls", "total_ms", "max_ms", "rows",
+            "plan" and "flags", the largest total_ms first
+        """
+        stats: Dict[str, Dict] = {}
+        for entry in self.entries():
+            stat = stats.get(entry["sql"])
+            if stat is None:
+                stat = stats[entry["sql"]] = {"sql": entry["sql"], "calls": 0, "total_ms": 0.0,
+                                              "max_ms": 0.0, "rows": 0, "plan": None}
+            stat["calls"] += 1
+            stat["total_ms"] += entry["ms"]
+            stat["max_ms"] = max(stat["max_ms"], entry["ms"])
+            stat["rows"] += entry["rows"]
+            stat["plan"] = entry.get("plan") or stat["plan"]
+        ranked = sorted(stats.values(), key=lambda stat: stat["total_ms"], reverse=True)[:top]
+        for stat in ranked:
+            stat["flags"] = plan_flags(stat["plan"])
+        return ranked
@@ -17,12 +17,17 @@ setup(
         "itsdangerous>=2.0.0,<3.0.0",
         "click>=8.0.0,<9.0.0",
         "blinker>=1.4.0,<2.0.0",
+        "Brotli>=1.0.9,<2.0.0",
+        "Pillow>=9.1.0,<13.0.0",
     ],
     extras_require={
         "test": [
             "pytest>=7.0.0,<8.0.0",
             "pytest-flask>=1.2.0,<2.0.0",
         ],
+        "asgi": [
+            "uvicorn>=0.20.0,<1.0.0",
+        ],
     },
     classifiers=[
         "Development Status :: 4 - Beta",
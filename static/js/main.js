@@ -68,11 +68,10 @@ function initCdnImages() {
             // Preload to avoid flashing broken image
             const preloader = new Image();
             preloader.onload = () => {
+                // A local srcset would win over src, so replace it with the CDN URL
+                img.removeAttribute('sizes');
+                img.setAttribute('srcset', url);
                 img.src = url;
-                // Optionally set srcset for responsive behavior
-                if (!img.hasAttribute('srcset')) {
-                    img.setAttribute('srcset', url);
-                }
             };
             preloader.onerror = () => {
                 // Keep existing placeholder if CDN fails
@@ -4,10 +4,32 @@ Tests basic app functionality, configuration, and error handling.
 """
 
 import pytest
+import gzip
+import json
+import multiprocessing
 import os
+import shutil
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import sqlite3
-from app import app, init_db
+from flask import url_for
+from jinja2 import FileSystemBytecodeCache
+import DAL
+import app as app_module
+import cssbuild
+import freeze
+import images
+import migrations
+from admission import AdmissionController, ConcurrencyLimiter, TokenBucketLimiter
+from app import app, create_app, init_db
+from assets import build_assets
+from compression import CompressionMiddleware
+from metrics import Metrics
+from outbox import MemorySink, OutboxWorker, PermanentDeliveryError
+from querylog import QueryLog
 from DAL import get_all_projects, insert_project, delete_project
 
 
@@ -32,11 +54,20 @@ def client():
 def app_context():
     """Create an application context for testing."""
     # Set testing configuration
-    app.config['TESTING'] = True
+    create_app({'TESTING': True})
     with app.app_context():
         yield app
 
 
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the DAL at an empty temporary database."""
+    monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'outbox.db'))
+    DAL.init_db()
+    yield
+    DAL.close_connection()
+
+
 def test_app_creation(app_context):
     """Test that the Flask app is created correctly."""
     assert app is not None
@@ -49,6 +80,29 @@ def test_app_configuration(app_context):
     assert app.config['DEBUG'] is True
 
 
+def test_compile_templates_command(tmp_path, monkeypatch):
+    """Test that compile-templates writes bytecode for every template."""
+    monkeypatch.setitem(app.config, 'DEBUG', app.config['DEBUG'])
+    monkeypatch.setitem(app.config, 'JINJA_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(app.jinja_env, 'bytecode_cache', FileSystemBytecodeCache(str(tmp_path)))
+    monkeypatch.setattr(app.jinja_env, 'cache', {})
+    result = app.test_cli_runner().invoke(args=['compile-templates'])
+    assert result.exit_code == 0
+    templates = app.jinja_env.list_templates()
+    assert f'Compiled {len(templates)} templates' in result.output
+    assert len(list(tmp_path.glob('__jinja2_*.cache'))) == len(templates)
+
+
+def test_templates_auto_reload_follows_flask_env():
+    """Test that template reloading is off only when FLASK_ENV=production."""
+    script = "import app; print(app.app.jinja_env.auto_reload)"
+    for flask_env, expected in (('development', 'True'), ('production', 'False')):
+        env = dict(os.environ, FLASK_ENV=flask_env, OUTBOX_WORKER_THREAD='0')
+        output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(__file__),
+                                env=env, capture_output=True, text=True, check=True).stdout
+        assert output.strip() == expected
+
+
 def test_database_initialization(app_context):
     """Test that the database is initialized correctly."""
     # Check if projects table exists
@@ -59,6 +113,29 @@ def test_database_initialization(app_context):
         assert result is not None
 
 
+def test_create_app_migrates_database(tmp_path, monkeypatch):
+    """Test that the factory applies config and brings a new database up to date."""
+    monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'new.db'))
+    monkeypatch.setitem(app.config, 'PROJECTS_PAGE_SIZE', 20)
+    monkeypatch.setitem(app.config, 'OUTBOX_WORKER_THREAD', False)
+    try:
+        assert create_app({'PROJECTS_PAGE_SIZE': 5}) is app
+        assert app.config['PROJECTS_PAGE_SIZE'] == 5
+        with sqlite3.connect(DAL.DB_PATH) as conn:
+            assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    finally:
+        DAL.close_connection()
+
+
+def test_migrate_db_command(temp_db, monkeypatch):
+    """Test the migrate-db CLI command."""
+    # Loading the app for the CLI resets DEBUG from FLASK_DEBUG
+    monkeypatch.setitem(app.config, 'DEBUG', app.config['DEBUG'])
+    result = app.test_cli_runner().invoke(args=['migrate-db'])
+    assert result.exit_code == 0
+    assert f'version {migrations.LATEST_VERSION} of {migrations.LATEST_VERSION}' in result.output
+
+
 def test_index_route(client):
     """Test the home page route."""
     response = client.get('/')
@@ -189,5 +266,708 @@ def test_app_error_handling(client):
     assert response.status_code == 302  # Should redirect to projects page
 
 
+@pytest.fixture
+def built_assets(tmp_path, monkeypatch):
+    """Build fingerprinted assets into a throwaway static folder."""
+    static_dir = tmp_path / 'static'
+    (static_dir / 'css').mkdir(parents=True)
+    (static_dir / 'css' / 'styles.css').write_text('body { color: red; }\n' * 200)
+    (static_dir / 'img').mkdir()
+    (static_dir / 'img' / 'favicon.svg').write_text('<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+
+    app_module = sys.modules['app']
+    manifest = build_assets(str(static_dir))
+    monkeypatch.setattr(app, 'static_folder', str(static_dir))
+    monkeypatch.setattr(app_module, 'asset_manifest', manifest)
+    monkeypatch.setattr(app_module, '_asset_manifest_mtime', float('inf'))
+    app.config['TESTING'] = True
+    return manifest
+
+
+def test_build_assets_manifest(built_assets, tmp_path):
+    """Test that every static file gets a hashed copy and compressed variants."""
+    hashed_css = built_assets['css/styles.css']
+    assert hashed_css.startswith('build/css/styles.') and hashed_css.endswith('.css')
+    built = tmp_path / 'static' / hashed_css
+    assert built.exists()
+    assert gzip.decompress((tmp_path / 'static' / (hashed_css + '.gz')).read_bytes()) == built.read_bytes()
+    # Rebuilding unchanged sources yields the same names
+    assert build_assets(str(tmp_path / 'static')) == built_assets
+
+
+def test_build_assets_command_skips_uploads(tmp_path, monkeypatch):
+    """Test that uploaded project images are not fingerprinted as build assets."""
+    monkeypatch.setitem(app.config, 'DEBUG', app.config['DEBUG'])
+    static_dir = tmp_path / 'static'
+    (static_dir / 'images' / app.config['IMAGE_UPLOAD_SUBDIR']).mkdir(parents=True)
+    (static_dir / 'images' / 'logo.png').write_bytes(b'logo')
+    (static_dir / 'images' / app.config['IMAGE_UPLOAD_SUBDIR'] / 'abc.png').write_bytes(b'upload')
+    monkeypatch.setattr(app, 'static_folder', str(static_dir))
+    result = app.test_cli_runner().invoke(args=['build-assets'])
+    assert result.exit_code == 0, result.output
+    assert 'Built 1 assets' in result.output
+    with open(static_dir / 'build' / 'manifest.json') as f:
+        assert list(json.load(f)) == ['images/logo.png']
+
+
+def test_url_for_emits_hashed_urls(built_assets):
+    """Test that url_for('static') is rewritten through the manifest."""
+    with app.test_request_context('/'):
+        assert url_for('static', filename='css/styles.css') == '/static/' + built_assets['css/styles.css']
+        assert url_for('static', filename='js/unknown.js') == '/static/js/unknown.js'
+
+
+def test_url_for_source_removed_while_reloading(built_assets, tmp_path, monkeypatch):
+    """Test that a source file deleted during development falls back to its plain URL."""
+    monkeypatch.setattr(app.jinja_env, 'auto_reload', True)
+    (tmp_path / 'static' / 'css' / 'styles.css').unlink()
+    with app.test_request_context():
+        assert url_for('static', filename='css/styles.css') == '/static/css/styles.css'
+
+
+def test_precompressed_asset_served(built_assets):
+    """Test that hashed assets are negotiated by Accept-Encoding and immutable."""
+    url = '/static/' + built_assets['css/styles.css']
+    with app.test_client() as client:
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.content_type.startswith('text/css')
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.cache_control.immutable
+        assert response.cache_control.max_age == 31536000
+        assert gzip.decompress(response.data).startswith(b'body { color: red; }')
+
+        response = client.get(url)
+        assert 'Content-Encoding' not in response.headers
+        assert response.data.startswith(b'body { color: red; }')
+
+
+@pytest.fixture
+def css_tree(tmp_path):
+    """A static/ and templates/ tree with a tiny vendored stylesheet."""
+    static_dir, template_dir = tmp_path / 'static', tmp_path / 'templates'
+    (static_dir / 'vendor' / 'bootstrap' / 'css').mkdir(parents=True)
+    (static_dir / 'css').mkdir()
+    (static_dir / 'js').mkdir()
+    template_dir.mkdir()
+    (static_dir / 'vendor' / 'bootstrap' / 'css' / 'bootstrap.min.css').write_text(
+        '@charset "UTF-8";/*! Bootstrap | MIT */'
+        ':root{--bs-used:1px;--bs-unused:2px;--bs-chain:var(--bs-used)}'
+        'table{border-collapse:collapse}'
+        '.btn{padding:var(--bs-chain);transition:color .15s}.btn-unused{color:red}'
+        '.btn:hover{color:blue}[data-bs-theme=dark] .btn{color:#fff}@media print{.btn{display:none}}'
+        '.alert-danger,.alert-info{color:red}.alert-success{color:green}'
+        '.nav-tabs .nav-item{margin:0}.icon::after{content:"a;b{c}"}'
+        '@media (min-width:768px){.navbar-expand-md{display:flex}.carousel{display:none}}'
+        '@keyframes spin{to{transform:rotate(360deg)}}@keyframes unused{to{opacity:0}}'
+        '.spinner{animation:spin 1s}.footer-only{margin:0}')
+    (static_dir / 'css' / 'styles.css').write_text(
+        '/* our styles */\n.card:not(.hidden) > p { margin: 0 ; }\n.error { color: red; }\n')
+    (static_dir / 'js' / 'main.js').write_text("el.classList.add('error');")
+    (template_dir / 'base.html').write_text(
+        '<nav class="navbar navbar-expand-md"><a class="btn icon">x</a></nav>'
+        '{% block content %}{% endblock %}<footer class="footer-only"></footer>')
+    (template_dir / 'page.html').write_text(
+        '{% extends "base.html" %}{% block content %}'
+        '<div class="alert alert-{{ "danger" if error else "success" }}">'
+        '<div class="card"><p class="spinner">hi</p></div>'
+        + '\n' * 60 + '<table></table>{% endblock %}')
+    return static_dir, template_dir
+
+
+def test_build_css_purges_unused_rules(css_tree):
+    """Test that the bundle keeps only rules the templates and scripts can use."""
+    static_dir, template_dir = css_tree
+    sizes = cssbuild.build_css(str(static_dir), str(template_dir))
+    bundle = (static_dir / 'css' / 'bundle.min.css').read_text()
+    assert bundle.startswith('@charset "UTF-8";/*! Bootstrap | MIT */')
+    for kept in ('.btn{', '.alert-danger{', '.alert-success{', '.card:not(.hidden)>p{margin:0}',
+                 '.error{', '@media (min-width:768px){.navbar-expand-md{display:flex}}',
+                 '@keyframes spin', '--bs-chain:var(--bs-used)', '--bs-used:1px',
+                 '.icon::after{content:"a;b{c}"}', 'table{'):
+        assert kept in bundle
+    for dropped in ('.btn-unused', '.alert-info', '.nav-item', '.carousel', 'unused',
+                    '/* our styles */'):
+        assert dropped not in bundle
+    assert sizes[cssbuild.BUNDLE_NAME] == len(bundle)
+
+    critical = (static_dir / 'css' / 'critical' / 'page.css').read_text()
+    assert '.navbar-expand-md' in critical and '.card:not(.hidden)>p' in critical
+    for kept in ('.btn:hover{', '[data-bs-theme=dark] .btn{', '@media print{', 'transition:'):
+        assert kept in bundle
+    # Nothing that cannot match, or show, before the user or a script acts
+    assert '.btn{padding:var(--bs-chain)}' in critical
+    for dropped in (':hover', 'data-bs-theme', 'print', 'transition'):
+        assert dropped not in critical
+    # Below the fold: in the bundle only
+    assert 'table{' not in critical and '.footer-only' not in critical
+    assert not (static_dir / 'css' / 'critical' / 'base.css').exists()
+    assert not cssbuild.is_stale(str(static_dir), str(template_dir))
+
+
+def test_critical_css_inlined_after_build(client, tmp_path, monkeypatch):
+    """Test that base.html links the vendored sheets until build-css runs, then inlines."""
+    static_dir = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static_dir,
+                    ignore=shutil.ignore_patterns('build', 'critical', 'bundle.min.css'))
+    monkeypatch.setattr(app, 'static_folder', str(static_dir))
+    monkeypatch.setattr(app_module, 'asset_manifest', {})
+    monkeypatch.setattr(app_module, '_critical_css', {})
+    monkeypatch.setattr(app.jinja_env, 'auto_reload', False)
+
+    page = client.get('/contact').get_data(as_text=True)
+    assert 'vendor/bootstrap/css/bootstrap.min.css' in page and '<style>' not in page
+    assert 'cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css' not in page
+
+    sizes = cssbuild.build_css(str(static_dir), os.path.join(app.root_path, app.template_folder))
+    assert sizes['css/critical/contact.css'] > 0
+    app_module._critical_css.clear()
+    page = client.get('/contact').get_data(as_text=True)
+    assert '<style>:root' in page and '.navbar>.container' in page
+    assert 'rel="preload" href="/static/css/bundle.min.css"' in page
+    assert '/static/vendor/bootstrap/js/bootstrap.min.js' in page and 'cdn.jsdelivr' not in page
+    # The inlined CSS does not push the nav out of the first streamed chunk
+    chunks = list(client.get('/projects?all=1', buffered=False).response)
+    assert b'<style>' in chunks[0] and b'<nav' in chunks[0]
+
+
+def test_freeze_command_writes_pages(temp_db, tmp_path, monkeypatch):
+    """Test that flask freeze renders the read-only pages with compressed copies."""
+    monkeypatch.setitem(app.config, 'DEBUG', app.config['DEBUG'])
+    insert_project('Frozen Project', 'Rendered into a static file', 'f.png')
+    output = tmp_path / 'frozen'
+    result = app.test_cli_runner().invoke(args=['freeze', '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    for name in ('index.html', 'about.html', 'resume.html', 'projects.html', '404.html'):
+        assert (output / name).is_file()
+        assert gzip.decompress((output / f'{name}.gz').read_bytes()) == (output / name).read_bytes()
+    assert b'Frozen Project' in (output / 'projects.html').read_bytes()
+    assert b'nav-link active' not in (output / '404.html').read_bytes()
+
+
+def test_frozen_projects_regenerated_after_writes(client, temp_db, tmp_path, monkeypatch):
+    """Test that only the data pages are rewritten, once per change."""
+    output = str(tmp_path / 'frozen')
+    freeze.freeze(app, output)
+    assert freeze.refresh(app, output) == []
+
+    listener = freeze.refresh_after_write(app, output)
+    DAL.add_query_listener(listener)
+    try:
+        about_mtime = os.stat(os.path.join(output, 'about.html')).st_mtime_ns
+        form = {'title': 'Posted Project', 'description': 'Shows up in the frozen listing',
+                'image_filename': 'p.png'}
+        assert client.post('/projects/new', data=form).status_code == 302
+        with open(os.path.join(output, 'projects.html'), 'rb') as f:
+            assert b'Posted Project' in f.read()
+        assert freeze.read_manifest(output)['data_version'] == DAL.get_data_version()
+        assert os.stat(os.path.join(output, 'about.html')).st_mtime_ns == about_mtime
+
+        # Written by another process: picked up by the next refresh
+        conn = sqlite3.connect(DAL.DB_PATH)
+        with conn:
+            conn.execute('DELETE FROM projects')
+        conn.close()
+        assert freeze.refresh(app, output) == ['projects.html']
+        with open(os.path.join(output, 'projects.html'), 'rb') as f:
+            assert b'Posted Project' not in f.read()
+    finally:
+        DAL.remove_query_listener(listener)
+
+
+def test_frozen_pages_regenerated_after_the_view(temp_db, tmp_path, monkeypatch):
+    """Test that writes in a request regenerate once, after the view, not inside the write."""
+    refreshed = []
+    monkeypatch.setattr(freeze, 'refresh', lambda flask_app, output_dir: refreshed.append(output_dir))
+    listener = freeze.refresh_after_write(app, str(tmp_path))
+    DAL.add_query_listener(listener)
+    try:
+        with app.test_request_context('/projects/new', method='POST'):
+            insert_project('First', 'Written by the view', 'a.png')
+            insert_project('Second', 'Written by the view', 'b.png')
+            assert refreshed == []
+            app.process_response(app.response_class())
+        assert refreshed == [str(tmp_path)]
+        # Outside a request there is no later point to wait for
+        insert_project('Third', 'Written by a command', 'c.png')
+        assert len(refreshed) == 2
+    finally:
+        DAL.remove_query_listener(listener)
+
+
+def _wsgi_app(body_chunks, content_type='text/html; charset=utf-8', status='200 OK',
+              extra_headers=(), streamed=False):
+    """Build a minimal WSGI app returning the given body."""
+    def application(environ, start_response):
+        headers = [('Content-Type', content_type), *extra_headers]
+        if not streamed:
+            headers.append(('Content-Length', str(sum(len(c) for c in body_chunks))))
+        start_response(status, headers)
+        return iter(body_chunks) if streamed else list(body_chunks)
+    return application
+
+
+def _call(app_, accept_encoding='gzip'):
+    """Call a WSGI app and return (status, headers dict, body bytes)."""
+    result = {}
+
+    def start_response(status, headers, exc_info=None):
+        result['status'], result['headers'] = status, dict(headers)
+
+    body = b''.join(app_({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding},
+                         start_response))
+    return result['status'], result['headers'], body
+
+
+def test_compression_large_html():
+    """Test that large text responses are gzipped with an exact length."""
+    html = b'<p>hello compression</p>' * 200
+    status, headers, body = _call(CompressionMiddleware(_wsgi_app([html])))
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert int(headers['Content-Length']) == len(body) < len(html)
+    assert gzip.decompress(body) == html
+
+
+def test_compression_prefers_brotli():
+    """Test that brotli is chosen when accepted and available."""
+    brotli = pytest.importorskip('brotli')
+    html = b'<p>hello compression</p>' * 200
+    _, headers, body = _call(CompressionMiddleware(_wsgi_app([html])), 'gzip, br')
+    assert headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(body) == html
+    _, headers, _ = _call(CompressionMiddleware(_wsgi_app([html])), 'gzip, br;q=0')
+    assert headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('kwargs,accept', [
+    ({'body_chunks': [b'tiny']}, 'gzip'),
+    ({'body_chunks': [b'x' * 4096], 'content_type': 'image/png'}, 'gzip'),
+    ({'body_chunks': [b'x' * 4096], 'extra_headers': [('Content-Encoding', 'br')]}, 'gzip'),
+    ({'body_chunks': [], 'status': '304 Not Modified'}, 'gzip'),
+    ({'body_chunks': [b'x' * 4096]}, 'identity'),
+])
+def test_compression_skipped(kwargs, accept):
+    """Test that small, binary, pre-encoded, 304 and unaccepted responses pass through."""
+    _, headers, body = _call(CompressionMiddleware(_wsgi_app(**kwargs)), accept)
+    assert headers.get('Content-Encoding') in (None, 'br')
+    assert body == b''.join(kwargs['body_chunks'])
+
+
+@pytest.mark.parametrize('accept', ['', 'identity', 'gzip'])
+def test_compression_vary_on_every_eligible_response(accept):
+    """Test that Vary names Accept-Encoding whether or not the body was compressed."""
+    html = [b'<p>hello compression</p>' * 200]
+    app_ = _wsgi_app(html, extra_headers=[('Vary', 'Cookie')])
+    _, headers, _ = _call(CompressionMiddleware(app_), accept)
+    assert headers['Vary'] == 'Cookie, Accept-Encoding'
+    _, headers, _ = _call(CompressionMiddleware(_wsgi_app([b'tiny'])), accept)
+    assert 'Vary' not in headers
+
+
+def test_compression_streamed_response():
+    """Test that streamed bodies are compressed incrementally, chunk by chunk."""
+    chunks = [b'<tr><td>row %d</td></tr>' % i for i in range(500)]
+    middleware = CompressionMiddleware(_wsgi_app(chunks, streamed=True))
+    status, headers, body = _call(middleware)
+    assert headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in headers
+    assert gzip.decompress(body) == b''.join(chunks)
+
+
+def test_app_compresses_pages(client):
+    """Test that the Flask app is wrapped with compression."""
+    response = client.get('/projects', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'</html>' in gzip.decompress(response.data)
+
+
+def test_compression_etag_names_the_encoding():
+    """Test that strong ETags of encoded bodies differ from the identity ETag; weak ones are kept."""
+    html = b'<p>hello compression</p>' * 200
+    for etag, expected in (('"abc"', '"abc-gzip"'), ('W/"abc"', 'W/"abc"')):
+        app_ = _wsgi_app([html], extra_headers=[('ETag', etag)])
+        assert _call(CompressionMiddleware(app_))[1]['ETag'] == expected
+        assert _call(CompressionMiddleware(app_), 'identity')[1]['ETag'] == etag
+
+
+@pytest.mark.parametrize('accept_encoding,suffix', [('gzip', '-gzip'), ('br', '-br')])
+def test_app_conditional_get_with_encoded_etag(client, accept_encoding, suffix):
+    """Test that an encoded response's ETag revalidates to a 304 carrying the same ETag."""
+    if suffix == '-br':
+        pytest.importorskip('brotli')
+    headers = {'Accept-Encoding': accept_encoding}
+    response = client.get('/about', headers=headers)
+    etag = response.headers['ETag']
+    assert response.headers['Content-Encoding'] == accept_encoding
+    assert etag.endswith(suffix + '"')
+    assert client.get('/about').headers['ETag'] == etag.replace(suffix, '')
+
+    response = client.get('/about', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # A copy cached before the client accepted the encoding is still current
+    response = client.get('/about', headers={**headers, 'If-None-Match': etag.replace(suffix, '')})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag.replace(suffix, '')
+
+
+@pytest.fixture
+def source_image(tmp_path):
+    """A 800x400 JPEG to build variants from."""
+    Image = pytest.importorskip('PIL.Image')
+    path = tmp_path / 'photo.jpg'
+    Image.new('RGB', (800, 400), (10, 120, 200)).save(path)
+    return str(path)
+
+
+def test_image_cache_content_addressed(source_image, tmp_path):
+    """Test that variant keys follow the source contents and parameters."""
+    cache = images.ImageVariantCache(str(tmp_path / 'cache'))
+    key = cache.variant_key(source_image, 160, 'webp')
+    assert key != cache.variant_key(source_image, 320, 'webp')
+    assert key != cache.variant_key(source_image, 160, 'jpeg')
+
+    from PIL import Image
+    Image.new('RGB', (800, 400), (0, 0, 0)).save(source_image)
+    os.utime(source_image, ns=(0, 0))  # force a new mtime even on coarse clocks
+    assert cache.variant_key(source_image, 160, 'webp') != key
+
+
+def test_image_cache_coalesces_concurrent_misses(source_image, tmp_path, monkeypatch):
+    """Test that simultaneous first requests encode a variant only once."""
+    calls = []
+    encode = images.encode_variant
+
+    def counting_encode(*args):
+        calls.append(args)
+        return encode(*args)
+
+    monkeypatch.setattr(images, 'encode_variant', counting_encode)
+    cache = images.ImageVariantCache(str(tmp_path / 'cache'))
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get(source_image, 160, 'webp'))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+
+def test_image_cache_evicts_least_recently_used(source_image, tmp_path):
+    """Test that the cache stays under max_bytes by dropping the oldest files."""
+    cache = images.ImageVariantCache(str(tmp_path / 'cache'))
+    paths = {}
+    for age, width in enumerate((80, 160, 320)):
+        paths[width], _ = cache.get(source_image, width, 'png')
+        os.utime(paths[width], (1000 + age, 1000 + age))
+    cache.max_bytes = os.path.getsize(paths[320]) + os.path.getsize(paths[160])
+
+    assert cache.evict() == 1
+    assert not os.path.exists(paths[80])
+    assert os.path.exists(paths[160]) and os.path.exists(paths[320])
+
+
+def test_outbox_worker_retries_with_backoff(temp_db):
+    """Test that failed deliveries are retried after a growing delay."""
+    sink = MemorySink(fail_first=2)
+    worker = OutboxWorker(sink, base_delay=10, max_delay=1000)
+    DAL.enqueue_contact_message({'message': 'hello'}, 'key-1')
+
+    now = time.time() + 1
+    assert worker.drain_once(now) == 1      # attempt 1 fails, retry in 5-10s
+    assert worker.drain_once(now + 4) == 0
+    assert worker.drain_once(now + 10) == 1  # attempt 2 fails, retry in 10-20s
+    assert worker.drain_once(now + 19) == 0
+    assert worker.drain_once(now + 30) == 1
+    assert sink.delivered == {'key-1': {'message': 'hello'}}
+    assert DAL.outbox_counts()[DAL.OUTBOX_DELIVERED] == 1
+
+
+def test_outbox_worker_dead_letters(temp_db):
+    """Test that messages are dead-lettered after max_attempts or a permanent error."""
+    class RejectingSink:
+        def deliver(self, key, payload):
+            if payload['permanent']:
+                raise PermanentDeliveryError('HTTP 400')
+            raise ConnectionError('unreachable')
+
+    worker = OutboxWorker(RejectingSink(), max_attempts=2, base_delay=1)
+    DAL.enqueue_contact_message({'permanent': True}, 'bad')
+    DAL.enqueue_contact_message({'permanent': False}, 'flaky')
+    now = time.time() + 1
+    worker.drain_once(now)
+    assert DAL.outbox_counts()[DAL.OUTBOX_DEAD] == 1
+    worker.drain_once(now + 10)
+    counts = DAL.outbox_counts()
+    assert counts[DAL.OUTBOX_DEAD] == 2 and counts[DAL.OUTBOX_PENDING] == 0
+
+
+def test_outbox_lease_expiring_during_a_batch(temp_db):
+    """Test that deliveries are recorded one by one and an expired lease stops the batch."""
+    slow = MemorySink(delay=0.3)
+    worker = OutboxWorker(slow, lease_seconds=0.5)
+    for key in ('first', 'second', 'third'):
+        DAL.enqueue_contact_message({'key': key}, key)
+    now = time.time()
+    assert worker.drain_once(now) == 3
+    assert list(slow.delivered) == ['first', 'second']
+
+    # Another worker reclaims the expired lease and sends only what is left
+    other = MemorySink()
+    assert OutboxWorker(other).drain_once(now + 1) == 1
+    assert list(other.delivered) == ['third']
+    assert DAL.outbox_counts()[DAL.OUTBOX_DELIVERED] == 3
+
+
+def test_contact_post_returns_before_slow_delivery(temp_db, monkeypatch):
+    """Test that a slow sink does not slow down the contact form."""
+    app_module = sys.modules['app']
+    sink = MemorySink(delay=1.0)
+    worker = OutboxWorker(sink, poll_interval=0.05)
+    monkeypatch.setattr(app_module, 'outbox_worker', worker)
+    app.config['TESTING'] = True
+    worker.start()
+    try:
+        with app.test_client() as client:
+            form = {'firstName': 'Ada', 'lastName': 'Lovelace', 'email': 'ada@example.com',
+                    'subject': 'Hello', 'message': 'A message that is long enough.',
+                    'idempotency_key': 'a' * 32}
+            start = time.perf_counter()
+            response = client.post('/contact', data=form)
+            assert time.perf_counter() - start < 0.5
+            assert response.status_code == 302
+            # Resubmitting the same form is not queued twice
+            client.post('/contact', data=form)
+        worker.wake()
+        deadline = time.time() + 5
+        while not sink.delivered and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop(timeout=5)
+    assert list(sink.delivered) == ['a' * 32]
+    assert sink.delivered['a' * 32]['email'] == 'ada@example.com'
+    assert sink.calls == 1
+
+
+def test_create_app_delivers_messages_left_from_before_a_restart(temp_db, monkeypatch):
+    """Test that the outbox worker starts at boot, not on the next contact POST."""
+    sink = MemorySink()
+    worker = OutboxWorker(sink, poll_interval=0.05)
+    monkeypatch.setattr(app_module, 'outbox_worker', worker)
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setitem(app.config, 'OUTBOX_WORKER_THREAD', True)
+    DAL.enqueue_contact_message({'message': 'Queued before the restart'}, 'b' * 32)
+    try:
+        create_app()
+        deadline = time.time() + 5
+        while not sink.delivered and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop(timeout=5)
+    assert list(sink.delivered) == ['b' * 32]
+
+
+def _record_in_child(directory):
+    metrics = Metrics(directory)
+    for _ in range(3):
+        metrics.observe_request('index', 'GET', 200, 0.002)
+    metrics.observe_query('get_all_projects', 0.0001, 7)
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    """Test that /metrics totals include every worker's file."""
+    metrics = Metrics(str(tmp_path))
+    metrics.observe_request('index', 'GET', 200, 0.02)
+    metrics.observe_request('index', 'BREW', 418, 0.02)
+    ctx = multiprocessing.get_context('fork')
+    for _ in range(2):
+        child = ctx.Process(target=_record_in_child, args=(str(tmp_path),))
+        child.start()
+        child.join()
+        assert child.exitcode == 0
+
+    assert len(list(tmp_path.glob('metrics_*.db'))) == 3
+    samples = metrics.collect()
+    assert samples['http_requests_total{endpoint="index",method="GET",status="200"}'] == 7
+    assert samples['http_requests_total{endpoint="index",method="OTHER",status="418"}'] == 1
+    assert samples['dal_query_rows_total{function="get_all_projects"}'] == 14
+
+    text = metrics.render()
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    # Buckets are cumulative: 6 fast requests fall under 0.0025s, all 8 under 0.025s
+    assert 'http_request_duration_seconds_bucket{endpoint="index",le="0.0025"} 6' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="index",le="0.025"} 8' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="index",le="+Inf"} 8' in text
+    assert 'http_request_duration_seconds_count{endpoint="index"} 8' in text
+
+
+def test_metrics_files_of_exited_processes_archived(tmp_path):
+    """Test that exited workers' files are merged into one without losing totals."""
+    metrics = Metrics(str(tmp_path))
+    metrics.observe_query('get_all_projects', 0.0001, 1)
+    ctx = multiprocessing.get_context('fork')
+    for round_ in range(2):
+        for _ in range(2):
+            child = ctx.Process(target=_record_in_child, args=(str(tmp_path),))
+            child.start()
+            child.join()
+        samples = metrics.collect()
+        assert samples['dal_query_rows_total{function="get_all_projects"}'] == 1 + 14 * (round_ + 1)
+        assert samples['http_requests_total{endpoint="index",method="GET",status="200"}'] == 6 * (round_ + 1)
+        assert sorted(path.name for path in tmp_path.glob('metrics_*.db')) == sorted(
+            ['metrics_archive.db', f'metrics_{os.getpid()}.db'])
+    # Collecting again merges nothing twice
+    assert metrics.collect() == samples
+
+
+def test_metrics_file_reopened_with_values(tmp_path):
+    """Test that a process reusing a metrics file continues from its totals."""
+    Metrics(str(tmp_path)).inc('dal_query_rows_total', (('function', 'f'),), 5)
+    metrics = Metrics(str(tmp_path))
+    metrics.inc('dal_query_rows_total', (('function', 'f'),), 2)
+    # Force the file to grow past its initial size
+    for i in range(2000):
+        metrics.inc('dal_query_rows_total', (('function', f'function_{i}'),))
+    assert metrics.collect()['dal_query_rows_total{function="f"}'] == 7
+    assert len(metrics.collect()) == 2001
+
+
+def test_metrics_endpoint(client, temp_db, tmp_path, monkeypatch):
+    """Test that requests and DAL queries show up at /metrics."""
+    monkeypatch.setattr(sys.modules['app'], 'metrics', Metrics(str(tmp_path / 'metrics')))
+    client.get('/projects')
+    client.get('/no-such-page')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.data.decode()
+    assert 'http_requests_total{endpoint="projects",method="GET",status="200"} 1' in text
+    assert 'http_requests_total{endpoint="unmatched",method="GET",status="404"} 1' in text
+    assert 'dal_query_duration_seconds_count{function="get_projects_page"}' in text
+
+
+def test_token_bucket_limits_each_client(tmp_path):
+    """Test burst, refill and per-client isolation of the write rate limiter."""
+    limiter = TokenBucketLimiter(str(tmp_path / 'buckets.db'), rate=0.5, burst=3)
+    now = 1000.0
+    assert [limiter.acquire('a', now)[0] for _ in range(3)] == [True, True, True]
+    allowed, wait = limiter.acquire('a', now)
+    assert not allowed and wait == pytest.approx(2.0)
+    # Refused requests do not use tokens, and other clients are unaffected
+    assert limiter.acquire('a', now + 1)[0] is False
+    assert limiter.acquire('b', now)[0] is True
+    assert limiter.acquire('a', now + 2)[0] is True
+    assert limiter.acquire('a', now + 2)[0] is False
+
+
+def _limiter_child(path, queue):
+    queue.put(TokenBucketLimiter(path, rate=0.001, burst=2).acquire('client', 1000.0)[0])
+
+
+def test_token_bucket_shared_across_processes(tmp_path):
+    """Test that workers draw from the same bucket."""
+    path = str(tmp_path / 'buckets.db')
+    limiter = TokenBucketLimiter(path, rate=0.001, burst=2)
+    assert limiter.acquire('client', 1000.0)[0] is True
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    for _ in range(2):
+        child = ctx.Process(target=_limiter_child, args=(path, queue))
+        child.start()
+        child.join()
+    assert sorted([queue.get(), queue.get()]) == [False, True]
+
+
+def _hold_slot(directory, held, release):
+    # The slot stays held until this process exits
+    assert ConcurrencyLimiter(directory, 2).try_acquire() is not None
+    held.set()
+    release.wait(10)
+
+
+def test_concurrency_limiter_counts_other_processes(tmp_path):
+    """Test that the write cap covers slots held by another worker."""
+    directory = str(tmp_path / 'slots')
+    limiter = ConcurrencyLimiter(directory, 2)
+    ctx = multiprocessing.get_context('fork')
+    held, release = ctx.Event(), ctx.Event()
+    child = ctx.Process(target=_hold_slot, args=(directory, held, release))
+    child.start()
+    try:
+        assert held.wait(10)
+        slot = limiter.try_acquire()
+        assert slot is not None
+        assert limiter.try_acquire() is None
+        limiter.release(slot)
+        assert limiter.try_acquire() is not None
+    finally:
+        release.set()
+        child.join()
+
+
+def test_write_routes_are_shed(client, temp_db, tmp_path, monkeypatch):
+    """Test 429 and 503 responses from the write routes while reads still work."""
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setitem(app.extensions, 'admission',
+                        AdmissionController(str(tmp_path), rate=0.001, burst=2, concurrency=1))
+    form = {'title': 'Shed', 'description': 'Posted during a burst', 'image_filename': 's.png'}
+    assert [client.post('/projects/new', data=form).status_code for _ in range(2)] == [302, 302]
+
+    response = client.post('/projects/new', data=form)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert len(get_all_projects()) == 2
+    assert client.get('/projects').status_code == 200
+
+    # Another client is under its rate but finds the only write slot taken
+    other, third = {'REMOTE_ADDR': '10.0.0.2'}, {'REMOTE_ADDR': '10.0.0.3'}
+    with app.extensions['admission'].write_slot():
+        response = client.post('/api/projects/bulk?format=jsonl', data=b'', environ_base=other)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json()['error'] == 'Server busy'
+        assert client.post('/projects/new', data=form, environ_base=third).status_code == 503
+        # The slot is only taken for the write: an invalid form is answered as usual
+        response = client.post('/projects/new', data={'title': 'AB'}, environ_base=third)
+        assert response.status_code == 200
+    assert len(get_all_projects()) == 2
+    assert client.post('/api/projects/bulk?format=jsonl', data=b'',
+                       environ_base=other).status_code == 200
+
+
+def test_query_report_command(tmp_path, monkeypatch):
+    """Test that flask query-report ranks logged statements and flags scans."""
+    monkeypatch.setitem(app.config, 'DEBUG', app.config['DEBUG'])
+    log_path = str(tmp_path / 'slow_queries.jsonl')
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['query-report', '--log', log_path])
+    assert result.exit_code == 0, result.output
+    assert 'No slow queries' in result.output
+
+    query_log = QueryLog(log_path)
+    query_log.record('SELECT * FROM projects WHERE id = ?', (1,), 0.002, 1,
+                     ['SEARCH projects USING INTEGER PRIMARY KEY (rowid=?)'])
+    for _ in range(2):
+        query_log.record('SELECT *\n  FROM projects ORDER BY title', (), 0.120, 40,
+                         ['SCAN projects', 'USE TEMP B-TREE FOR ORDER BY'])
+    result = runner.invoke(args=['query-report', '--log', log_path, '--top', '5'])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[1].strip() == '1. 240.0 ms total, 2 calls, 120.0 ms max, 80 rows'
+    assert lines[2].strip() == 'SELECT * FROM projects ORDER BY title'
+    assert 'WARNING: full table scan of projects' in result.output
+    assert 'WARNING: temp b-tree for ORDER BY' in result.output
+    assert result.output.index('ORDER BY title') < result.output.index('WHERE id = ?')
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,814 @@
+"""
+Test suite for the Data Access Layer
+Tests connection management and database operations against a temporary database.
+"""
+
+import asyncio
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import DAL
+import migrations
+from async_dal import AsyncDAL, BoundedExecutor, PoolSaturatedError
+from cache import VersionedLRUCache
+from querylog import QueryLog, plan_flags
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the DAL at a fresh temporary database."""
+    monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'test.db'))
+    DAL.init_db()
+    DAL.read_cache.clear()
+    yield DAL.DB_PATH
+    DAL.close_connection()
+
+
+def _child_reads_projects(queue):
+    """Run in a forked child: confirm the parent's connection was dropped."""
+    inherited = getattr(DAL._local, 'conn', None)
+    queue.put((inherited is None, len(DAL.get_all_projects())))
+
+
+class TestConnectionManager:
+    """Test suite for the per-thread connection manager."""
+
+    def test_connection_reused_within_thread(self, temp_db):
+        """Test that repeated calls share one connection."""
+        assert DAL.get_connection() is DAL.get_connection()
+
+    def test_connection_per_thread(self, temp_db):
+        """Test that each thread gets its own connection."""
+        main_conn = DAL.get_connection()
+        seen = []
+
+        def worker():
+            seen.append(DAL.get_connection())
+            DAL.close_connection()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert seen and seen[0] is not main_conn
+
+    def test_pragmas_applied(self, temp_db):
+        """Test that WAL journaling and tuned pragmas are active."""
+        conn = DAL.get_connection()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == -16000
+
+    def test_reconnects_when_path_changes(self, temp_db, tmp_path, monkeypatch):
+        """Test that changing DB_PATH opens a connection to the new file."""
+        first = DAL.get_connection()
+        monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'other.db'))
+        assert DAL.get_connection() is not first
+
+    def test_connection_reset_after_fork(self, temp_db):
+        """Test that a forked child opens its own connection."""
+        DAL.insert_project('Parent Project', 'Inserted before fork', 'p.png')
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        process = ctx.Process(target=_child_reads_projects, args=(queue,))
+        process.start()
+        dropped, count = queue.get(timeout=10)
+        process.join(timeout=10)
+        assert dropped is True
+        assert count == 1
+
+
+class TestProjectOperations:
+    """Test suite for project CRUD functions."""
+
+    def test_insert_and_get_by_id(self, temp_db):
+        """Test inserting a project and reading it back."""
+        DAL.insert_project('  Title  ', 'A description', 'img.png')
+        project = DAL.get_all_projects()[0]
+        assert project['title'] == 'Title'
+        assert DAL.get_project_by_id(project['id'])['description'] == 'A description'
+
+    def test_get_missing_project(self, temp_db):
+        """Test that an unknown ID returns None."""
+        assert DAL.get_project_by_id(12345) is None
+
+    def test_insert_projects_bulk(self, temp_db):
+        """Test that bulk inserts span several chunks in one transaction."""
+        rows = ((f'Bulk {i}', f'Bulk description {i}', f'{i}.png') for i in range(25))
+        assert DAL.insert_projects(rows, chunk_size=10) == 25
+        assert len(DAL.get_all_projects()) == 25
+
+    def test_insert_projects_indexes_each_chunk(self, temp_db):
+        """Test that bulk rows are searchable and bump the change counter once."""
+        DAL.insert_project('Before', 'Indexed by the row trigger', 'b.png')
+        version = DAL.get_data_version()
+        rows = ((f'Bulk {i}', f'Searchable description number{i}', f'{i}.png') for i in range(25))
+        assert DAL.insert_projects(rows, chunk_size=10) == 25
+        assert DAL.get_data_version() == version + 1
+        assert [p['title'] for p in DAL.search_projects('number17')] == ['Bulk 17']
+        assert len(DAL.search_projects('searchable', limit=100)) == 25
+        conn = DAL.get_connection()
+        # Raises if the index does not match the projects table
+        conn.execute("INSERT INTO projects_fts (projects_fts) VALUES ('integrity-check')")
+        assert conn.execute("SELECT active FROM bulk_load").fetchone()[0] == 0
+        # Single-row writes go through the triggers again
+        DAL.insert_project('After', 'Indexed by the row trigger', 'a.png')
+        assert len(DAL.search_projects('trigger')) == 2
+        assert DAL.get_data_version() == version + 2
+
+    def test_insert_projects_rolls_back_on_error(self, temp_db):
+        """Test that a failure part-way leaves no rows behind."""
+        def rows():
+            yield ('Good', 'A valid description', 'g.png')
+            raise RuntimeError('source failed')
+
+        with pytest.raises(RuntimeError):
+            DAL.insert_projects(rows(), chunk_size=1)
+        assert DAL.get_all_projects() == []
+
+    def test_delete_project(self, temp_db):
+        """Test deleting existing and missing projects."""
+        DAL.insert_project('Doomed', 'To be deleted', 'x.png')
+        project_id = DAL.get_all_projects()[0]['id']
+        assert DAL.delete_project(project_id) is True
+        assert DAL.delete_project(project_id) is False
+
+
+class TestPagination:
+    """Test suite for keyset pagination."""
+
+    @pytest.fixture
+    def seeded(self, temp_db):
+        """Insert 25 projects sharing a timestamp to exercise the id tiebreak."""
+        conn = DAL.get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO projects (title, description, image_filename, created_at) "
+                "VALUES (?, ?, ?, '2024-01-01 00:00:00')",
+                [(f'Project {i}', f'Description {i}', f'{i}.png') for i in range(25)])
+        return [p['id'] for p in DAL.get_all_projects()]
+
+    def test_walk_forward_and_back(self, seeded):
+        """Test that following cursors visits every row exactly once."""
+        page = DAL.get_projects_page(limit=10)
+        assert page['prev_cursor'] is None
+        seen = [p['id'] for p in page['projects']]
+        pages = [page]
+        while page['next_cursor']:
+            page = DAL.get_projects_page(after=page['next_cursor'], limit=10)
+            seen.extend(p['id'] for p in page['projects'])
+            pages.append(page)
+        assert seen == seeded
+        assert len(pages) == 3
+
+        back = DAL.get_projects_page(before=pages[2]['prev_cursor'], limit=10)
+        assert back['projects'] == pages[1]['projects']
+        first = DAL.get_projects_page(before=back['prev_cursor'], limit=10)
+        assert first['projects'] == pages[0]['projects']
+        assert first['prev_cursor'] is None
+
+    def test_limit_is_clamped(self, seeded):
+        """Test that limit is bounded by MAX_PAGE_SIZE and at least 1."""
+        assert len(DAL.get_projects_page(limit=0)['projects']) == 1
+        assert len(DAL.get_projects_page(limit=10**6)['projects']) == 25
+
+    def test_invalid_cursor(self, temp_db):
+        """Test that malformed cursors raise ValueError."""
+        with pytest.raises(ValueError):
+            DAL.get_projects_page(after='not-a-cursor')
+
+    def test_listing_uses_index(self, temp_db):
+        """Test that paginated queries are served by the created_at index."""
+        plan = DAL.get_connection().execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM projects "
+            "WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 21",
+            ('2024-01-01', 1)).fetchall()
+        assert any('idx_projects_created_at_id' in row[3] for row in plan)
+
+
+class TestQueryListeners:
+    """Test suite for DAL query timing callbacks."""
+
+    def test_listener_receives_timings_and_rows(self, temp_db):
+        """Test that queries report duration and row counts, but cache hits do not."""
+        calls = []
+        listener = lambda name, seconds, rows: calls.append((name, rows))
+        DAL.add_query_listener(listener)
+        try:
+            DAL.insert_projects([('One', 'First project row', '1.png'), ('Two', 'Second row', '2.png')])
+            DAL.get_all_projects()
+            DAL.get_all_projects()
+            list(DAL.iter_projects(batch_size=1))
+        finally:
+            DAL.remove_query_listener(listener)
+        assert calls == [('insert_projects', 2), ('get_all_projects', 2), ('iter_projects', 2)]
+
+
+class TestFieldProjection:
+    """Test suite for fields= on the project read functions."""
+
+    def test_page_and_single_projection(self, temp_db):
+        """Test that only the requested columns are returned."""
+        DAL.insert_project('Projected', 'Only some columns come back', 'p.png')
+        page = DAL.get_projects_page(fields=('title',))
+        assert page['projects'] == [{'title': 'Projected'}]
+        project_id = DAL.get_all_projects()[0]['id']
+        assert DAL.get_project_by_id(project_id, fields=('id', 'title')) == {
+            'id': project_id, 'title': 'Projected'}
+        assert list(next(DAL.iter_projects(fields=('image_filename',)))) == ['p.png']
+
+    def test_unknown_fields_rejected(self, temp_db):
+        """Test that projections cannot inject SQL."""
+        with pytest.raises(ValueError):
+            DAL.get_projects_page(fields=('title', 'id FROM projects; --'))
+        with pytest.raises(ValueError):
+            DAL.get_project_by_id(1, fields=())
+
+
+class TestSearch:
+    """Test suite for FTS5 project search."""
+
+    @pytest.fixture
+    def seeded(self, temp_db):
+        DAL.insert_project('Flask Portfolio', 'Personal site built with Python and SQLite', 'a.png')
+        DAL.insert_project('Course Enrollment', 'Automates enrollment imports written in Flask', 'b.png')
+        DAL.insert_project('Strategy Simulation', 'Business strategy analysis in spreadsheets', 'c.png')
+
+    def test_ranked_by_bm25_with_title_weight(self, seeded):
+        """Test that a title match outranks a description match."""
+        results = DAL.search_projects('flask')
+        assert [r['title'] for r in results] == ['Flask Portfolio', 'Course Enrollment']
+
+    def test_highlight_and_snippet_markers(self, seeded):
+        """Test that matched terms are wrapped in highlight markers."""
+        result = DAL.search_projects('simulation')[0]
+        assert result['title_highlight'] == f'Strategy {DAL.HIGHLIGHT_START}Simulation{DAL.HIGHLIGHT_END}'
+        assert 'snippet' in result
+
+    def test_prefix_and_multi_word(self, seeded):
+        """Test prefix matching and implicit AND between words."""
+        assert [r['title'] for r in DAL.search_projects('enrol flask')] == ['Course Enrollment']
+
+    def test_operators_in_input_are_literal(self, seeded):
+        """Test that FTS syntax in user input cannot break the query."""
+        assert DAL.search_projects('"flask" OR (NEAR') == []
+        assert DAL.search_projects('***') == []
+
+    def test_index_tracks_updates_and_deletes(self, seeded):
+        """Test that triggers keep the index in sync with projects."""
+        project = DAL.search_projects('spreadsheets')[0]
+        conn = DAL.get_connection()
+        with conn:
+            conn.execute("UPDATE projects SET description = 'Now about dashboards' WHERE id = ?",
+                         (project['id'],))
+        assert DAL.search_projects('spreadsheets') == []
+        assert DAL.search_projects('dashboards')[0]['id'] == project['id']
+        DAL.delete_project(project['id'])
+        assert DAL.search_projects('dashboards') == []
+
+    def test_backfill_existing_database(self, tmp_path, monkeypatch):
+        """Test that init_db indexes rows written before search existed."""
+        path = str(tmp_path / 'legacy.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute("""
+                CREATE TABLE projects (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    image_filename TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("INSERT INTO projects (title, description, image_filename) "
+                         "VALUES ('Legacy Project', 'Written before FTS existed', 'l.png')")
+        conn.close()
+        monkeypatch.setattr(DAL, 'DB_PATH', path)
+        DAL.read_cache.clear()
+        DAL.init_db()
+        try:
+            assert [r['title'] for r in DAL.search_projects('legacy')] == ['Legacy Project']
+        finally:
+            DAL.close_connection()
+
+
+class TestOutbox:
+    """Test suite for the contact outbox table."""
+
+    def test_enqueue_is_idempotent(self, temp_db):
+        """Test that a repeated idempotency key is ignored."""
+        assert DAL.enqueue_contact_message({'message': 'hello'}, 'key-1') is True
+        assert DAL.enqueue_contact_message({'message': 'hello again'}, 'key-1') is False
+        assert DAL.outbox_counts()[DAL.OUTBOX_PENDING] == 1
+
+    def test_claims_do_not_overlap(self, temp_db):
+        """Test that claimed messages are leased to one caller."""
+        for i in range(5):
+            DAL.enqueue_contact_message({'n': i}, f'key-{i}')
+        now = time.time() + 1
+        first = DAL.claim_outbox_batch(3, 60, now)
+        second = DAL.claim_outbox_batch(3, 60, now)
+        assert [m['payload']['n'] for m in first] == [0, 1, 2]
+        assert [m['payload']['n'] for m in second] == [3, 4]
+        assert DAL.claim_outbox_batch(3, 60, now) == []
+        # Leases that run out make the messages claimable again
+        assert len(DAL.claim_outbox_batch(10, 60, now + 61)) == 5
+
+    def test_concurrent_claims_do_not_overlap(self, temp_db):
+        """Test that workers claiming at the same time on their own connections split the rows."""
+        for i in range(100):
+            DAL.enqueue_contact_message({'n': i}, f'key-{i}')
+        now = time.time() + 1
+        claimed = []
+
+        def worker():
+            try:
+                while True:
+                    batch = DAL.claim_outbox_batch(5, 60, now)
+                    if not batch:
+                        return
+                    claimed.extend(m['payload']['n'] for m in batch)
+            finally:
+                DAL.close_connection()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(claimed) == list(range(100))
+
+    def test_failure_schedules_retry_or_dead_letters(self, temp_db):
+        """Test retry scheduling and dead-lettering of failed messages."""
+        DAL.enqueue_contact_message({'n': 1}, 'retry')
+        DAL.enqueue_contact_message({'n': 2}, 'dead')
+        now = time.time() + 1
+        retry, dead = DAL.claim_outbox_batch(2, 60, now)
+        DAL.mark_outbox_failed(retry['id'], 'timeout', now + 30)
+        DAL.mark_outbox_failed(dead['id'], 'rejected', None)
+
+        assert DAL.claim_outbox_batch(10, 60, now + 29) == []
+        claimed = DAL.claim_outbox_batch(10, 60, now + 30)
+        assert [(m['idempotency_key'], m['attempts']) for m in claimed] == [('retry', 1)]
+        DAL.mark_outbox_delivered([claimed[0]['id']])
+        counts = DAL.outbox_counts()
+        assert counts[DAL.OUTBOX_DELIVERED] == 1 and counts[DAL.OUTBOX_DEAD] == 1
+
+    def test_outbox_writes_leave_read_cache_valid(self, temp_db):
+        """Test that queuing messages does not bump the projects version."""
+        version = DAL.get_data_version()
+        DAL.enqueue_contact_message({'n': 1}, 'key')
+        assert DAL.get_data_version() == version
+
+
+class TestMigrations:
+    """Test suite for the versioned schema migrations."""
+
+    def test_new_database_is_migrated_on_first_connection(self, tmp_path, monkeypatch):
+        """Test that the DAL migrates a database it has not seen without init_db."""
+        monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'fresh.db'))
+        try:
+            assert DAL.get_all_projects.__wrapped__() == []
+            assert migrations.schema_version(DAL.get_connection()) == migrations.LATEST_VERSION
+        finally:
+            DAL.close_connection()
+
+    def test_current_schema_is_not_locked(self, temp_db):
+        """Test that a current schema is checked without waiting for a writer."""
+        writer = sqlite3.connect(temp_db, isolation_level=None, check_same_thread=False)
+        writer.execute('BEGIN EXCLUSIVE')
+        try:
+            conn = sqlite3.connect(temp_db, timeout=0)
+            assert migrations.migrate(conn) == 0
+            conn.close()
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+
+    def test_legacy_database_is_versioned(self, tmp_path):
+        """Test that an unversioned database built by the old init_db is upgraded in place."""
+        path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(path)
+        migrations._create_projects(conn)
+        conn.execute("INSERT INTO projects (title, description, image_filename) "
+                     "VALUES ('Old', 'Existing row', 'o.png')")
+        conn.commit()
+        assert migrations.migrate(conn) == migrations.LATEST_VERSION
+        assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+        assert conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0] == 1
+        assert migrations.migrate(conn) == 0
+        conn.close()
+
+    def test_concurrent_migrations_apply_once(self, tmp_path):
+        """Test that processes starting together migrate the database once."""
+        path = str(tmp_path / 'race.db')
+        applied, barrier = [], threading.Barrier(4)
+
+        def worker():
+            conn = sqlite3.connect(path, timeout=10)
+            barrier.wait()
+            applied.append(migrations.migrate(conn))
+            conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(applied) == [0, 0, 0, migrations.LATEST_VERSION]
+
+    def test_newer_schema_is_left_alone(self, tmp_path):
+        """Test that a database migrated by newer code is not touched."""
+        conn = sqlite3.connect(str(tmp_path / 'newer.db'))
+        conn.execute(f'PRAGMA user_version = {migrations.LATEST_VERSION + 1}')
+        assert migrations.migrate(conn) == 0
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        conn.close()
+
+
+class TestWriteCoalescing:
+    """Test suite for group commit and write retries."""
+
+    def _run_together(self, coalescer, calls):
+        """Submit calls from separate threads at once; return results or errors in order."""
+        results = [None] * len(calls)
+        barrier = threading.Barrier(len(calls))
+
+        def worker(i, op, args):
+            barrier.wait()
+            try:
+                results[i] = coalescer.submit(op, args)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i, *call)) for i, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_writes_share_commits(self, temp_db):
+        """Test that concurrent inserts are grouped and all committed."""
+        coalescer = DAL.WriteCoalescer(window=0.05)
+        calls = [(DAL._insert_project, (f'Grouped {i}', 'Inserted in a group', 'g.png'))
+                 for i in range(20)]
+        self._run_together(coalescer, calls)
+        assert len(DAL.get_all_projects()) == 20
+        assert coalescer.groups < 20
+
+    def test_lone_write_does_not_wait(self, temp_db):
+        """Test that a write with no other writer queued commits without waiting out the window."""
+        coalescer = DAL.WriteCoalescer(window=5)
+        start = time.perf_counter()
+        coalescer.submit(DAL._insert_project, ('Alone', 'No group to wait for', 'a.png'))
+        assert time.perf_counter() - start < 1
+        assert coalescer.groups == 1
+        assert [p['title'] for p in DAL.get_all_projects()] == ['Alone']
+
+    def test_each_caller_gets_its_result(self, temp_db):
+        """Test per-write results and errors within one group."""
+        DAL.insert_project('Existing', 'Deleted inside a group', 'e.png')
+        project_id = DAL.get_all_projects()[0]['id']
+
+        def failing(conn):
+            conn.execute("INSERT INTO projects (title, description, image_filename) "
+                         "VALUES ('Rolled back', 'x', 'x.png')")
+            raise ValueError('rejected')
+
+        results = self._run_together(DAL.WriteCoalescer(window=0.05), [
+            (DAL._delete_project, (project_id,)),
+            (DAL._delete_project, (999999,)),
+            (failing, ()),
+            (DAL._insert_project, ('Kept', 'Committed with the group', 'k.png')),
+        ])
+        assert results[:2] == [True, False]
+        assert isinstance(results[2], ValueError)
+        assert [p['title'] for p in DAL.get_all_projects()] == ['Kept']
+
+    def test_public_functions_coalesce(self, temp_db, monkeypatch):
+        """Test that the DAL write functions go through the coalescer when enabled."""
+        coalescer = DAL.WriteCoalescer(window=0)
+        monkeypatch.setattr(DAL, 'WRITE_COALESCING', True)
+        monkeypatch.setattr(DAL, 'write_coalescer', coalescer)
+        DAL.insert_project('Coalesced', 'Written by the group commit path', 'c.png')
+        assert DAL.enqueue_contact_message({'n': 1}, 'coalesced') is True
+        assert DAL.delete_project(DAL.get_all_projects()[0]['id']) is True
+        assert coalescer.groups == 3
+
+    def test_locked_writes_are_retried(self, temp_db, monkeypatch):
+        """Test that a write outlasting the busy timeout is retried, then fails."""
+        monkeypatch.setattr(DAL, 'BUSY_TIMEOUT_MS', 10)
+        monkeypatch.setattr(DAL, 'WRITE_RETRY_DELAY', 0.05)
+        DAL.close_connection()
+        writer = sqlite3.connect(temp_db, isolation_level=None, check_same_thread=False)
+        writer.execute('BEGIN IMMEDIATE')
+        releaser = threading.Timer(0.1, writer.execute, ('COMMIT',))
+        releaser.start()
+        try:
+            DAL.insert_project('Retried', 'Written once the lock was free', 'r.png')
+        finally:
+            releaser.join()
+        assert [p['title'] for p in DAL.get_all_projects()] == ['Retried']
+
+        monkeypatch.setattr(DAL, 'WRITE_RETRIES', 0)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            with pytest.raises(sqlite3.OperationalError):
+                DAL.insert_project('Refused', 'The lock is never released', 'x.png')
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+
+
+class TestAsyncDAL:
+    """Test suite for the async DAL facade and its bounded pool."""
+
+    def test_facade_matches_sync_calls(self, temp_db):
+        """Test that awaited DAL calls return what the sync functions do."""
+        DAL.insert_project('Async', 'Read through the thread pool', 'a.png')
+        adal = AsyncDAL(max_workers=2)
+
+        async def read():
+            return await asyncio.gather(adal.get_all_projects(),
+                                        adal.get_projects_page(limit=1, fields=('title',)))
+
+        try:
+            projects, page = asyncio.run(read())
+        finally:
+            adal.shutdown()
+        assert projects == DAL.get_all_projects()
+        assert page['projects'] == [{'title': 'Async'}]
+
+    def test_private_names_are_not_exposed(self):
+        """Test that only public DAL functions are wrapped."""
+        adal = AsyncDAL()
+        try:
+            with pytest.raises(AttributeError):
+                adal._open_connection
+            with pytest.raises(AttributeError):
+                adal.DB_PATH
+        finally:
+            adal.shutdown()
+
+    def test_saturated_pool_rejects_calls(self):
+        """Test that calls beyond the threads and queue wait, then fail."""
+        pool = BoundedExecutor(max_workers=1, max_pending=1, acquire_timeout=0.05)
+        release = threading.Event()
+
+        async def scenario():
+            running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            assert pool.in_use == 2
+            with pytest.raises(PoolSaturatedError):
+                await pool.run(time.time)
+            release.set()
+            await asyncio.gather(*running)
+            return await pool.run(lambda: 'admitted')
+
+        try:
+            assert asyncio.run(scenario()) == 'admitted'
+        finally:
+            pool.shutdown()
+        assert pool.rejected == 1
+
+
+def _cache_worker(db_path, commands, results):
+    """Run in a child process: serve read/insert/delete commands via the DAL."""
+    DAL.DB_PATH = db_path
+    DAL.read_cache.clear()
+    for command, arg in iter(commands.get, None):
+        if command == 'read':
+            results.put([p['title'] for p in DAL.get_all_projects()])
+        elif command == 'insert':
+            DAL.insert_project(arg, 'Written by another worker', 'w.png')
+            results.put(None)
+        elif command == 'delete':
+            DAL.delete_project(DAL.get_all_projects()[0]['id'])
+            results.put(None)
+        elif command == 'stats':
+            results.put(DAL.cache_stats())
+
+
+class TestReadCache:
+    """Test suite for the versioned read-through cache."""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = VersionedLRUCache(maxsize=2)
+        cache.put('a', 1, 'A')
+        cache.put('b', 1, 'B')
+        assert cache.get('a', 1) == (True, 'A')
+        cache.put('c', 1, 'C')
+        assert cache.get('b', 1) == (False, None)
+        assert cache.get('a', 1) == (True, 'A')
+        assert cache.stats()['evictions'] == 1
+
+    def test_version_mismatch_is_a_miss(self):
+        """Test that an entry from an older version is never served."""
+        cache = VersionedLRUCache(maxsize=2)
+        cache.put('a', 1, 'A')
+        assert cache.get('a', 2) == (False, None)
+        assert len(cache) == 0
+
+    def test_repeated_reads_hit(self, temp_db):
+        """Test that an unchanged table is served from the cache."""
+        DAL.insert_project('Cached', 'Served from memory', 'c.png')
+        first = DAL.get_all_projects()
+        assert DAL.get_all_projects() is first
+        stats = DAL.cache_stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+
+    def test_writes_invalidate(self, temp_db):
+        """Test that inserts and deletes bump the version and refresh reads."""
+        version = DAL.get_data_version()
+        assert DAL.get_all_projects() == []
+        DAL.insert_project('Fresh', 'Must be visible', 'f.png')
+        assert DAL.get_data_version() == version + 1
+        projects = DAL.get_all_projects()
+        assert [p['title'] for p in projects] == ['Fresh']
+        assert DAL.get_project_by_id(projects[0]['id'])['title'] == 'Fresh'
+        DAL.delete_project(projects[0]['id'])
+        assert DAL.get_all_projects() == []
+        assert DAL.get_project_by_id(projects[0]['id']) is None
+
+    def test_cross_process_invalidation(self, temp_db):
+        """Test that a write in one process is never served stale by another."""
+        ctx = multiprocessing.get_context('spawn')
+        workers = []
+        for _ in range(3):
+            commands, results = ctx.Queue(), ctx.Queue()
+            process = ctx.Process(target=_cache_worker, args=(temp_db, commands, results))
+            process.start()
+            workers.append((process, commands, results))
+
+        def ask(worker, command, arg=None):
+            worker[1].put((command, arg))
+            return worker[2].get(timeout=30)
+
+        try:
+            expected = []
+            for round_number in range(3):
+                for worker in workers:
+                    assert ask(worker, 'read') == expected
+                    assert ask(worker, 'read') == expected  # served from cache
+                writer = workers[round_number % len(workers)]
+                title = f'Round {round_number}'
+                ask(writer, 'insert', title)
+                expected = [title] + expected
+                for worker in workers:
+                    assert ask(worker, 'read') == expected
+
+            ask(workers[0], 'delete')
+            expected = expected[1:]
+            for worker in workers:
+                assert ask(worker, 'read') == expected
+                assert ask(worker, 'stats')['hits'] > 0
+        finally:
+            for process, commands, _ in workers:
+                commands.put(None)
+                process.join(timeout=10)
+
+
+class TestReadSnapshot:
+    """Test suite for reads served from an in-memory copy of the database."""
+
+    @pytest.fixture
+    def snapshot(self, temp_db, monkeypatch):
+        snapshot = DAL.ReadSnapshot()
+        monkeypatch.setattr(DAL, 'SNAPSHOT_READS', True)
+        monkeypatch.setattr(DAL, 'READ_CACHE_ENABLED', False)
+        monkeypatch.setattr(DAL, 'read_snapshot', snapshot)
+        return snapshot
+
+    def test_reads_use_the_copy(self, snapshot):
+        """Test that repeated reads of an unchanged database load it once."""
+        DAL.insert_project('Snapshot', 'Read from memory', 's.png')
+        project_id = DAL.get_all_projects()[0]['id']
+        assert DAL.get_project_by_id(project_id)['title'] == 'Snapshot'
+        assert DAL.get_projects_page(limit=5)['projects'][0]['id'] == project_id
+        assert [p['title'] for p in DAL.search_projects('memory')] == ['Snapshot']
+        assert snapshot.loads == 1
+        assert snapshot.connection() is not DAL.get_connection()
+        assert snapshot.size > 0
+
+    def test_writes_from_other_connections_reload(self, snapshot, temp_db):
+        """Test that a commit made outside this process is seen on the next read."""
+        DAL.insert_project('First', 'Loaded with the copy', 'f.png')
+        assert len(DAL.get_all_projects()) == 1
+        other = sqlite3.connect(temp_db)
+        with other:
+            other.execute("INSERT INTO projects (title, description, image_filename) "
+                          "VALUES ('Second', 'Committed elsewhere', 'o.png')")
+        other.close()
+        assert {p['title'] for p in DAL.get_all_projects()} == {'First', 'Second'}
+        assert snapshot.loads == 2
+
+    def test_open_transaction_reads_disk(self, snapshot):
+        """Test that uncommitted writes are read from disk and not copied."""
+        conn = DAL.get_connection()
+        conn.execute("INSERT INTO projects (title, description, image_filename) "
+                     "VALUES ('Pending', 'Not committed yet', 'p.png')")
+        assert [p['title'] for p in DAL.get_all_projects()] == ['Pending']
+        conn.rollback()
+        assert DAL.get_all_projects() == []
+        assert snapshot.loads == 1
+
+    def test_memory_cap_falls_back_to_disk(self, snapshot):
+        """Test that a database over the cap is read from disk."""
+        snapshot.max_bytes = 1
+        DAL.insert_project('Large', 'Too big to copy', 'l.png')
+        assert [p['title'] for p in DAL.get_all_projects()] == ['Large']
+        assert snapshot.connection() is DAL.get_connection()
+        assert snapshot.loads == 0 and snapshot.size == 0
+
+
+class TestQueryDiagnostics:
+    """Test suite for the slow query log and query plan capture."""
+
+    @pytest.fixture
+    def query_log(self, tmp_path, monkeypatch):
+        log_path = str(tmp_path / 'slow_queries.jsonl')
+        monkeypatch.setattr(DAL, 'QUERY_DIAGNOSTICS', True)
+        monkeypatch.setattr(DAL, 'SLOW_QUERY_MS', 0)
+        monkeypatch.setattr(DAL, 'QUERY_LOG_PATH', log_path)
+        monkeypatch.setattr(DAL, 'READ_CACHE_ENABLED', False)
+        monkeypatch.setattr(DAL, '_query_plans', {})
+        # A new path makes the thread open a diagnostic connection
+        monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'diagnostics.db'))
+        DAL.init_db()
+        yield QueryLog(log_path)
+        DAL.close_connection()
+
+    @staticmethod
+    def _entries(query_log, fragment):
+        return [entry for entry in query_log.entries() if fragment in entry['sql']]
+
+    def test_statements_logged_with_redacted_params(self, query_log):
+        """Test that statements are logged with their plan but without parameter values."""
+        DAL.insert_project('Secret title', 'Private description', 's.png')
+        project_id = DAL.get_all_projects()[0]['id']
+        assert DAL.get_project_by_id(project_id)['title'] == 'Secret title'
+
+        [insert] = self._entries(query_log, 'INSERT INTO projects (')
+        assert insert['params'] == ['<str:12>', '<str:19>', '<str:5>']
+        assert insert['rows'] == 1
+        [lookup] = self._entries(query_log, 'WHERE id = ?')
+        assert lookup['params'] == ['<int>']
+        assert lookup['rows'] == 1
+        assert any(line.startswith('SEARCH projects') for line in lookup['plan'])
+        assert self._entries(query_log, 'COMMIT')
+        with open(query_log.path, encoding='utf-8') as f:
+            assert 'Secret' not in f.read()
+
+    def test_lazy_reads_timed_until_exhausted(self, query_log):
+        """Test that a query read in batches is logged once with all its rows."""
+        DAL.insert_projects((f'Project {i}', 'Streamed', 'p.png') for i in range(5))
+        assert len(list(DAL.iter_projects(batch_size=2))) == 5
+        [listing] = self._entries(query_log, 'ORDER BY created_at DESC')
+        assert listing['rows'] == 5
+
+    def test_plan_explained_once_per_statement(self, query_log, monkeypatch):
+        """Test that EXPLAIN QUERY PLAN runs only the first time a statement is slow."""
+        explained = []
+
+        class Plans(dict):
+            def __setitem__(self, sql, plan):
+                explained.append(sql)
+                super().__setitem__(sql, plan)
+
+        monkeypatch.setattr(DAL, '_query_plans', Plans())
+        for _ in range(3):
+            DAL.get_all_projects()
+        listings = self._entries(query_log, 'ORDER BY created_at DESC')
+        assert len(listings) == 3
+        assert listings[0]['plan'] == listings[2]['plan'] != []
+        assert [sql for sql in explained if 'ORDER BY created_at DESC' in sql] == [listings[0]['sql']]
+
+    def test_fast_statements_not_logged(self, query_log, monkeypatch):
+        """Test that statements under the threshold leave no trace."""
+        logged = len(list(query_log.entries()))
+        monkeypatch.setattr(DAL, 'SLOW_QUERY_MS', 60000)
+        DAL.insert_project('Fast', 'Well under a minute', 'f.png')
+        DAL.get_all_projects()
+        assert len(list(query_log.entries())) == logged
+
+    def test_summary_flags_full_scans(self, query_log):
+        """Test that the summary ranks by total time and flags unindexed sorts."""
+        DAL.insert_project('Unindexed', 'Sorted by title', 'u.png')
+        conn = DAL.get_connection()
+        for _ in range(2):
+            conn.execute("SELECT * FROM projects ORDER BY title").fetchall()
+        [top] = [stat for stat in query_log.summarize(top=100) if 'ORDER BY title' in stat['sql']]
+        assert top['calls'] == 2 and top['rows'] == 2
+        assert top['flags'] == ['full table scan of projects', 'temp b-tree for ORDER BY']
+        totals = [stat['total_ms'] for stat in query_log.summarize(top=100)]
+        assert totals == sorted(totals, reverse=True)
+        assert plan_flags(['SEARCH projects USING INTEGER PRIMARY KEY (rowid=?)']) == []
+        assert plan_flags(['SCAN projects_fts VIRTUAL TABLE INDEX 0:M2']) == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -4,9 +4,23 @@ Tests individual route functionality, parameters, and edge cases.
 """
 
 import pytest
+import asyncio
+import csv
+import hashlib
+import io
 import json
-from app import app
-from DAL import insert_project, get_all_projects, delete_project
+import os
+import sqlite3
+import sys
+import threading
+import tracemalloc
+from werkzeug.test import EnvironBuilder
+import DAL
+import images
+import app as app_module
+from app import app, _static_pages
+from bulk_import import import_projects
+from DAL import insert_project, get_all_projects, delete_project, encode_cursor
 
 
 @pytest.fixture
@@ -23,6 +37,15 @@ def client():
         yield client
 
 
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the DAL at an empty temporary database."""
+    monkeypatch.setattr(DAL, 'DB_PATH', str(tmp_path / 'routes.db'))
+    DAL.init_db()
+    yield
+    DAL.close_connection()
+
+
 class TestHomeRoutes:
     """Test suite for home and main navigation routes."""
     
@@ -45,6 +68,50 @@ class TestHomeRoutes:
         assert response.content_type == 'text/html; charset=utf-8'
 
 
+class TestStaticPages:
+    """Test suite for pre-rendered pages with ETag support."""
+
+    @pytest.mark.parametrize('route', ['/', '/about', '/resume', '/thank-you'])
+    def test_etag_and_cache_headers(self, client, route):
+        """Test that static pages carry a strong ETag and Cache-Control."""
+        response = client.get(route)
+        assert response.status_code == 200
+        etag, weak = response.get_etag()
+        assert etag and not weak
+        assert response.cache_control.public
+        assert response.cache_control.max_age == app.config['STATIC_PAGE_MAX_AGE']
+
+    def test_if_none_match_returns_304(self, client):
+        """Test that a matching If-None-Match is answered with 304."""
+        etag = client.get('/about').get_etag()[0]
+        response = client.get('/about', headers={'If-None-Match': f'"{etag}"'})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        response = client.get('/about', headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 200
+
+    def test_active_nav_rendered_per_page(self, client):
+        """Test that each page keeps its own active nav state."""
+        index_page = client.get('/').data
+        about_page = client.get('/about').data
+        assert index_page != about_page
+
+    def test_template_change_triggers_rerender(self, client):
+        """Test that editing a template re-renders the page while template reloading is on."""
+        client.get('/resume')
+        cached = _static_pages[('resume', 'resume.html', '')]
+
+        template = os.path.join(app.root_path, 'templates', 'resume.html')
+        stat = os.stat(template)
+        try:
+            os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            client.get('/resume')
+            assert _static_pages[('resume', 'resume.html', '')] is not cached
+        finally:
+            os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
 class TestProjectRoutes:
     """Test suite for project-related routes."""
     
@@ -119,12 +186,647 @@ class TestProjectRoutes:
         projects = get_all_projects()
         assert len(projects) == initial_count
     
+    def test_projects_pagination_links(self, client):
+        """Test that /projects pages with next/prev cursors."""
+        for i in range(3):
+            insert_project(f'Paged Project {i}', 'Pagination test description', 'test.jpg')
+
+        response = client.get('/projects?limit=1')
+        assert response.status_code == 200
+        assert b'rel="next"' in response.data
+        assert b'limit=1' in response.data
+
+        newest = get_all_projects()[1]
+        cursor = encode_cursor(newest['created_at'], newest['id'])
+        response = client.get(f'/projects?after={cursor}&limit=1')
+        assert response.status_code == 200
+        assert b'rel="prev"' in response.data
+
+        for project in get_all_projects()[:3]:
+            delete_project(project['id'])
+
+    def test_projects_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        response = client.get('/projects?after=%%%')
+        assert response.status_code == 400
+
     def test_delete_project_nonexistent(self, client):
         """Test deleting a non-existent project."""
         response = client.post('/projects/999/delete', follow_redirects=True)
         assert response.status_code == 200  # Should redirect to projects page
 
 
+class TestConditionalProjects:
+    """Test suite for ETag/Last-Modified validation of /projects."""
+
+    def test_matching_etag_skips_the_view(self, client, temp_db, monkeypatch):
+        """Test that an unchanged table is answered with 304 without querying it."""
+        insert_project('Validated', 'Served with an ETag', 'v.png')
+        first = client.get('/projects')
+        etag = first.headers['ETag']
+        assert first.headers['Cache-Control'] == 'no-cache'
+
+        def fail(*args, **kwargs):
+            raise AssertionError('the projects table was read')
+        monkeypatch.setattr(app_module, 'get_projects_page', fail)
+        response = client.get('/projects', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+        assert response.data == b''
+
+    def test_writes_and_urls_change_the_etag(self, client, temp_db):
+        """Test that a write or a different page gets a new ETag."""
+        etag = client.get('/projects').headers['ETag']
+        assert client.get('/projects?limit=1').headers['ETag'] != etag
+        insert_project('Changed', 'Moves the change counter', 'c.png')
+        response = client.get('/projects', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert b'Changed' in response.data
+
+    def test_if_modified_since(self, client, temp_db):
+        """Test that Last-Modified is sent and honoured once its second has passed."""
+        insert_project('Dated', 'Served with Last-Modified', 'd.png')
+        with DAL.get_connection() as conn:
+            conn.execute("UPDATE change_counter SET updated_at = datetime('now', '-1 minute')")
+        last_modified = client.get('/projects').headers['Last-Modified']
+        response = client.get('/projects', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+    def test_flash_messages_bypass_validation(self, client, temp_db):
+        """Test that a flash after a redirect is shown even to a revalidating client."""
+        etag = client.get('/projects').headers['ETag']
+        response = client.post('/projects/new', follow_redirects=True, headers={'If-None-Match': etag},
+                               data={'title': 'Flashed Project',
+                                     'description': 'Added to check the flash message shows up.',
+                                     'image_filename': 'flash.png'})
+        assert response.status_code == 200
+        assert b'Project added successfully!' in response.data
+        assert 'no-store' in response.headers['Cache-Control']
+        assert 'ETag' not in response.headers
+
+
+class TestStreamingProjects:
+    """Test suite for the streamed full projects listing."""
+
+    @staticmethod
+    def _seed(rows):
+        conn = DAL.get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO projects (title, description, image_filename) VALUES (?, ?, ?)",
+                ((f'Streamed {i}', f'Streamed project description {i}', f'{i}.png') for i in range(rows)))
+
+    def _peak_memory(self, client):
+        """Consume /projects?all=1 chunk by chunk and return (peak bytes, rows seen)."""
+        tracemalloc.start()
+        try:
+            response = client.get('/projects?all=1', buffered=False)
+            rows = 0
+            for chunk in response.response:
+                rows += chunk.count(b'class="project-title"')
+            response.close()
+            return tracemalloc.get_traced_memory()[1], rows
+        finally:
+            tracemalloc.stop()
+
+    def test_streams_all_projects(self, client, temp_db):
+        """Test that the full listing is streamed and complete."""
+        self._seed(30)
+        response = client.get('/projects?all=1', buffered=False)
+        assert response.is_streamed
+        assert response.content_type == 'text/html; charset=utf-8'
+        chunks = list(response.response)
+        assert b'<nav' in chunks[0]
+        assert b''.join(chunks).count(b'class="project-title"') == 30
+
+    def test_empty_table(self, client, temp_db):
+        """Test that an empty table still renders the page."""
+        response = client.get('/projects?all=1')
+        assert response.status_code == 200
+        assert b'class="projects-table"' not in response.data
+
+    def test_memory_bounded_for_large_table(self, client, temp_db):
+        """Test that peak memory does not grow with the number of rows."""
+        self._seed(500)
+        small_peak, small_rows = self._peak_memory(client)
+        self._seed(9500)
+        large_peak, large_rows = self._peak_memory(client)
+        assert (small_rows, large_rows) == (500, 10000)
+        # 20x the rows must not need anywhere near 20x the memory
+        assert large_peak < small_peak * 2
+
+
+class TestSearchRoute:
+    """Test suite for the project search page."""
+
+    def test_search_highlights_matches(self, client, temp_db):
+        """Test that results are shown with highlighted, escaped snippets."""
+        insert_project('Search Target', 'Uses <script>alert(1)</script> searchable text', 's.png')
+        response = client.get('/projects/search?q=searchable')
+        assert response.status_code == 200
+        assert b'<mark>searchable</mark>' in response.data
+        assert b'<script>alert(1)</script>' not in response.data
+        assert b'&lt;script&gt;' in response.data
+
+    def test_search_without_query(self, client, temp_db):
+        """Test that the search page renders with no query."""
+        response = client.get('/projects/search')
+        assert response.status_code == 200
+        assert b'name="q"' in response.data
+
+    def test_search_no_results(self, client, temp_db):
+        """Test the empty results message."""
+        response = client.get('/projects/search?q=nothingmatches')
+        assert b'No projects match' in response.data
+
+
+class TestProjectsApi:
+    """Test suite for the JSON/NDJSON projects API."""
+
+    @pytest.fixture
+    def seeded(self, temp_db):
+        DAL.insert_projects([(f'Project {i}', f'Description "{i}" é', f'p{i}.png') for i in range(5)])
+
+    def test_list_paginates(self, client, seeded):
+        """Test that JSON listings use the same cursors as /projects."""
+        data = client.get('/api/projects?limit=2').get_json()
+        assert [p['title'] for p in data['projects']] == ['Project 4', 'Project 3']
+        assert data['prev_cursor'] is None
+        data = client.get(f"/api/projects?limit=2&after={data['next_cursor']}").get_json()
+        assert [p['title'] for p in data['projects']] == ['Project 2', 'Project 1']
+
+    def test_sparse_fieldsets(self, client, seeded):
+        """Test that ?fields= limits the keys of each project."""
+        data = client.get('/api/projects?fields=title&limit=2').get_json()
+        assert data['projects'] == [{'title': 'Project 4'}, {'title': 'Project 3'}]
+        assert data['next_cursor'] is not None
+        project_id = get_all_projects()[0]['id']
+        data = client.get(f'/api/projects/{project_id}?fields=id,image_filename').get_json()
+        assert data == {'id': project_id, 'image_filename': 'p4.png'}
+
+    def test_unknown_field_rejected(self, client, seeded):
+        """Test that fields outside the projects columns are a 400."""
+        response = client.get('/api/projects?fields=title,password')
+        assert response.status_code == 400
+        assert 'password' in response.get_json()['error']
+        assert client.get('/api/projects/1?fields=1;DROP').status_code == 400
+
+    def test_get_missing_project(self, client, seeded):
+        """Test that unknown IDs are a JSON 404."""
+        response = client.get('/api/projects/999999')
+        assert response.status_code == 404
+        assert response.get_json()['error']
+
+    def test_ndjson_export(self, client, seeded):
+        """Test that ?format=ndjson streams every project as valid JSON lines."""
+        response = client.get('/api/projects?format=ndjson&fields=id,title,description')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode('ascii').splitlines()]
+        assert [line['title'] for line in lines] == [f'Project {i}' for i in range(4, -1, -1)]
+        assert lines[0]['description'] == 'Description "4" é'
+        assert list(lines[0]) == ['id', 'title', 'description']
+
+    def test_ndjson_matches_json(self, client, seeded):
+        """Test that both formats serialize projects identically."""
+        paged = client.get('/api/projects?limit=100').get_json()['projects']
+        exported = [json.loads(line) for line in client.get('/api/projects?format=ndjson').data.splitlines()]
+        assert exported == paged
+
+    def test_ndjson_empty(self, client, temp_db):
+        """Test an export of an empty table."""
+        assert client.get('/api/projects?format=ndjson').data == b''
+
+
+async def _asgi_call(asgi_app, method, path, query=b'', body=b'', headers=()):
+    """Drive an ASGI app through one request; return (status, headers, body)."""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+             'headers': [(b'host', b'testserver'), *headers]}
+    request_body = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    messages = []
+
+    async def receive():
+        return request_body.pop(0) if request_body else {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = messages[0]
+    assert start['type'] == 'http.response.start'
+    return (start['status'], dict(start['headers']),
+            b''.join(m.get('body', b'') for m in messages[1:]))
+
+
+def _asgi_request(asgi_app, *args, **kwargs):
+    return asyncio.run(_asgi_call(asgi_app, *args, **kwargs))
+
+
+class TestAsgi:
+    """Test suite for the ASGI entry point."""
+
+    @pytest.fixture
+    def asgi_app(self, temp_db):
+        from asgi import AsgiApp
+        from async_dal import AsyncDAL, BoundedExecutor
+        app.config['TESTING'] = True
+        asgi_app = AsgiApp(app, AsyncDAL(2, 4), BoundedExecutor(2, 4))
+        yield asgi_app
+        asgi_app.dal.shutdown()
+        asgi_app.wsgi_pool.shutdown()
+        DAL.close_connection()
+
+    def test_flask_routes_are_served(self, asgi_app):
+        """Test that routes without a native handler run through Flask."""
+        status, headers, body = _asgi_request(asgi_app, 'GET', '/about')
+        assert status == 200
+        assert headers[b'content-type'].startswith(b'text/html')
+        assert body == app.test_client().get('/about').data
+
+    def test_form_post(self, asgi_app):
+        """Test that request bodies reach Flask."""
+        status, headers, _ = _asgi_request(
+            asgi_app, 'POST', '/projects/new',
+            body=b'title=ASGI+Project&description=Posted+through+the+ASGI+bridge&image_filename=a.png',
+            headers=[(b'content-type', b'application/x-www-form-urlencoded')])
+        assert status == 302
+        assert [p['title'] for p in get_all_projects()] == ['ASGI Project']
+
+    def test_oversized_body_refused(self, asgi_app, monkeypatch):
+        """Test that a body over every route's limit gets 413 without being read in full."""
+        monkeypatch.setitem(app.config, 'IMAGE_UPLOAD_MAX_BYTES', 100)
+        monkeypatch.setitem(app.config, 'UPLOAD_FORM_OVERHEAD', 0)
+        monkeypatch.setitem(app.config, 'BULK_IMPORT_MAX_BYTES', 200)
+        status, _, body = _asgi_request(asgi_app, 'POST', '/api/projects/bulk', b'format=jsonl',
+                                        body=b'x' * 201, headers=[(b'content-length', b'201')])
+        assert (status, body) == (413, b'Request body too large\n')
+
+        # Without a Content-Length, reading stops once the limit is passed
+        chunks = [{'type': 'http.request', 'body': b'x' * 150, 'more_body': True}
+                  for _ in range(3)]
+        messages = []
+
+        async def receive():
+            return chunks.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/projects/bulk',
+                 'query_string': b'format=jsonl', 'headers': [(b'host', b'testserver')]}
+        asyncio.run(asgi_app(scope, receive, send))
+        assert messages[0]['status'] == 413 and len(chunks) == 1
+        assert get_all_projects() == []
+
+    def test_native_api_matches_flask(self, asgi_app):
+        """Test that the native API handlers return what the Flask views do."""
+        DAL.insert_projects([(f'Project {i}', f'Description {i}', f'p{i}.png') for i in range(5)])
+        client = app.test_client()
+        for path, query in (('/api/projects', b'limit=2&fields=id,title'),
+                            ('/api/projects', b'fields=password'),
+                            (f"/api/projects/{get_all_projects()[0]['id']}", b''),
+                            ('/api/projects/999999', b'')):
+            status, headers, body = _asgi_request(asgi_app, 'GET', path, query)
+            expected = client.get(f"{path}?{query.decode()}")
+            assert (status, json.loads(body)) == (expected.status_code, expected.get_json())
+            assert headers[b'content-type'] == b'application/json'
+
+    def test_streamed_export(self, asgi_app):
+        """Test that a streamed Flask response is passed through chunk by chunk."""
+        DAL.insert_projects([(f'Project {i}', 'Description', 'p.png') for i in range(3)])
+        status, _, body = _asgi_request(asgi_app, 'GET', '/api/projects', b'format=ndjson')
+        assert status == 200
+        assert len(body.splitlines()) == 3
+
+    def test_saturated_pool_returns_503(self, temp_db):
+        """Test that requests beyond the pool and its queue are turned away."""
+        from asgi import AsgiApp
+        from async_dal import AsyncDAL, BoundedExecutor
+        asgi_app = AsgiApp(app, AsyncDAL(1, 0), BoundedExecutor(1, 0, acquire_timeout=0.01))
+        release = threading.Event()
+
+        async def scenario():
+            # Occupy the only slot, then make a request
+            blocker = asyncio.ensure_future(asgi_app.wsgi_pool.run(release.wait))
+            await asyncio.sleep(0.01)
+            try:
+                return await _asgi_call(asgi_app, 'GET', '/about')
+            finally:
+                release.set()
+                await blocker
+
+        try:
+            status, headers, _ = asyncio.run(scenario())
+        finally:
+            asgi_app.dal.shutdown()
+            asgi_app.wsgi_pool.shutdown()
+        assert status == 503
+        assert headers[b'retry-after'] == b'1'
+        assert asgi_app.wsgi_pool.rejected == 1
+
+class TestBulkImport:
+    """Test suite for the bulk project import endpoint and CLI."""
+
+    JSONL = (
+        '{"title": "Bulk One", "description": "First bulk imported project", "image_filename": "1.png"}\n'
+        '{"title": "AB", "description": "Title is too short here", "image_filename": "2.png"}\n'
+        'not json\n'
+        '\n'
+        '{"title": "Bulk Two", "description": "Second bulk imported project", "image_filename": "3.png"}\n'
+    )
+    CSV = (
+        'title,description,image_filename\n'
+        'CSV Project,Imported from a CSV file,csv.png\n'
+        'CSV Short,tiny,csv.png\n'
+    )
+
+    def test_bulk_jsonl(self, client, temp_db):
+        """Test importing JSONL with per-row errors that do not abort the batch."""
+        response = client.post('/api/projects/bulk', data=self.JSONL,
+                               content_type='application/x-ndjson')
+        assert response.status_code == 200
+        report = response.get_json()
+        assert report['inserted'] == 2
+        assert report['error_count'] == 2
+        assert [e['row'] for e in report['errors']] == [2, 3]
+        assert report['errors'][0]['error'] == 'Title must be at least 3 characters long.'
+        assert [p['title'] for p in get_all_projects()] == ['Bulk Two', 'Bulk One']
+
+    def test_bulk_csv(self, client, temp_db):
+        """Test importing CSV selected with ?format=."""
+        response = client.post('/api/projects/bulk?format=csv', data=self.CSV,
+                               content_type='text/plain')
+        report = response.get_json()
+        assert report['inserted'] == 1
+        assert report['errors'] == [{'row': 3, 'error': 'Description must be at least 10 characters long.'}]
+
+    def test_bulk_csv_malformed_row(self, client, temp_db):
+        """Test that a row the CSV parser rejects is reported and the import goes on."""
+        data = ('title,description,image_filename\n'
+                + 'x' * 100 + ',Longer than the field limit,x.png\n'
+                'CSV Project,Imported after the bad row,csv.png\n')
+        field_size_limit = csv.field_size_limit(64)
+        try:
+            response = client.post('/api/projects/bulk?format=csv', data=data)
+        finally:
+            csv.field_size_limit(field_size_limit)
+        assert response.status_code == 200
+        report = response.get_json()
+        assert report['inserted'] == 1
+        assert report['errors'] == [{'row': 2, 'error': 'Invalid CSV: field larger than field limit (64)'}]
+
+    def test_bulk_unsupported_format(self, client, temp_db):
+        """Test that an unknown format is rejected."""
+        response = client.post('/api/projects/bulk', data='x', content_type='application/xml')
+        assert response.status_code == 415
+
+    def test_bulk_body_too_large(self, client, temp_db, monkeypatch):
+        """Test that a body over BULK_IMPORT_MAX_BYTES is refused with 413 and nothing is written."""
+        monkeypatch.setitem(app.config, 'BULK_IMPORT_MAX_BYTES', len(self.JSONL) - 1)
+        response = client.post('/api/projects/bulk', data=self.JSONL,
+                               content_type='application/x-ndjson')
+        assert response.status_code == 413
+        assert 'limited' in response.get_json()['error']
+        assert get_all_projects() == []
+
+    def test_rows_read_before_write_lock(self, temp_db):
+        """Test that the whole source is read before the insert takes the write lock."""
+        def source():
+            for i in range(3 * DAL.BULK_INSERT_CHUNK_SIZE):
+                yield json.dumps({'title': f'Spooled {i}', 'description': 'Validated before insert',
+                                  'image_filename': 's.png'}) + '\n'
+            # A slow client's last line: another writer can still get the lock
+            with sqlite3.connect(DAL.DB_PATH, timeout=0) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+            yield 'not json\n'
+
+        report = import_projects(source(), 'jsonl')
+        assert report['inserted'] == 3 * DAL.BULK_INSERT_CHUNK_SIZE
+        assert report['error_count'] == 1
+
+    def test_import_projects_cli(self, temp_db, tmp_path):
+        """Test the flask import-projects command."""
+        source = tmp_path / 'projects.csv'
+        source.write_text(self.CSV)
+        result = app.test_cli_runner().invoke(args=['import-projects', str(source)])
+        assert result.exit_code == 0
+        assert 'Imported 1 projects, 1 rows rejected' in result.output
+        assert get_all_projects()[0]['title'] == 'CSV Project'
+
+
+class TestImageVariants:
+    """Test suite for the resized image route."""
+
+    @pytest.fixture
+    def image_static(self, tmp_path, monkeypatch):
+        """A static folder holding a 1200x600 PNG and a cache in tmp_path."""
+        Image = pytest.importorskip('PIL.Image')
+        static_dir = tmp_path / 'static'
+        (static_dir / 'images').mkdir(parents=True)
+        Image.new('RGB', (1200, 600), (200, 40, 40)).save(static_dir / 'images' / 'wide.png')
+        (static_dir / 'images' / 'logo.svg').write_text('<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+        monkeypatch.setattr(app, 'static_folder', str(static_dir))
+        monkeypatch.setattr(sys.modules['app'], 'image_cache',
+                            images.ImageVariantCache(str(tmp_path / 'cache')))
+        return tmp_path
+
+    def _open(self, data):
+        from PIL import Image
+        return Image.open(io.BytesIO(data))
+
+    def test_resizes_and_encodes(self, client, image_static):
+        """Test that ?w= and ?fmt= produce a resized, re-encoded image."""
+        response = client.get('/img/images/wide.png?w=300&fmt=webp')
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        image = self._open(response.data)
+        assert image.format == 'WEBP'
+        assert image.size == (320, 160)  # width snapped up to 320
+        assert response.cache_control.public
+
+    def test_format_negotiated_from_accept(self, client, image_static):
+        """Test that WebP is chosen from the Accept header and Vary is set."""
+        response = client.get('/img/images/wide.png?w=160', headers={'Accept': 'image/webp,*/*'})
+        assert response.mimetype == 'image/webp'
+        assert 'Accept' in response.headers['Vary']
+        response = client.get('/img/images/wide.png?w=160', headers={'Accept': 'image/png'})
+        assert response.mimetype == 'image/png'
+
+    @pytest.mark.parametrize('damage', ['garbage', 'truncated'])
+    def test_corrupt_image_served_unchanged(self, client, image_static, damage):
+        """Test that an image Pillow cannot decode falls back to the original file."""
+        if damage == 'garbage':
+            broken = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8
+        else:
+            broken = (image_static / 'static' / 'images' / 'wide.png').read_bytes()[:-64]
+        (image_static / 'static' / 'images' / 'broken.png').write_bytes(broken)
+        for _ in range(2):
+            response = client.get('/img/images/broken.png?w=160&fmt=webp')
+            assert response.status_code == 200
+            assert response.data == broken
+        assert not list((image_static / 'cache').rglob('*.webp'))
+
+    def test_cached_variant_and_conditional_get(self, client, image_static):
+        """Test that repeat requests reuse the cached file and honour ETags."""
+        first = client.get('/img/images/wide.png?w=160&fmt=jpeg')
+        cached = [path for path in (image_static / 'cache').rglob('*.jpg')]
+        assert len(cached) == 1
+        second = client.get('/img/images/wide.png?w=160&fmt=jpeg')
+        assert second.data == first.data
+        assert second.headers['ETag'] == first.headers['ETag']
+        assert list((image_static / 'cache').rglob('*.jpg')) == cached
+        response = client.get('/img/images/wide.png?w=160&fmt=jpeg',
+                              headers={'If-None-Match': first.headers['ETag']})
+        assert response.status_code == 304
+
+    def test_never_upscales(self, client, image_static):
+        """Test that widths above the source width keep the original size."""
+        response = client.get('/img/images/wide.png?w=5000&fmt=png')
+        assert self._open(response.data).size == (1200, 600)
+
+    def test_non_raster_served_unchanged(self, client, image_static):
+        """Test that SVGs are passed through."""
+        response = client.get('/img/images/logo.svg?w=160')
+        assert response.status_code == 200
+        assert response.data.startswith(b'<svg')
+
+    @pytest.mark.parametrize('url,status', [
+        ('/img/images/missing.png?w=160', 404),
+        ('/img/../app.py?w=160', 404),
+        ('/img/images/wide.png?w=160&fmt=tiff', 400),
+    ])
+    def test_bad_requests(self, client, image_static, url, status):
+        """Test missing files, path traversal and unknown formats."""
+        assert client.get(url).status_code == status
+
+    def test_projects_page_uses_srcset(self, client, temp_db):
+        """Test that project thumbnails point at resized variants."""
+        insert_project('Thumb Project', 'Project with a thumbnail image', 'thumb.png')
+        response = client.get('/projects')
+        assert b'src="/img/images/thumb.png?w=160"' in response.data
+        assert b'/img/images/thumb.png?w=320 320w' in response.data
+
+
+class TestImageUploads:
+    """Test suite for image uploads on the new project form."""
+
+    @staticmethod
+    def _encode(image, fmt='PNG', **options):
+        out = io.BytesIO()
+        image.save(out, fmt, **options)
+        return out.getvalue()
+
+    @pytest.fixture
+    def png(self):
+        """A small PNG image."""
+        Image = pytest.importorskip('PIL.Image')
+        return self._encode(Image.new('RGB', (64, 32), (40, 120, 200)))
+
+    @pytest.fixture
+    def upload_dir(self, tmp_path, temp_db, monkeypatch):
+        """A static folder in tmp_path; returns the directory uploads land in."""
+        monkeypatch.setattr(app, 'static_folder', str(tmp_path / 'static'))
+        return tmp_path / 'static' / 'images' / app.config['IMAGE_UPLOAD_SUBDIR']
+
+    def _post(self, client, data, filename='shot.png'):
+        form = {'title': 'Uploaded Project',
+                'description': 'A project whose image was uploaded with the form.',
+                'image': (io.BytesIO(data), filename)}
+        return client.post('/projects/new', data=form, content_type='multipart/form-data')
+
+    def test_stored_under_content_hash(self, client, upload_dir, png):
+        """Test that an upload is saved as <sha256>.<ext> and recorded on the project."""
+        response = self._post(client, png, filename='../../evil.exe')
+        assert response.status_code == 302
+        name = hashlib.sha256(png).hexdigest() + '.png'
+        assert [p['image_filename'] for p in get_all_projects()] == [f'uploads/{name}']
+        assert os.listdir(upload_dir) == [name]
+        assert (upload_dir / name).read_bytes() == png
+
+    def test_identical_images_stored_once(self, client, upload_dir, png):
+        """Test that uploading the same bytes twice keeps one file."""
+        assert self._post(client, png).status_code == 302
+        assert self._post(client, png, filename='copy.png').status_code == 302
+        filenames = {p['image_filename'] for p in get_all_projects()}
+        assert len(get_all_projects()) == 2 and len(filenames) == 1
+        assert len(os.listdir(upload_dir)) == 1
+
+    def test_oversized_upload_refused(self, client, upload_dir, png, monkeypatch):
+        """Test that uploads over the limit get 413 and leave no file behind."""
+        monkeypatch.setitem(app.config, 'IMAGE_UPLOAD_MAX_BYTES', len(png) // 2)
+        # Over the file limit but within the request limit: stopped mid-stream
+        assert self._post(client, png).status_code == 413
+        # Over the request limit: refused from Content-Length alone
+        monkeypatch.setitem(app.config, 'UPLOAD_FORM_OVERHEAD', 0)
+        assert self._post(client, png).status_code == 413
+        assert get_all_projects() == []
+        assert not upload_dir.exists() or os.listdir(upload_dir) == []
+
+    def test_non_image_refused(self, client, upload_dir):
+        """Test that content not recognised as an image is rejected and deleted."""
+        response = self._post(client, b'<svg onload="alert(1)"></svg>', filename='logo.png')
+        assert response.status_code == 200
+        assert b'PNG, JPEG, GIF or WebP' in response.data
+        assert get_all_projects() == []
+        assert os.listdir(upload_dir) == []
+
+    @pytest.mark.parametrize('damage', ['garbage', 'truncated'])
+    def test_undecodable_image_refused(self, client, upload_dir, png, damage):
+        """Test that a file with image magic bytes but broken content is not stored."""
+        data = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8 if damage == 'garbage' else png[:-20]
+        response = self._post(client, data)
+        assert response.status_code == 200
+        assert b'The image could not be read' in response.data
+        assert get_all_projects() == []
+        assert os.listdir(upload_dir) == []
+
+    def test_decompression_bomb_refused(self, client, upload_dir, monkeypatch):
+        """Test that images over Pillow's pixel limit are refused."""
+        Image = pytest.importorskip('PIL.Image')
+        monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+        response = self._post(client, self._encode(Image.new('L', (40, 40))))
+        assert response.status_code == 200
+        assert b'The image could not be read' in response.data
+        assert os.listdir(upload_dir) == []
+
+    def test_existing_filename_still_accepted(self, client, upload_dir):
+        """Test that the form still takes the name of an image already in static/images."""
+        response = client.post('/projects/new', data={
+            'title': 'Named Image', 'description': 'Points at an existing image file.',
+            'image_filename': 'existing.png', 'image': (io.BytesIO(b''), '')},
+            content_type='multipart/form-data')
+        assert response.status_code == 302
+        assert [p['image_filename'] for p in get_all_projects()] == ['existing.png']
+        assert not upload_dir.exists() or os.listdir(upload_dir) == []
+
+    def test_memory_constant_for_large_uploads(self, client, upload_dir):
+        """Test that an 8 MB upload is never held in memory."""
+        Image = pytest.importorskip('PIL.Image')
+        # Noise does not compress, so the PNG is about as large as its pixels
+        image = self._encode(Image.frombytes('RGB', (1700, 1700), os.urandom(1700 * 1700 * 3)),
+                             compress_level=1)
+        assert len(image) > 8 * 1024 * 1024
+        builder = EnvironBuilder(method='POST', data={
+            'title': 'Large Upload', 'description': 'Eight megabytes streamed to disk.',
+            'image': (io.BytesIO(image), 'large.png')})
+        environ = builder.get_environ()
+        body, content_type = environ['wsgi.input'].read(), environ['CONTENT_TYPE']
+        builder.close()
+        del image, builder, environ
+        tracemalloc.start()
+        try:
+            response = client.post('/projects/new', input_stream=io.BytesIO(body),
+                                   content_type=content_type, content_length=len(body))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert response.status_code == 302
+        assert peak < 2 * 1024 * 1024
+
+
 class TestContactRoutes:
     """Test suite for contact-related routes."""
     
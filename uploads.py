@@ -0,0 +1,216 @@
+"""
+Image Uploads for Personal Website
+Streams uploaded files to disk while hashing them and stores each one under
+its SHA-256, so an image uploaded twice is kept once and no upload is ever
+held in memory.
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import List, Optional
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from images import verify_image
+
+# Leading bytes of the accepted image formats -> stored extension. The type
+# comes from the content, never from the client's filename.
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# Bytes needed to recognise every format above, and WebP ("RIFF....WEBP")
+SNIFF_BYTES = 12
+
+# Prefix of partial uploads in the upload directory; files left behind by
+# a killed worker can be deleted at any time
+TEMP_PREFIX = ".upload-"
+
+# Cap on what werkzeug holds in memory while parsing an upload request: the
+# text fields plus the parser's buffer, which in werkzeug 2.3 counts against
+# the cap and grows by 64 KiB reads (MultiPartParser.buffer_size)
+MAX_FIELD_BYTES = 500_000
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """
+    Identify an image from its first SNIFF_BYTES bytes.
+
+    Returns:
+        The extension to store it with, or None if it is not a PNG, JPEG,
+        GIF or WebP image
+    """
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class HashingFile:
+    """
+    Writable upload target that hashes data as it is written.
+
+    Data goes straight to a temporary file in the destination directory, so
+    memory use does not depend on the upload's size and store() can rename
+    it into place atomically. Writing past max_bytes deletes the file and
+    raises RequestEntityTooLarge, aborting the request body mid-stream.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+        self._file = os.fdopen(fd, "w+b")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._head = b""
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.max_bytes} bytes.")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        self._hash.update(data)
+        return self._file.write(data)
+
+    # Reading methods required of a stream by werkzeug's FileStorage
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def store(self) -> str:
+        """
+        Move the upload to <sha256><extension> in the directory.
+
+        If a file with that name exists it already holds the same bytes, and
+        the upload is dropped instead.
+
+        Returns:
+            The stored file's name
+
+        Raises:
+            ValueError: If the upload is not a PNG, JPEG, GIF or WebP image
+                        that Pillow can decode
+        """
+        extension = sniff_extension(self._head)
+        if extension is None:
+            self.discard()
+            raise ValueError("The image must be a PNG, JPEG, GIF or WebP file.")
+        self._file.close()
+        # Before the rename: a stored name is trusted by every later upload
+        # of the same bytes and by the thumbnail route
+        try:
+            verify_image(self.temp_path)
+        except ValueError:
+            self.discard()
+            raise
+        name = self._hash.hexdigest() + extension
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(self.temp_path)
+        else:
+            # mkstemp files are private; the static file server must read it
+            os.chmod(self.temp_path, 0o644)
+            os.replace(self.temp_path, path)
+        self.temp_path = None
+        return name
+
+    def discard(self) -> None:
+        """Close the upload and delete it unless it has been stored."""
+        self._file.close()
+        if self.temp_path is not None:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+    close = discard
+
+
+class UploadRequest(Request):
+    """
+    Request that can stream file uploads into HashingFile objects.
+
+    A view opts in by calling accept_uploads() before it first reads
+    request.form or request.files; other requests parse uploads with
+    werkzeug's spooled temporary files as usual. Uploads the view has not
+    stored are deleted when the request ends, including those cut short by
+    an error while the body was parsed.
+
+    max_content_length may also be assigned per request, for views that
+    read request.stream themselves; None falls back to MAX_CONTENT_LENGTH.
+    """
+
+    _upload_dir: Optional[str] = None
+    _upload_max_bytes: Optional[int] = None
+    _max_request_bytes: Optional[int] = None
+
+    def accept_uploads(self, directory: str, max_file_bytes: int,
+                       max_request_bytes: Optional[int] = None) -> None:
+        """
+        Stream this request's uploads into directory.
+
+        Args:
+            directory: Where uploads are written and stored
+            max_file_bytes: Largest upload accepted, checked as it arrives
+            max_request_bytes: Largest request body accepted; a larger
+                               Content-Length is refused before any of the
+                               body is read (default: MAX_CONTENT_LENGTH)
+        """
+        if "form" in self.__dict__:
+            raise RuntimeError("accept_uploads() must be called before the form is read")
+        self._upload_dir = directory
+        self._upload_max_bytes = max_file_bytes
+        self._max_request_bytes = max_request_bytes
+        self.max_form_memory_size = MAX_FIELD_BYTES
+        self._uploads: List[HashingFile] = []
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        if self._max_request_bytes is not None:
+            return self._max_request_bytes
+        return super().max_content_length
+
+    @max_content_length.setter
+    def max_content_length(self, value: Optional[int]) -> None:
+        # Lets a view set its own body limit before it reads request.stream
+        self._max_request_bytes = value
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        if self._upload_dir is None:
+            return super()._get_file_stream(total_content_length, content_type,
+                                            filename, content_length)
+        upload = HashingFile(self._upload_dir, self._upload_max_bytes)
+        self._uploads.append(upload)
+        return upload
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            for upload in getattr(self, "_uploads", ()):
+                upload.discard()
@@ -0,0 +1,34 @@
+"""
+Form Validation for Personal Website
+Validation rules shared by the HTML forms, the JSON API and bulk imports.
+"""
+
+from typing import Optional
+
+# Minimum lengths enforced for new projects
+MIN_TITLE_LENGTH = 3
+MIN_DESCRIPTION_LENGTH = 10
+
+
+def validate_project(title: str, description: str, image_filename: str) -> Optional[str]:
+    """
+    Check a project's fields against the rules used by the project form.
+
+    Args:
+        title: Project title (already stripped)
+        description: Project description (already stripped)
+        image_filename: Name of the image file (already stripped)
+
+    Returns:
+        An error message, or None if the project is valid
+    """
+    if not all([title, description, image_filename]):
+        return 'All fields are required.'
+
+    if len(title) < MIN_TITLE_LENGTH:
+        return f'Title must be at least {MIN_TITLE_LENGTH} characters long.'
+
+    if len(description) < MIN_DESCRIPTION_LENGTH:
+        return f'Description must be at least {MIN_DESCRIPTION_LENGTH} characters long.'
+
+    return None